@@ -0,0 +1,272 @@
+import json
+import logging
+import math
+import os
+import threading
+from itertools import chain
+
+import numpy as np
+
+from config import ANN_INDEX_DIR, ANN_NPROBE, ANN_MIN_TRAIN_SIZE
+
+# approximate nearest-neighbour indexes over market embeddings, one per venue, so dedup can match
+# only newly fetched markets against everything already seen instead of re-scoring the full tables.
+#
+# IVFIndex is an inverted-file index built on numpy: vectors are clustered with spherical k-means and
+# a query only scores the vectors in its nprobe closest clusters. Until the index holds
+# min_train_size vectors it searches exhaustively.
+#
+# It stores, per market id, the hash of the text that was embedded, so callers can tell whether a
+# market is new or its title/description changed since it was indexed, and an optional expiry time
+# (the market's close time) so closed markets can be dropped without rescanning the market tables.
+
+KMEANS_ITERATIONS = 10
+RETRAIN_GROWTH_FACTOR = 4  # retrain clusters once the index is 4x the size it was trained at
+
+class IVFIndex:
+    def __init__(self, dim=None, nprobe=ANN_NPROBE, min_train_size=ANN_MIN_TRAIN_SIZE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+
+        self.vectors = None  # capacity x dim, rows are unit length
+        self.active = None  # capacity bool mask of rows in use
+        self.row_ids = []  # row -> market id (None for free rows)
+        self.row_keys = []  # row -> text key
+        self.row_expiry = None  # capacity float64 epoch seconds, inf when unknown
+        self.rows = {}  # market id -> row
+        self.free_rows = []
+
+        self.centroids = None
+        self.row_lists = None  # row -> cluster number
+        self.lists = []  # cluster number -> set of rows
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, market_id):
+        return market_id in self.rows
+
+    def ids(self):
+        return list(self.rows)
+
+    # text key the market was indexed with, or None if it isn't indexed
+    def text_key(self, market_id):
+        row = self.rows.get(market_id)
+        return None if row is None else self.row_keys[row]
+
+    def _grow(self, needed):
+        if len(self.free_rows) >= needed:
+            return
+        capacity = 0 if self.vectors is None else len(self.vectors)
+        new_capacity = max(capacity * 2, capacity + needed - len(self.free_rows), 64)
+
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        active = np.zeros(new_capacity, dtype=bool)
+        row_lists = np.full(new_capacity, -1, dtype=np.int64)
+        row_expiry = np.full(new_capacity, np.inf)
+        if capacity:
+            vectors[:capacity] = self.vectors
+            active[:capacity] = self.active
+            row_lists[:capacity] = self.row_lists
+            row_expiry[:capacity] = self.row_expiry
+        self.vectors, self.active, self.row_lists, self.row_expiry = vectors, active, row_lists, row_expiry
+
+        self.row_ids.extend([None] * (new_capacity - capacity))
+        self.row_keys.extend([None] * (new_capacity - capacity))
+        self.free_rows = list(range(new_capacity - 1, capacity - 1, -1)) + self.free_rows
+
+    # insert or replace markets. vectors is (len(ids), dim); text_keys and expires_at (epoch seconds
+    # or None) are optional, one per id
+    def add(self, ids, vectors, text_keys=None, expires_at=None):
+        if len(ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+
+        self.remove([market_id for market_id in ids if market_id in self.rows])
+        self._grow(len(ids))
+
+        rows = np.empty(len(ids), dtype=np.int64)
+        for position, market_id in enumerate(ids):
+            row = self.free_rows.pop()
+            rows[position] = row
+            self.rows[market_id] = row
+            self.row_ids[row] = market_id
+            self.row_keys[row] = text_keys[position] if text_keys is not None else None
+            expiry = expires_at[position] if expires_at is not None else None
+            self.row_expiry[row] = np.inf if expiry is None else expiry
+        self.vectors[rows] = vectors
+        self.active[rows] = True
+
+        if self.centroids is None:
+            if len(self.rows) >= self.min_train_size:
+                self.train()
+        elif len(self.rows) >= RETRAIN_GROWTH_FACTOR * self.trained_size:
+            self.train()
+        else:
+            self._assign(rows)
+
+    def remove(self, ids):
+        for market_id in ids:
+            row = self.rows.pop(market_id, None)
+            if row is None:
+                continue
+            if self.centroids is not None and self.row_lists[row] >= 0:
+                self.lists[self.row_lists[row]].discard(row)
+            self.active[row] = False
+            self.row_lists[row] = -1
+            self.row_ids[row] = None
+            self.row_keys[row] = None
+            self.row_expiry[row] = np.inf
+            self.free_rows.append(row)
+
+    # remove every market whose expiry is at or before now and return their ids
+    def expire(self, now):
+        if self.row_expiry is None:
+            return []
+        expired = [self.row_ids[row] for row in np.flatnonzero(self.active & (self.row_expiry <= now)).tolist()]
+        self.remove(expired)
+        return expired
+
+    def _nearest_centroids(self, vectors, block_size=4096):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start:start + block_size]
+            assignments[start:start + block_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _assign(self, rows):
+        assignments = self._nearest_centroids(self.vectors[rows])
+        self.row_lists[rows] = assignments
+        for row, cluster in zip(rows.tolist(), assignments.tolist()):
+            self.lists[cluster].add(row)
+
+    # (re)cluster every indexed vector with spherical k-means, sqrt(n) clusters
+    def train(self):
+        rows = np.flatnonzero(self.active)
+        if len(rows) == 0:
+            return
+        data = self.vectors[rows]
+        num_lists = max(1, int(math.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(rows), num_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            self.centroids = centroids
+            assignments = self._nearest_centroids(data)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            counts = np.bincount(assignments, minlength=num_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = data[rng.choice(len(rows), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [set() for _ in range(num_lists)]
+        self.row_lists[:] = -1
+        self._assign(rows)
+        self.trained_size = len(rows)
+        logging.info(f'Trained ANN index on {len(rows)} vectors into {num_lists} lists')
+
+    # for each query vector, return up to k (market id, score) pairs sorted by descending score
+    def search(self, queries, k=5, nprobe=None):
+        queries = np.asarray(queries, dtype=np.float32)
+        if len(queries) == 0 or not self.rows:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+        nprobe = min(nprobe or self.nprobe, len(self.lists)) if self.centroids is not None else 0
+
+        if self.centroids is None:
+            all_rows = np.flatnonzero(self.active)
+            candidate_rows = [all_rows] * len(queries)
+        else:
+            probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            candidate_rows = [
+                np.fromiter(chain.from_iterable(self.lists[cluster] for cluster in probe), dtype=np.int64)
+                for probe in probes
+            ]
+
+        results = []
+        for query, rows in zip(queries, candidate_rows):
+            if len(rows) == 0:
+                results.append([])
+                continue
+            scores = self.vectors[rows] @ query
+            top = min(k, len(rows))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            results.append([(self.row_ids[rows[i]], float(scores[i])) for i in best])
+        return results
+
+    def save(self, path):
+        rows = np.flatnonzero(self.active)
+        temp_path = path + '.tmp.npz'
+        np.savez(
+            temp_path,
+            vectors=self.vectors[rows] if len(rows) else np.zeros((0, self.dim or 0), dtype=np.float32),
+            # fixed-width strings rather than objects, so loading never unpickles; '' is a missing text key
+            ids=np.array([str(self.row_ids[row]) for row in rows], dtype=str),
+            text_keys=np.array([self.row_keys[row] or '' for row in rows], dtype=str),
+            expires_at=self.row_expiry[rows] if len(rows) else np.zeros(0),
+            centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim or 0), dtype=np.float32),
+            meta=np.array(json.dumps({'trained_size': self.trained_size, 'nprobe': self.nprobe}))
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as saved:
+            meta = json.loads(str(saved['meta']))
+            index = cls(dim=saved['vectors'].shape[1] or None, nprobe=meta['nprobe'])
+            centroids = saved['centroids']
+            # add before restoring centroids so loading never triggers a retrain
+            index.min_train_size = math.inf
+            expires_at = saved['expires_at'].tolist() if 'expires_at' in saved.files else None
+            text_keys = [text_key or None for text_key in saved['text_keys'].tolist()]
+            index.add(saved['ids'].tolist(), saved['vectors'], text_keys, expires_at)
+            index.min_train_size = ANN_MIN_TRAIN_SIZE
+            if len(centroids):
+                index.centroids = centroids
+                index.lists = [set() for _ in range(len(centroids))]
+                index.trained_size = meta['trained_size']
+                index._assign(np.flatnonzero(index.active))
+        return index
+
+def _index_path(source):
+    return os.path.join(ANN_INDEX_DIR, f'{source}.npz')
+
+_indexes = {}
+
+# serializes incremental dedup runs, which read and update the shared indexes
+market_index_lock = threading.RLock()
+
+# the persisted index for a venue's markets, loaded from disk on first use
+def get_market_index(source):
+    with market_index_lock:
+        if source not in _indexes:
+            path = _index_path(source)
+            index = None
+            if os.path.exists(path):
+                try:
+                    index = IVFIndex.load(path)
+                    logging.info(f'Loaded {source} ANN index with {len(index)} markets')
+                except Exception as e:
+                    logging.error(f'Error loading {source} ANN index, rebuilding: {e}', exc_info=True)
+            _indexes[source] = index if index is not None else IVFIndex()
+        return _indexes[source]
+
+def save_market_index(source):
+    with market_index_lock:
+        os.makedirs(ANN_INDEX_DIR, exist_ok=True)
+        _indexes[source].save(_index_path(source))
@@ -1,22 +1,42 @@
 import os
+import json
+import logging
 from datetime import datetime, timedelta
 from datetime import timezone as datetime_timezone
-import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import atexit
+import threading
+import time
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-from kalshiUtils import initialize_kalshi_client, fetch_kalshi_markets
-from polymarketUtils import initialize_polymarket_clob_client, fetch_polymarket_markets
-from polymarketUtils import fetch_polymarket_markets
-from utils import query_recent, upsert_markets, find_duplicate_markets
-from database import supabase
+from kalshiUtils import initialize_kalshi_client, iter_kalshi_market_pages
+from polymarketUtils import iter_polymarket_pages
+from utils import get_deduplicated_market_rows, iter_deduplicated_market_rows
+from ingest import ingest_pages
+from utils import parse_close_time
+from market import Market
+from price_history import record_prices, get_price_history
+from arbitrage import spread_engine
+from sources import fetch_sources
+from market_cache import SnapshotCache, SharedSnapshot, MappedSnapshot
+from market_feed import market_feed, FeedFull
+from dedup_jobs import DedupJobs
+from leader import LeaderLock
+from refresh_scheduler import RefreshScheduler
+from rate_limit import limiter_stats
+from market_query import is_market_query, parse_market_query, matches_query, iter_snapshot_markets, take_page, ndjson_lines
+from metrics import registry, observe, gauge, SamplingProfiler
 
-from config import SOURCES, SOURCE_TABLES
+from config import SOURCES, SOURCE_TABLES, DEDUP_INCREMENTAL, MARKETS_CACHE_TTL
+from config import DEFAULT_HISTORY_DAYS, REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL
+from config import KALSHI_MAX_MARKETS, POLYMARKET_MAX_MARKETS, POLYMARKET_MIN_VOLUME
+from config import METRICS_ENABLED, PROFILING_ENABLED, SHARED_SNAPSHOT_WAIT
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,110 +49,366 @@ logging.getLogger('httpx').setLevel(logging.WARNING)
 # Suppress werkzeug logs
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
+# Markets are serialized as their table rows
+class MarketJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Market):
+            return o.to_row()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = MarketJSONProvider(app)
 CORS(app)
 
+# every request's latency goes into the http_request histogram, labelled by route, method and
+# status. With PROFILING_ENABLED, ?profile=true samples the request thread's stack while the view
+# runs and responds with the collapsed stacks instead of the view's body.
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get('profile') == 'true':
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        if not response.is_streamed:
+            response = app.response_class(profiler.collapsed(), mimetype='text/plain')
+    start = g.pop('request_start', None)
+    if METRICS_ENABLED and start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe('http_request', time.perf_counter() - start,
+                endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
 load_dotenv()
-kalshi_client = initialize_kalshi_client()
-polygon_client = initialize_polymarket_clob_client()
+
+# the kalshi SDK client is built by the first kalshi refresh, so only the leader ever builds one
+kalshi_client = None
+kalshi_client_lock = threading.Lock()
+
+def get_kalshi_client():
+    global kalshi_client
+    with kalshi_client_lock:
+        if kalshi_client is None:
+            kalshi_client = initialize_kalshi_client()
+        return kalshi_client
+
+# fetch updated markets for one source and store them in its table, each page as it arrives
+def refresh_source(source):
+    if source == 'kalshi': pages = iter_kalshi_market_pages(get_kalshi_client(), num_markets=KALSHI_MAX_MARKETS)
+    elif source == 'polymarket': pages = iter_polymarket_pages(
+        total_markets=POLYMARKET_MAX_MARKETS, volume_num_min=POLYMARKET_MIN_VOLUME)
+    else: raise ValueError(f'Unknown source: {source}')
+    markets, _ = ingest_pages(pages, SOURCE_TABLES[source], source)
+    return markets
+
+# latest markets and fetch status of every source; sources are refreshed on their own schedules
+latest_markets = {}
+latest_source_status = {}
+
+# refresh the given sources concurrently; a source that times out keeps its previous markets (its
+# status says so) but still stores its new markets when it finishes. Prices of the refreshed
+# markets are recorded and published. Returns ({source: markets}, {source: status}) for sources.
+def refresh_markets(sources):
+    markets_by_source, source_status = fetch_sources(
+        {source: (lambda source=source: refresh_source(source)) for source in sources})
+    latest_markets.update(markets_by_source)
+    latest_source_status.update(source_status)
+
+    refreshed_markets = []
+    for source in SOURCES:
+        refreshed_markets.extend(markets_by_source.get(source, []))
+
+    record_prices(refreshed_markets)
+    spread_engine.update_prices(refreshed_markets)
+    market_feed.publish(refreshed_markets)
+    return markets_by_source, source_status
+
+def merged_markets():
+    all_markets = []
+    for source in SOURCES:
+        all_markets.extend(latest_markets.get(source, []))
+    return all_markets, dict(latest_source_status)
+
+def refresh_all_markets():
+    refresh_markets(SOURCES)
+    return merged_markets()
+
+# refresh some sources into a new snapshot (see refresh_scheduler.py). If another refresh is
+# already running it is waited for instead, and that one refreshes every source.
+def refresh_scheduled_sources(sources):
+    def refresh():
+        refresh_markets(sources)
+        return merged_markets()
+    market_snapshot.refresh(refresh_fn=refresh)
+    return ({source: latest_markets[source] for source in sources if source in latest_markets},
+            {source: latest_source_status.get(source, {}) for source in sources})
+
+# with several workers, only the one holding the leader lock refreshes markets and runs the
+# scheduled dedup (see leader.py); it publishes every snapshot to a shared file the others serve
+leader_lock = LeaderLock()
+shared_snapshot = SharedSnapshot(load_markets=lambda rows: [Market.from_row(row) for row in rows])
+spread_pairs_loaded_at = None  # when dedup last reloaded the leader's pairs, passed on to followers
+
+def publish_snapshot(snapshot):
+    if leader_lock.is_leader:
+        shared_snapshot.publish(snapshot, pairs_loaded_at=spread_pairs_loaded_at)
+
+# /api/markets is served from this snapshot. The refresh scheduler replaces it at least every
+# REFRESH_MAX_INTERVAL, so the TTL only matters when the scheduler is not keeping up.
+market_snapshot = SnapshotCache(
+    refresh_all_markets,
+    serialize=lambda markets: app.json.dumps(markets).encode(),
+    ttl=max(MARKETS_CACHE_TTL, REFRESH_MAX_INTERVAL + REFRESH_MIN_INTERVAL),
+    on_refresh=publish_snapshot)
+
+followed_snapshot = None  # the leader's snapshot this follower last synced
+followed_snapshot_lock = threading.Lock()
+
+# a follower's view of the leader's latest snapshot. A new one updates the spread engine's prices
+# and this worker's feed subscribers, and the spread engine's pairs when dedup has reloaded the leader's.
+def sync_shared_snapshot():
+    global followed_snapshot
+    snapshot = shared_snapshot.get()
+    with followed_snapshot_lock:
+        if snapshot is None or snapshot is followed_snapshot:
+            return snapshot
+        previous, followed_snapshot = followed_snapshot, snapshot
+
+    if (previous is not None and spread_engine.loaded
+            and snapshot.header.get('pairs_loaded_at') != previous.header.get('pairs_loaded_at')):
+        spread_engine.load_pairs(get_deduplicated_market_rows())
+    spread_engine.update_prices(snapshot.markets)
+    market_feed.publish(snapshot.markets)
+    return snapshot
+
+# the snapshot this worker serves: its own on the leader, the leader's on a follower. A follower
+# that finds none published within SHARED_SNAPSHOT_WAIT (no leader yet) builds its own.
+def current_snapshot():
+    if leader_lock.is_leader:
+        return market_snapshot.get()
+    deadline = time.monotonic() + SHARED_SNAPSHOT_WAIT
+    snapshot = sync_shared_snapshot()
+    while snapshot is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+        snapshot = sync_shared_snapshot()
+    return snapshot if snapshot is not None else market_snapshot.get()
+
+def snapshot_age():
+    if leader_lock.is_leader or followed_snapshot is None:
+        return market_snapshot.age()
+    return time.time() - followed_snapshot.created_at
+
+refresh_scheduler = RefreshScheduler(refresh_scheduled_sources, SOURCES)
 
 @app.route('/api/markets')
 def get_markets():
     try:
-        current_time = datetime.now(datetime_timezone.utc)
-        all_markets = []
-
-        for source in SOURCES:
-            recent_markets = query_recent(current_time - timedelta(seconds=5))
-            #if there are recently pulled markets for [source], just return them
-            if recent_markets:
-                logging.info(f'Markets not fetched for {source}. Already have source data updated <5min ago.')
-                markets = [dict(market, source=source) for market in recent_markets]
-            #otherwise, fetch updated marketes for [source]
-            else:
-                if source == 'kalshi': markets = fetch_kalshi_markets(kalshi_client)
-                elif source == 'polymarket': markets = fetch_polymarket_markets(polygon_client)
-                else: logging.error(f'Unknown source: {source}')
-                upsert_markets(markets, SOURCE_TABLES[source])
-                
-            all_markets.extend(markets)
+        snapshot = current_snapshot()
+
+        # filtered, paginated or streamed listing (see market_query.py for the parameters)
+        if is_market_query(request.args):
+            return query_response(iter_snapshot_markets(snapshot, parse_market_query(request.args)), 'markets')
         
-        logging.info(f'sending {len(all_markets)} markets to frontend')
+        logging.info(f'sending {len(snapshot.markets)} markets to frontend')
 
-        return jsonify(all_markets)
+        if isinstance(snapshot, MappedSnapshot):
+            # straight from the shared file, with sendfile where the server supports it
+            response = app.response_class(
+                wrap_file(request.environ, snapshot.open_body()), mimetype='application/json', direct_passthrough=True)
+            response.content_length = len(snapshot.body)
+        else:
+            response = app.response_class(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['X-Source-Status'] = json.dumps(snapshot.source_status)
+        response.headers['X-Snapshot-Age'] = str(int(time.time() - snapshot.created_at))
+        return response.make_conditional(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f'Error fetching markets: {e}', exc_info=True)
         return jsonify({"error": "Internal Server Error"}), 500
 
-@app.route('/api/deduplicate_markets', methods=['POST'])
-def deduplicate_markets():
+# server-sent events: a snapshot of every market's prices, then the changes after each refresh
+# (see market_feed.py)
+@app.route('/api/markets/stream')
+def stream_markets():
+    try:
+        # the first subscriber of a fresh process waits for the initial refresh, like /api/markets
+        current_snapshot()
+        subscriber = market_feed.subscribe()
+    except FeedFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f'Error opening market stream: {e}', exc_info=True)
+        return jsonify({"error": "Internal Server Error"}), 500
+
+    response = app.response_class(market_feed.stream(subscriber), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# respond with one page of (cursor position, item) pairs as {key: [...], next_cursor}, or stream
+# them all as NDJSON when format=ndjson
+def query_response(items, key):
+    query = parse_market_query(request.args)
+    if query['ndjson']:
+        return app.response_class(
+            stream_with_context(ndjson_lines(items, app.json.dumps, query['limit'])),
+            mimetype='application/x-ndjson')
+
+    page, next_cursor = take_page(items, query['limit'])
+    return jsonify({key: page, 'next_cursor': next_cursor})
+
+# price history of one market (kalshi ticker or polymarket id) between ?start= and ?end= (ISO 8601,
+# default the last DEFAULT_HISTORY_DAYS days). ?source= picks the venue when an id exists on both.
+@app.route('/api/markets/<market_id>/history')
+def get_market_history(market_id):
     try:
-        all_markets = []
-        for table_name in SOURCE_TABLES.values():
-            response = supabase.table(table_name).select('*').execute()
-            all_markets.extend(response.data)
+        end = parse_close_time(request.args.get('end')) if request.args.get('end') else datetime.now(datetime_timezone.utc)
+        start = parse_close_time(request.args.get('start')) if request.args.get('start') else end - timedelta(days=DEFAULT_HISTORY_DAYS)
+        if start is None or end is None:
+            return jsonify({"error": "Invalid start or end"}), 400
 
-        if not all_markets:
-            return jsonify({"error": "No markets found in any source table"}), 400
+        store = get_price_history()
+        for source in ([request.args['source']] if request.args.get('source') else SOURCES):
+            history = store.history(f'{source}:{market_id}', int(start.timestamp()), int(end.timestamp()))
+            if history is not None:
+                history['time'] = [datetime.fromtimestamp(t, datetime_timezone.utc).isoformat() for t in history['time']]
+                return jsonify({'market_id': market_id, 'source': source, **history})
 
-        deduplicated_markets = find_duplicate_markets(all_markets)
+        return jsonify({"error": f"No price history for {market_id}"}), 404
+    except Exception as e:
+        logging.error(f'Error fetching price history: {e}', exc_info=True)
+        return jsonify({"error": "Internal Server Error"}), 500
 
-        return jsonify({"deduplicated_markets": deduplicated_markets})
+@app.route('/api/deduplicate_markets', methods=['POST'])
+def deduplicate_markets():
+    try:
+        # ?full=true re-matches every market instead of only those updated since the last run
+        full = request.args.get('full', 'false').lower() == 'true' or not DEDUP_INCREMENTAL
+        job = dedup_jobs.submit(full)
+        # ?wait=true holds the request until the job finishes, for scripts
+        if request.args.get('wait', 'false').lower() == 'true':
+            return jsonify(dedup_jobs.wait(job['id']))
+        return jsonify(job), 202
     except Exception as e:
-        logging.error(f'Error during deduplication: {e}', exc_info=True)
+        logging.error(f'Error starting deduplication: {e}', exc_info=True)
         return jsonify({"error": "Internal Server Error"}), 500
 
+# a dedup job's stage and outcome; ?results=true streams the markets it left unpaired as NDJSON
+@app.route('/api/dedup_jobs/<job_id>')
+def get_dedup_job(job_id):
+    job = dedup_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown dedup job {job_id}"}), 404
+    if request.args.get('results', 'false').lower() != 'true':
+        return jsonify(job)
+    if job['status'] != 'done':
+        return jsonify({"error": f"Dedup job {job_id} is {job['status']}"}), 409
+
+    def lines():
+        with open(dedup_jobs.results_path(job_id)) as f:
+            yield from f
+
+    return app.response_class(lines(), mimetype='application/x-ndjson')
+
 @app.route('/api/get_deduplicated_markets')
+@app.route('/api/deduplicated_markets')
 def get_deduplicated_markets():
     try:
-        # Fetch deduplicated markets
-        response = supabase.table('duplicate_markets').select('*').execute()
-        deduplicated_markets = response.data
-
-        # Fetch full market data for each deduplicated pair
-        full_markets = []
-        for pair in deduplicated_markets:
-            kalshi_response = supabase.table('kalshi_markets').select('*').eq('ticker', pair['kalshi_market_id']).execute()
-            polymarket_response = supabase.table('polymarket_markets').select('*').eq('id', pair['polymarket_market_id']).execute()
-
-            try:
-                kalshi_market = kalshi_response.data[0]
-                polymarket_market = polymarket_response.data[0]
-            
-            except Exception as e:
-                logging.info(f"Error fetching market data: {e}")
-                logging.info(f"Kalshi response: {kalshi_response}")
-                logging.info(f"Polymarket response: {polymarket_response}")
-
-            combined_market = {
-                'title': kalshi_market['title'],
-                'description': kalshi_market['description'],
-                'kalshi_yes_price': kalshi_market['yes_price'],
-                'kalshi_no_price': kalshi_market['no_price'],
-                'polymarket_yes_price': polymarket_market['yes_price'],
-                'polymarket_no_price': polymarket_market['no_price'],
-                'kalshi_volume': kalshi_market['volume'],
-                'polymarket_volume': polymarket_market['volume'],
-                'kalshi_volume_24h': kalshi_market['volume_24h'],
-                'polymarket_volume_24h': polymarket_market['volume_24h'],
-                'close_time': kalshi_market['close_time'],
-                'kalshi_ticker': kalshi_market['ticker'],
-                'polymarket_id': polymarket_market['id']
-            }
-            full_markets.append(combined_market)
+        # filtered, paginated or streamed listing; the cursor is an offset into the stored pairs
+        if is_market_query(request.args):
+            query = parse_market_query(request.args)
+            if query['cursor'] is not None and not isinstance(query['cursor'], int):
+                raise ValueError('Invalid cursor')
+            rows = iter_deduplicated_market_rows(offset=query['cursor'] or 0)
+            matching_rows = (
+                (position, row) for position, row in rows
+                if matches_query(row, query, volume=pair_volume(row), sources=PAIR_SOURCES)
+            )
+            return query_response(matching_rows, 'markets')
+
+        # Fetch deduplicated pairs joined with the full market data of both sides
+        full_markets = get_deduplicated_market_rows()
 
         return jsonify(full_markets)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f'Error fetching deduplicated markets: {e}', exc_info=True)
         return jsonify({"error": "Internal Server Error"}), 500
 
-def scheduled_deduplication():
-    with app.app_context():
-        deduplicate_markets()
+# a duplicate pair has a market on both venues, so a source= filter for either matches it
+PAIR_SOURCES = ('kalshi', 'polymarket')
+
+# a duplicate pair is only as liquid as its thinner side
+def pair_volume(row):
+    try:
+        return min(float(row['kalshi_volume']), float(row['polymarket_volume']))
+    except (TypeError, ValueError):
+        return None
+
+# cross-venue arbitrage opportunities among duplicate pairs, best first (see arbitrage.py).
+# ?limit= caps the number of pairs, ?min_edge= drops pairs with a smaller locked-in edge.
+@app.route('/api/arbitrage')
+def get_arbitrage():
+    try:
+        limit = int(request.args.get('limit', 100))
+        min_edge = float(request.args.get('min_edge', 0))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or min_edge"}), 400
+    try:
+        if not spread_engine.loaded:
+            spread_engine.load_pairs(get_deduplicated_market_rows())
+
+        return jsonify({
+            'computed_at': spread_engine.computed_at,
+            'pairs': spread_engine.opportunities(limit=limit, min_edge=min_edge)
+        })
+    except Exception as e:
+        logging.error(f'Error computing arbitrage opportunities: {e}', exc_info=True)
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# refresh schedule, queue depth, achieved refresh latency and rate limiter counters per venue
+@app.route('/api/refresh_status')
+def get_refresh_status():
+    return jsonify(refresh_scheduler.metrics())
+
+# Prometheus text format: stage histograms, counters and the gauges registered below
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def scheduled_sources():
+    return refresh_scheduler.metrics()['sources']
+
+gauge('market_snapshot_age_seconds', snapshot_age, 'Seconds since the market snapshot was built')
+gauge('leader', lambda: int(leader_lock.is_leader), '1 if this worker runs the schedulers, else 0')
+gauge('market_feed_subscribers', lambda: len(market_feed.subscribers), 'Open /api/markets/stream connections')
+gauge('refresh_queue_depth', refresh_scheduler.queue_depth, 'Venues due for a refresh')
+gauge('venue_staleness_seconds', lambda: {(source, ): state['staleness'] for source, state in scheduled_sources().items()},
+      'Seconds since the venue was last refreshed', ('venue', ))
+gauge('venue_refresh_interval_seconds', lambda: {(source, ): state['interval'] for source, state in scheduled_sources().items()},
+      'Current refresh interval of the venue', ('venue', ))
+gauge('venue_requests_waiting', lambda: {(venue, ): stats['waiting'] for venue, stats in limiter_stats().items()},
+      'Requests waiting on the venue rate limiter', ('venue', ))
 
-def fetch_all_markets():
-    with app.app_context():
-        get_markets()
+# dedup runs as jobs on the leader's process pool (see dedup_jobs.py); any worker can submit one or
+# report on it. The leader's spread engine picks up the new pairs when a job finishes
+def reload_spread_pairs(job):
+    global spread_pairs_loaded_at
+    spread_engine.load_pairs(get_deduplicated_market_rows())
+    spread_pairs_loaded_at = time.time()
+
+dedup_jobs = DedupJobs(on_done=reload_spread_pairs)
+
+def scheduled_deduplication():
+    dedup_jobs.submit(full=not DEDUP_INCREMENTAL)
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(
@@ -142,16 +418,25 @@ scheduler.add_job(
     name='Deduplicate markets every 5 hours',
     replace_existing=True)
 
-scheduler.add_job(
-    fetch_all_markets,
-    trigger=CronTrigger(hour='*'),  # Run every hour
-    id='fetch_markets_task',
-    name='Fetch markets every hour',
-    replace_existing=True)
-scheduler.start()
+def start_schedulers():
+    scheduler.start()
+
+    # markets are refreshed per source by the adaptive refresh scheduler
+    refresh_scheduler.start()
+
+    # dedup jobs submitted by any worker run here
+    dedup_jobs.start()
+
+    # Shut down the schedulers when exiting the app
+    atexit.register(lambda: scheduler.shutdown())
+    atexit.register(refresh_scheduler.stop)
 
-# Shut down the scheduler when exiting the app
-atexit.register(lambda: scheduler.shutdown())
+# processes spawned for the dedup pool import this script again as __mp_main__ when it is run
+# directly; only the serving process that wins the leader lock runs the schedulers, and the other
+# workers sync its snapshot while they wait to take over
+if __name__ != '__mp_main__':
+    leader_lock.watch(start_schedulers, on_follower=sync_shared_snapshot)
+    atexit.register(dedup_jobs.shutdown)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 3000))
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+# cross-venue spread engine over the stored kalshi/polymarket duplicate pairs.
+#
+# Prices and volumes of every pair live in parallel numpy arrays, so spreads, arbitrage edges and
+# rankings for all pairs are one vectorized pass. After each market refresh only the price slots of
+# the refreshed markets are overwritten before that pass; the pair set itself is reloaded after dedup.
+#
+# Buying YES on one venue and NO on the other pays out 1 whatever happens, so
+#   edge = 1 - (yes price on one venue + no price on the other)
+# is the locked-in profit per contract (before fees) in the cheaper of the two directions.
+# Pairs are ranked by edge * log1p(liquidity), liquidity being the smaller of the two volumes.
+
+DIRECTIONS = ('kalshi_yes_polymarket_no', 'polymarket_yes_kalshi_no')
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+# NaN (missing price or volume) is not valid JSON
+def _json_float(value):
+    return None if np.isnan(value) else float(value)
+
+class SpreadEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._set_pairs([])
+
+    def _set_pairs(self, rows):
+        self.rows = rows
+        self.kalshi_positions = {}
+        self.polymarket_positions = {}
+        for position, row in enumerate(rows):
+            self.kalshi_positions.setdefault(str(row['kalshi_ticker']), []).append(position)
+            self.polymarket_positions.setdefault(str(row['polymarket_id']), []).append(position)
+
+        def column(name):
+            return np.array([_float(row.get(name)) for row in rows], dtype=np.float64)
+
+        self.kalshi_yes = column('kalshi_yes_price')
+        self.kalshi_no = column('kalshi_no_price')
+        self.polymarket_yes = column('polymarket_yes_price')
+        self.polymarket_no = column('polymarket_no_price')
+        self.kalshi_volume = column('kalshi_volume')
+        self.polymarket_volume = column('polymarket_volume')
+        self._compute()
+
+    # replace the pair set with rows shaped like utils.combine_duplicate_markets output
+    def load_pairs(self, rows):
+        with self.lock:
+            self._set_pairs(list(rows))
+            self.loaded = True
+        logging.info(f'Loaded {len(self.rows)} duplicate pairs into the spread engine')
+
+    # overwrite the prices of pairs whose Markets are in a freshly fetched market list, then recompute.
+    # Markets are matched on Market.key only: titles are not unique within a venue.
+    def update_prices(self, markets):
+        with self.lock:
+            updated = 0
+            for market in markets:
+                if market.source == 'kalshi':
+                    positions = self.kalshi_positions.get(str(market.key), ())
+                    yes, no, volume = self.kalshi_yes, self.kalshi_no, self.kalshi_volume
+                elif market.source == 'polymarket':
+                    positions = self.polymarket_positions.get(str(market.key), ())
+                    yes, no, volume = self.polymarket_yes, self.polymarket_no, self.polymarket_volume
+                else:
+                    continue
+                for position in positions:
+                    yes[position] = _float(market.get('yes_price'))
+                    no[position] = _float(market.get('no_price'))
+                    volume[position] = _float(market.get('volume'))
+                    updated += 1
+            self._compute()
+        logging.info(f'Updated {updated} pair prices in {self.compute_seconds * 1000:.1f}ms')
+
+    def _compute(self):
+        start = time.perf_counter()
+        edges = np.stack([
+            1 - (self.kalshi_yes + self.polymarket_no),
+            1 - (self.polymarket_yes + self.kalshi_no)
+        ])
+        missing = np.isnan(edges)
+        direction = np.argmax(np.where(missing, -np.inf, edges), axis=0)
+        edge = np.take_along_axis(edges, direction[np.newaxis], axis=0)[0]
+
+        liquidity = np.fmin(self.kalshi_volume, self.polymarket_volume)
+        score = edge * np.log1p(np.clip(liquidity, 0, None))
+
+        self.yes_spread = self.kalshi_yes - self.polymarket_yes
+        self.edge = edge
+        self.direction = direction
+        self.liquidity = liquidity
+        self.score = score
+        self.ranking = np.argsort(-np.nan_to_num(score, nan=-np.inf), kind='stable')
+        self.computed_at = time.time()
+        self.compute_seconds = time.perf_counter() - start
+
+    # best ranked pairs with an edge of at least min_edge
+    def opportunities(self, limit=100, min_edge=0.0):
+        with self.lock:
+            ranking = self.ranking[np.nan_to_num(self.edge[self.ranking], nan=-np.inf) >= min_edge][:limit]
+            return [{
+                **self.rows[position],
+                'kalshi_yes_price': _json_float(self.kalshi_yes[position]),
+                'kalshi_no_price': _json_float(self.kalshi_no[position]),
+                'polymarket_yes_price': _json_float(self.polymarket_yes[position]),
+                'polymarket_no_price': _json_float(self.polymarket_no[position]),
+                'kalshi_volume': _json_float(self.kalshi_volume[position]),
+                'polymarket_volume': _json_float(self.polymarket_volume[position]),
+                'yes_spread': _json_float(self.yes_spread[position]),
+                'edge': _json_float(self.edge[position]),
+                'direction': DIRECTIONS[self.direction[position]],
+                'liquidity': _json_float(self.liquidity[position]),
+                'score': _json_float(self.score[position])
+            } for position in ranking.tolist()]
+
+spread_engine = SpreadEngine()
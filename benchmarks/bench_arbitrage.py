@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arbitrage import SpreadEngine
+from market import Market
+
+# Times the spread engine's vectorized pass (spreads, edges, ranking) and a full price refresh over
+# synthetic duplicate pairs.
+#
+#   python benchmarks/bench_arbitrage.py --pairs 1000,10000,50000,100000
+
+
+def synthetic_pairs(num_pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    kalshi_yes = rng.uniform(0.01, 0.99, num_pairs)
+    polymarket_yes = np.clip(kalshi_yes + rng.normal(0, 0.03, num_pairs), 0.01, 0.99)
+    volumes = rng.lognormal(8, 2, (2, num_pairs))
+    return [{
+        'title': f'pair {index}',
+        'kalshi_ticker': f'K-{index}',
+        'polymarket_id': index,
+        'polymarket_title': f'pair {index}',
+        'kalshi_yes_price': kalshi_yes[index],
+        'kalshi_no_price': 1 - kalshi_yes[index] + 0.01,
+        'polymarket_yes_price': polymarket_yes[index],
+        'polymarket_no_price': 1 - polymarket_yes[index] + 0.01,
+        'kalshi_volume': volumes[0, index],
+        'polymarket_volume': volumes[1, index]
+    } for index in range(num_pairs)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', default='1000,10000,50000,100000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>7} {'compute (ms)':>13} {'refresh (ms)':>13} {'top 100 (ms)':>13}")
+    for num_pairs in (int(pairs) for pairs in args.pairs.split(',')):
+        rows = synthetic_pairs(num_pairs)
+        engine = SpreadEngine()
+        engine.load_pairs(rows)
+
+        compute_times = []
+        for _ in range(args.repeat):
+            engine._compute()
+            compute_times.append(engine.compute_seconds)
+
+        refreshed = [Market('kalshi', row['title'], ticker=row['kalshi_ticker'], yes_price=0.5, no_price=0.5, volume=1)
+                     for row in rows]
+        start = time.perf_counter()
+        engine.update_prices(refreshed)
+        refresh_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine.opportunities(limit=100)
+        top_seconds = time.perf_counter() - start
+
+        print(f"{num_pairs:>7} {np.median(compute_times) * 1000:>13.2f} {refresh_seconds * 1000:>13.2f} {top_seconds * 1000:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
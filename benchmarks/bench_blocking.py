@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blocking import candidate_pairs, candidate_recall
+from config import BLOCK_UNDATED_MAX_SIZE
+from matching import top_k_matches, candidate_matches, select_one_to_one
+from market import Market
+from benchmarks.fakes import FakeEncoder, synthetic_universe
+
+# Compares full dedup matching with and without the blocking prefilter (see blocking.py) on a
+# synthetic universe: pairs scored, wall time, and recall against the brute-force matcher, both of
+# its candidate matches and of the one-to-one pairs dedup stores, and of the planted duplicates.
+# The fixture dates half the duplicates up to two weeks apart across the venues, as the venues do;
+# the date-only block loses those, the soft block finds them again through their rare tokens. The
+# hashing FakeEncoder also scores some unrelated titles above the threshold; those brute-force
+# matches close months apart, so blocking drops them and its recall against brute force is below 1.
+#
+#   python benchmarks/bench_blocking.py --sizes 10000,50000,100000
+#
+# Titles are embedded with the hashing FakeEncoder, so no model is needed.
+
+
+def universe_markets(size, seed):
+    universe = synthetic_universe(size, election_fraction=0, seed=seed)
+    kalshi = [Market.from_kalshi(market) for market in universe['kalshi']]
+    polymarket = [Market.from_polymarket(market) for market in universe['gamma']]
+    # market positions of the planted duplicates
+    kalshi_positions = {market.ticker: position for position, market in enumerate(kalshi)}
+    polymarket_positions = {market.id: position for position, market in enumerate(polymarket)}
+    planted = {(kalshi_positions[ticker], polymarket_positions[market_id]) for ticker, market_id in universe['duplicates']}
+    return kalshi, polymarket, planted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,50000')
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    encode = FakeEncoder()
+    print(f"{'markets':>8} {'impl':>9} {'pairs scored':>14} {'wall (s)':>9} {'match recall':>13} {'pair recall':>12} {'planted':>8}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        kalshi, polymarket, planted = universe_markets(size, args.seed)
+        kalshi_embeddings = encode([f'{market.title} {market.description}' for market in kalshi])
+        polymarket_embeddings = encode([f'{market.title} {market.description}' for market in polymarket])
+
+        start = time.perf_counter()
+        reference = top_k_matches(kalshi_embeddings, polymarket_embeddings, threshold=args.threshold)
+        brute_seconds = time.perf_counter() - start
+        reference_pairs = {pair[:2] for pair in select_one_to_one(reference)}
+        print(f"{size:>8} {'brute':>9} {len(kalshi) * len(polymarket):>14} {brute_seconds:>9.2f} {1:>13.3f} {1:>12.3f} "
+              f"{len(reference_pairs & planted) / len(planted):>8.3f}")
+
+        # the date-only block requires close days within BLOCK_CLOSE_DAYS; the soft block also pairs rare tokens
+        # at any close date, which is what finds the planted duplicates the venues date weeks apart
+        for impl, undated_max_size in (('date only', 0), ('soft', BLOCK_UNDATED_MAX_SIZE)):
+            start = time.perf_counter()
+            kalshi_positions, polymarket_positions = candidate_pairs(kalshi, polymarket, undated_max_size=undated_max_size)
+            blocking_seconds = time.perf_counter() - start
+            matches = candidate_matches(kalshi_embeddings, polymarket_embeddings, kalshi_positions, polymarket_positions,
+                                        threshold=args.threshold)
+            blocked_seconds = time.perf_counter() - start
+            pairs = {pair[:2] for pair in select_one_to_one(matches)}
+            pair_recall = len(pairs & reference_pairs) / max(len(reference_pairs), 1)
+            print(f"{size:>8} {impl:>9} {len(kalshi_positions):>14} {blocked_seconds:>9.2f} "
+                  f"{candidate_recall(kalshi_positions, polymarket_positions, reference):>13.3f} {pair_recall:>12.3f} "
+                  f"{len(pairs & planted) / len(planted):>8.3f}"
+                  f"   ({blocking_seconds:.2f}s building blocks)")
+
+if __name__ == '__main__':
+    main()
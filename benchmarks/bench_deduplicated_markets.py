@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from benchmarks.fakes import FakeSupabase
+
+# Compares the old per-pair lookups in /api/get_deduplicated_markets (two queries per duplicate
+# pair) against utils.get_deduplicated_market_rows (bulk in_ queries joined in memory), on an
+# in-memory supabase client that adds a fixed latency to every query.
+#
+#   python benchmarks/bench_deduplicated_markets.py --pairs 100,1000,5000 --latency-ms 2
+
+
+def market_row(source, index):
+    return {
+        'ticker' if source == 'kalshi' else 'id': f'K-{index}' if source == 'kalshi' else str(index),
+        'source': source,
+        'title': f'{source} market {index}',
+        'description': '',
+        'yes_price': 0.4,
+        'no_price': 0.6,
+        'volume': 1000,
+        'volume_24h': 10,
+        'close_time': '2030-01-01T00:00:00Z'
+    }
+
+
+def fake_database(num_pairs, latency):
+    return FakeSupabase({
+        'kalshi_markets': [market_row('kalshi', index) for index in range(num_pairs * 2)],
+        'polymarket_markets': [market_row('polymarket', index) for index in range(num_pairs * 2)],
+        'duplicate_markets': [
+            {'kalshi_market_id': f'K-{index}', 'polymarket_market_id': str(index)} for index in range(num_pairs)
+        ]
+    }, latency=latency)
+
+
+# the endpoint's lookup loop as it was before bulk queries
+def legacy_rows(client):
+    full_markets = []
+    for pair in client.table('duplicate_markets').select('*').execute().data:
+        kalshi_market = client.table('kalshi_markets').select('*').eq('ticker', pair['kalshi_market_id']).execute().data[0]
+        polymarket_market = client.table('polymarket_markets').select('*').eq('id', pair['polymarket_market_id']).execute().data[0]
+        full_markets.append(utils.combine_duplicate_markets(kalshi_market, polymarket_market))
+    return full_markets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', default='100,1000,5000')
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>6} {'impl':>7} {'queries':>8} {'wall (s)':>9} {'rows':>6}")
+    for num_pairs in (int(pairs) for pairs in args.pairs.split(',')):
+        for name in ('legacy', 'bulk'):
+            client = fake_database(num_pairs, args.latency_ms / 1000)
+            utils.supabase = client
+            start = time.perf_counter()
+            rows = legacy_rows(client) if name == 'legacy' else utils.get_deduplicated_market_rows()
+            elapsed = time.perf_counter() - start
+            print(f"{num_pairs:>6} {name:>7} {client.query_count:>8} {elapsed:>9.3f} {len(rows):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market import Market, MarketBatch
+
+# Memory and build time of N normalized polymarket markets as the previous per-market dicts,
+# as slotted Market records, and as a columnar MarketBatch built from those records.
+#
+#   python benchmarks/bench_market_memory.py --markets 100000
+
+
+def gamma_payload(index):
+    return {
+        'id': str(500000 + index),
+        'question': f'Will synthetic market {index} resolve YES?',
+        'description': f'Synthetic market {index} for the memory benchmark.',
+        'outcomePrices': json.dumps([f'{(index % 97) / 100:.2f}', f'{1 - (index % 97) / 100:.2f}']),
+        'volume': str(100000 + index),
+        'volume24hr': index % 5000,
+        'events': [{'endDate': '2030-01-01T00:00:00Z'}]
+    }
+
+
+# the dict shape massage_polymarket_data built before Market
+def legacy_dict(market):
+    outcome_prices = json.loads(market['outcomePrices'])
+    return {
+        'source': 'polymarket',
+        'title': market['question'],
+        'description': market['description'],
+        'yes_price': float(outcome_prices[0]),
+        'no_price': float(outcome_prices[1]),
+        'volume': market['volume'],
+        'volume_24h': market.get('volume24hr', 0),
+        'close_time': market['events'][0]['endDate']
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=100000)
+    args = parser.parse_args()
+
+    payloads = [gamma_payload(index) for index in range(args.markets)]
+    # the strings are shared with the payloads in every variant, so only per-market overhead differs
+    dicts, dict_bytes, dict_seconds = measure(lambda: [legacy_dict(payload) for payload in payloads])
+    markets, market_bytes, market_seconds = measure(lambda: [Market.from_polymarket(payload) for payload in payloads])
+    batch, batch_bytes, batch_seconds = measure(lambda: MarketBatch.from_markets(markets))
+
+    print(f"{'form':>12} {'markets':>8} {'MB':>8} {'bytes/market':>13} {'build (s)':>10}")
+    for name, count, size, seconds in (
+            ('dict', len(dicts), dict_bytes, dict_seconds),
+            ('Market', len(markets), market_bytes, market_seconds),
+            ('MarketBatch', len(batch), batch_bytes, batch_seconds)):
+        print(f'{name:>12} {count:>8} {size / 1e6:>8.1f} {size / count:>13.0f} {seconds:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
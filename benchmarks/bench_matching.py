@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import normalize_embeddings, top_k_matches, select_one_to_one
+
+# Compares the blocked kalshi x polymarket matcher against the previous find_duplicate_markets
+# approach (dense n x n cosine_similarity plus a nested python loop over every pair).
+#
+#   python benchmarks/bench_matching.py --sizes 1000,10000,50000
+#
+# The legacy path is skipped above --legacy-max markets (default 1000, which already takes ~10s
+# in the python loop): at 10k it is ~100x slower, and at 50k it needs a 10GB similarity matrix
+# and ~1.25 billion python loop iterations.
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+# random unit vectors, with a slice of polymarket rows planted as near-copies of kalshi rows
+def synthetic_embeddings(num_markets, duplicate_fraction=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    num_kalshi = num_markets // 2
+    num_polymarket = num_markets - num_kalshi
+    kalshi = rng.standard_normal((num_kalshi, EMBEDDING_DIM), dtype=np.float32)
+    polymarket = rng.standard_normal((num_polymarket, EMBEDDING_DIM), dtype=np.float32)
+
+    num_duplicates = int(min(num_kalshi, num_polymarket) * duplicate_fraction)
+    polymarket[:num_duplicates] = kalshi[:num_duplicates] + 0.3 * rng.standard_normal(
+        (num_duplicates, EMBEDDING_DIM), dtype=np.float32)
+    return normalize_embeddings(kalshi), normalize_embeddings(polymarket)
+
+
+def legacy_match(kalshi, polymarket, threshold):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    embeddings = np.vstack([kalshi, polymarket])
+    sources = ['kalshi'] * len(kalshi) + ['polymarket'] * len(polymarket)
+    similarity_matrix = cosine_similarity(embeddings)
+
+    duplicate_pairs = set()
+    for market_index in range(len(embeddings)):
+        for comparison_index in range(market_index + 1, len(embeddings)):
+            if similarity_matrix[market_index][comparison_index] > threshold:
+                duplicate_pairs.add((market_index, comparison_index))
+    return [pair for pair in duplicate_pairs if sources[pair[0]] != sources[pair[1]]]
+
+
+def blocked_match(kalshi, polymarket, threshold):
+    return select_one_to_one(top_k_matches(kalshi, polymarket, threshold=threshold))
+
+
+def measure(match_fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = match_fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--legacy-max', type=int, default=1000)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+
+    print(f"{'markets':>8} {'impl':>8} {'wall (s)':>10} {'peak MiB':>10} {'pairs':>7}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        kalshi, polymarket = synthetic_embeddings(size)
+        rows = [('blocked', blocked_match)]
+        if size <= args.legacy_max:
+            rows.append(('legacy', legacy_match))
+        for name, match_fn in rows:
+            elapsed, peak, num_pairs = measure(match_fn, kalshi, polymarket, args.threshold)
+            print(f"{size:>8} {name:>8} {elapsed:>10.3f} {peak / 2 ** 20:>10.1f} {num_pairs:>7}")
+        if size > args.legacy_max:
+            print(f"{size:>8} {'legacy':>8} {'skipped':>10} {size * size * 4 / 2 ** 20:>10.1f} (matrix alone)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polymarketUtils import fetch_polymarket_markets, massage_polymarket_data
+from rate_limit import configure_limiter, limiter_stats
+from benchmarks.fakes import VenueStub
+
+# Serves a fake gamma-api /markets endpoint on localhost with a fixed per-request latency and
+# compares the previous fetch loop (fresh requests.get per page, strictly sequential) against
+# fetch_polymarket_markets with a pooled session and 1..N pages in flight.
+#
+#   python benchmarks/bench_polymarket_fetch.py --markets 5000 --latency-ms 80 --workers 1,4,8
+#
+# --error-rate makes the stub answer a fraction of requests with 429 to exercise retry/backoff.
+# --rate sets the polymarket request budget (requests/s); the default is high enough not to bind.
+
+
+def fake_market(index):
+    return {
+        'id': str(index),
+        'question': f'Synthetic market {index}?',
+        'description': 'Synthetic market served by the benchmark stub.',
+        'outcomePrices': json.dumps(['0.42', '0.58']),
+        'volume': str(100000 + index),
+        'volume24hr': 1000,
+        'events': [{'endDate': '2030-01-01T00:00:00Z'}]
+    }
+
+
+# the fetch loop as it was before pooled/concurrent pagination
+def legacy_fetch(url, limit, total_markets):
+    all_markets = []
+    offset = 0
+    while len(all_markets) < total_markets:
+        try:
+            response = requests.get(f"{url}?limit={limit}&offset={offset}&volume_num_min=0&closed=false")
+            response.raise_for_status()
+            markets_data = response.json()
+            if not markets_data:
+                break
+            all_markets.extend(massage_polymarket_data(markets_data))
+            offset += limit
+            if len(markets_data) < limit:
+                break
+        except requests.exceptions.RequestException:
+            break
+    return all_markets[:total_markets]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--workers', default='1,4,8')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate', type=float, default=10000)
+    args = parser.parse_args()
+    configure_limiter('polymarket', args.rate, max(args.rate, 1))
+
+    stub = VenueStub([fake_market(index) for index in range(args.markets)], latency=args.latency_ms / 1000,
+                     error_rate=args.error_rate).__enter__()
+    url = stub.url('/markets')
+    # fetch one page past the end so every run sees the short page and stops on it
+    total_markets = args.markets + args.limit
+
+    runs = [('legacy', lambda: legacy_fetch(url, args.limit, total_markets))]
+    for workers in (int(workers) for workers in args.workers.split(',')):
+        runs.append((f'pooled x{workers}', lambda workers=workers: fetch_polymarket_markets(
+            None, limit=args.limit, total_markets=total_markets, volume_num_min=0, max_workers=workers, url=url)))
+
+    print(f"{'mode':>12} {'markets':>8} {'pages':>6} {'wall (s)':>9} {'pages/s':>8}")
+    for name, fetch in runs:
+        start = time.perf_counter()
+        markets = fetch()
+        elapsed = time.perf_counter() - start
+        pages = len(markets) // args.limit + 1
+        print(f"{name:>12} {len(markets):>8} {pages:>6} {elapsed:>9.2f} {pages / elapsed:>8.1f}")
+    print(f"rate limiter: {limiter_stats()['polymarket']}")
+
+    stub.__exit__(None, None, None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Replays synthetic market universes through the app offline (see replay.py) and reports latency
+# percentiles, throughput and peak RSS for every stage: a market refresh, /api/markets (full and
+# one filtered page), dedup (full, incremental build, incremental with nothing new) and
+# /api/deduplicated_markets. Each scale runs in its own process so peak RSS is per scale.
+#
+#   python benchmarks/bench_replay.py --scales 1000,10000,100000 --output replay.json
+#   python benchmarks/bench_replay.py --scales 1000,10000 --baseline replay.json
+#
+# With --baseline the run fails (exit 1) when a stage's p95 latency exceeds the baseline's by more
+# than --tolerance, or dedup recall drops.
+
+STAGES = ('refresh_markets', 'get_markets', 'get_markets_page', 'dedup_full', 'dedup_incremental_build',
+          'dedup_incremental_noop', 'get_deduplicated_markets')
+
+
+def run_scale(args, scale):
+    command = [sys.executable, os.path.abspath(__file__), '--run-scale', str(scale),
+               '--requests', str(args.requests), '--refreshes', str(args.refreshes),
+               '--latency-ms', str(args.latency_ms)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for scale, stages in results.items():
+        for stage, summary in stages.items():
+            previous = baseline.get(scale, {}).get(stage)
+            if not previous or 'p95_ms' not in summary:
+                continue
+            if summary['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                found.append(f"{scale} {stage}: p95 {summary['p95_ms']:.1f}ms vs {previous['p95_ms']:.1f}ms")
+            if summary.get('recall', 1) < previous.get('recall', 0):
+                found.append(f"{scale} {stage}: recall {summary['recall']:.3f} vs {previous['recall']:.3f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='1000,10000')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--refreshes', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--run-scale', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale:
+        logging.disable(logging.INFO)
+        from benchmarks.replay import run_replay
+        results = run_replay(args.run_scale, args.requests, args.refreshes, args.latency_ms / 1000)
+        print(json.dumps(results))
+        return
+
+    results = {}
+    print(f"{'markets':>8} {'stage':>26} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'items/s':>11} {'RSS MB':>7}")
+    for scale in (int(scale) for scale in args.scales.split(',')):
+        results[str(scale)] = run_scale(args, scale)
+        for stage in STAGES:
+            summary = results[str(scale)][stage]
+            print(f"{scale:>8} {stage:>26} {summary['runs']:>5} {summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} "
+                  f"{summary['p99_ms']:>9.1f} {summary['items_per_s'] or 0:>11.0f} {summary['peak_rss_mb']:>7.0f}")
+        dedup = results[str(scale)]['dedup_full']
+        print(f"{scale:>8} {'dedup recall':>26} {dedup['recall']:.3f} ({dedup['pairs']} pairs)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
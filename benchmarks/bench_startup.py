@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leader import LeaderLock
+
+# Time for a fresh worker to import app.py, which is what every gunicorn worker pays on boot and
+# restart, and the slowest modules by -X importtime. Also lists which heavy SDKs were imported:
+# the venue SDKs, supabase and the embedding model stack should only load when first used.
+#
+#   python benchmarks/bench_startup.py --runs 5
+#
+# This process holds the leader lock, so the imported app comes up as a follower and makes no
+# venue or database requests.
+
+HEAVY_MODULES = ('kalshi_python', 'py_clob_client', 'web3', 'supabase', 'sentence_transformers', 'torch', 'sklearn')
+
+CHILD = '''
+import json, os, sys, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'heavy': sorted(name for name in %r if name in sys.modules)}))
+sys.stdout.flush()
+os._exit(0)  # skip atexit hooks and the follower thread
+''' % (HEAVY_MODULES, )
+
+
+# (cumulative microseconds, module) for the modules app imports itself, from -X importtime output
+def slowest_imports(stderr, top):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # nested imports are indented two spaces per level
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-startup-')
+    lock_path = os.path.join(directory, 'leader.lock')
+    lock = LeaderLock(lock_path)
+    lock.try_acquire()
+    env = dict(os.environ, LEADER_LOCK_PATH=lock_path, SHARED_SNAPSHOT_PATH=os.path.join(directory, 'snapshot.bin'))
+    env.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    env.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.offline-bench')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    timings, stderr, heavy = [], '', []
+    for run in range(args.runs):
+        command = [sys.executable] + (['-X', 'importtime'] if run == 0 else []) + ['-c', CHILD]
+        result = subprocess.run(command, cwd=root, env=env, capture_output=True, text=True, check=True)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(report['seconds'])
+        heavy = report['heavy']
+        if run == 0:
+            stderr = result.stderr
+    lock.release()
+
+    timings.sort()
+    # the first run also pays -X importtime's overhead and a cold page cache
+    print(f'import app over {args.runs} runs: min {timings[0]:.2f}s, median {timings[len(timings) // 2]:.2f}s')
+    print(f"heavy modules loaded at import: {', '.join(heavy) or 'none'}")
+    print('slowest imports of app (first run):')
+    for microseconds, name in slowest_imports(stderr, args.top):
+        print(f'  {microseconds / 1e6:>6.2f}s  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+# in-process stand-ins for the external services, for benchmarks and offline tests
+
+# default upsert conflict keys of the supabase tables this app uses
+PRIMARY_KEYS = {
+    'kalshi_markets': ('ticker',),
+    'polymarket_markets': ('id',),
+    'duplicate_markets': ('kalshi_market_id', 'polymarket_market_id')
+}
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self.action = 'select'
+        self.payload = None
+        self.filters = []
+        self.ordering = []
+        self.row_range = None
+
+    def select(self, columns='*'):
+        self.action = 'select'
+        self.columns = None if columns == '*' else [column.strip() for column in columns.split(',')]
+        return self
+
+    # filters are (column, set of accepted values) for eq/in_, or (column, predicate) otherwise
+    def eq(self, column, value):
+        self.filters.append((column, {str(value)}))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and str(cell) > str(value)))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and str(cell) >= str(value)))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, {str(value) for value in values}))
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end + 1)
+        return self
+
+    def limit(self, count):
+        self.row_range = (0, count)
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.action, self.payload = 'upsert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.action, self.payload = 'insert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, latency=0.0, primary_keys=PRIMARY_KEYS):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.primary_keys = primary_keys
+        self.query_count = 0
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def table(self, table_name):
+        return FakeQuery(self, table_name)
+
+    # {str(value): [row positions]} for a column, rebuilt after writes, so eq/in_ lookups cost what
+    # an indexed lookup would rather than a table scan
+    def _column_index(self, table_name, column):
+        key = (table_name, column)
+        if key not in self.indexes:
+            index = {}
+            for position, row in enumerate(self.tables[table_name]):
+                index.setdefault(str(row.get(column)), []).append(position)
+            self.indexes[key] = index
+        return self.indexes[key]
+
+    def _matching_positions(self, query):
+        rows = self.tables[query.table_name]
+        positions = None
+        for column, accepted in query.filters:
+            if isinstance(accepted, set) and positions is None:
+                index = self._column_index(query.table_name, column)
+                positions = sorted(position for value in accepted for position in index.get(value, ()))
+            else:
+                check = accepted if callable(accepted) else (lambda cell, accepted=accepted: str(cell) in accepted)
+                positions = [
+                    position for position in (range(len(rows)) if positions is None else positions)
+                    if check(rows[position].get(column))
+                ]
+        return list(range(len(rows))) if positions is None else positions
+
+    def _execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.query_count += 1
+            rows = self.tables.setdefault(query.table_name, [])
+
+            if query.action == 'select':
+                matched = [rows[position] for position in self._matching_positions(query)]
+                for column, desc in reversed(query.ordering):
+                    matched.sort(key=lambda row: str(row.get(column)), reverse=desc)
+                if query.row_range:
+                    matched = matched[query.row_range[0]:query.row_range[1]]
+                if query.columns:
+                    return FakeResponse([{column: row.get(column) for column in query.columns} for row in matched])
+                return FakeResponse([dict(row) for row in matched])
+
+            self.indexes = {key: index for key, index in self.indexes.items() if key[0] != query.table_name}
+
+            if query.action == 'delete':
+                deleted = set(self._matching_positions(query))
+                self.tables[query.table_name] = [row for position, row in enumerate(rows) if position not in deleted]
+                return FakeResponse([rows[position] for position in sorted(deleted)])
+
+            if query.action == 'insert':
+                rows.extend(dict(row) for row in query.payload)
+                return FakeResponse(list(query.payload))
+
+            key_columns = self.primary_keys.get(query.table_name, ('id',))
+            positions = {tuple(str(row.get(column)) for column in key_columns): i for i, row in enumerate(rows)}
+            for row in query.payload:
+                key = tuple(str(row.get(column)) for column in key_columns)
+                if key in positions:
+                    rows[positions[key]] = {**rows[positions[key]], **row}
+                else:
+                    positions[key] = len(rows)
+                    rows.append(dict(row))
+            return FakeResponse(list(query.payload))
+
+
+# stand-in for kalshi_python.ApiInstance: get_markets pages through a fixed market list with an
+# offset cursor, like the trade API's opaque one
+class FakeKalshiApi:
+    def __init__(self, markets, latency=0.0):
+        self.markets = markets
+        self.latency = latency
+        self.calls = 0
+
+    def get_markets(self, limit=100, cursor=None, status=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        start = int(cursor or 0)
+        end = start + limit
+        return SimpleNamespace(markets=self.markets[start:end], cursor=str(end) if end < len(self.markets) else None)
+
+
+# local HTTP server for the venues' plain HTTP endpoints: gamma-api /markets (limit/offset pages of
+# gamma_markets) and the kalshi elections /v1/events. Every request waits latency seconds and is
+# answered 429 with probability error_rate.
+class VenueStub:
+    def __init__(self, gamma_markets=(), election_events=(), latency=0.0, error_rate=0.0):
+        gamma_markets = list(gamma_markets)
+        events_body = json.dumps({'events': list(election_events)}).encode()
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            wbufsize = 1 << 16  # send headers and body in one write so keep-alive isn't stalled by Nagle/delayed ACK
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                stub.requests += 1
+                if latency:
+                    time.sleep(latency)
+
+                if random.random() < error_rate:
+                    body, status = b'{"error": "rate limited"}', 429
+                elif url.path == '/markets':
+                    limit = int(query.get('limit', ['100'])[0])
+                    offset = int(query.get('offset', ['0'])[0])
+                    body, status = json.dumps(gamma_markets[offset:offset + limit]).encode(), 200
+                elif url.path == '/v1/events':
+                    body, status = events_body, 200
+                else:
+                    body, status = b'{"error": "not found"}', 404
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# deterministic stand-in for the sentence-transformers model: hashed bag of words, L2 normalized,
+# so texts sharing most of their words score high and unrelated texts score near 0
+class FakeEncoder:
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dimensions] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+WORDS = [f'{a}{b}' for a in ('al', 'bo', 'ci', 'da', 'ek', 'fu', 'ga', 'hi', 'jo', 'ku', 'le', 'mo', 'ni', 'op', 'pu',
+                             'ra', 'si', 'tu', 'vo', 'wy')
+         for b in ('ber', 'cast', 'dorn', 'fell', 'gate', 'hill', 'land', 'mark', 'port', 'rock', 'stad', 'ton',
+                   'vale', 'wick', 'worth')]
+# names of the people, teams and places questions are about; far rarer per title than WORDS
+ENTITIES = [f'{word}{suffix}' for word in WORDS
+            for suffix in ('ia', 'ov', 'ez', 'son', 'ski', 'ani', 'berg', 'ford', 'ley', 'more',
+                           'ward', 'ville', 'stein', 'holm', 'quist', 'rud', 'dal', 'vik', 'by', 'ic')]
+
+
+# a synthetic universe of num_markets markets split across the venues, as the venues serve them.
+# duplicate_fraction of the polymarket markets restate a kalshi market's question with one extra
+# word. The venues date the same question differently (market close vs event end), so half the
+# duplicates close on their kalshi market's day and the rest up to close_skew_days either side.
+# Returns {'kalshi': [api market], 'election_events': [...], 'gamma': [payload],
+# 'duplicates': [(ticker, polymarket id)]}.
+def synthetic_universe(num_markets, duplicate_fraction=0.2, election_fraction=0.02, seed=0, close_skew_days=14):
+    rng = random.Random(seed)
+    num_kalshi = num_markets // 2
+    num_polymarket = num_markets - num_kalshi
+    num_election = int(num_kalshi * election_fraction)
+
+    def question():
+        return 'Will ' + rng.choice(ENTITIES) + ' ' + ' '.join(rng.choice(WORDS) for _ in range(6)) + ' happen?'
+
+    def skewed(close_time):
+        skew = 0 if rng.random() < 0.5 else rng.randint(-close_skew_days, close_skew_days)
+        day = datetime.strptime(close_time, '%Y-%m-%dT%H:%M:%SZ') + timedelta(days=skew)
+        return day.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def close_time():
+        return f'2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z'
+
+    kalshi = []
+    for index in range(num_kalshi - num_election):
+        yes_ask = rng.randint(1, 99)
+        kalshi.append(SimpleNamespace(
+            ticker=f'SYN-{index}', title=question(), yes_ask=yes_ask, no_ask=101 - yes_ask,
+            volume=rng.randint(0, 10 ** 6), volume_24h=rng.randint(0, 10 ** 4), close_time=close_time()))
+    election_events = [{
+        'underlying': 'Synthetic election ',
+        'description_context': f'event {index}',
+        'markets': [{
+            'id': f'e{index}', 'ticker_name': f'ELEC-{index}', 'title': question(),
+            'yes_ask': rng.randint(1, 99) / 100, 'volume': rng.randint(0, 10 ** 6), 'close_date': close_time()
+        }]
+    } for index in range(num_election)]
+
+    gamma, duplicates = [], []
+    for index in range(num_polymarket):
+        if index < num_polymarket * duplicate_fraction and index < len(kalshi):
+            title = kalshi[index].title.replace(' happen?', f' {rng.choice(WORDS)} happen?')
+            end_date = skewed(kalshi[index].close_time)
+            duplicates.append((kalshi[index].ticker, str(index)))
+        else:
+            title = question()
+            end_date = close_time()
+        yes_price = rng.randint(1, 99) / 100
+        gamma.append({
+            'id': str(index), 'question': title, 'description': '',
+            'outcomePrices': json.dumps([str(yes_price), str(round(1 - yes_price, 2))]),
+            'volume': str(rng.randint(0, 10 ** 6)), 'volume24hr': rng.randint(0, 10 ** 4),
+            'events': [{'endDate': end_date}]
+        })
+
+    return {'kalshi': kalshi, 'election_events': election_events, 'gamma': gamma, 'duplicates': duplicates}
@@ -0,0 +1,149 @@
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import os
+import resource
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+# utils creates a supabase client at import time; it is replaced by the fake below
+os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.benchmark')
+
+import app as market_app
+import ann_index
+import embedding_model
+import kalshiUtils
+import polymarketUtils
+import price_history
+import rate_limit
+import utils
+from config import RATE_LIMITS
+from embedding_cache import EmbeddingCache
+from dedup_jobs import DedupJobs
+from benchmarks.fakes import FakeSupabase, FakeKalshiApi, VenueStub, FakeEncoder, synthetic_universe
+
+# Offline replay of a synthetic market universe through the app: the kalshi API, the gamma and
+# kalshi elections HTTP endpoints, supabase and the embedding model are replaced by the stand-ins
+# in fakes.py, and every file the app writes goes to a temporary directory. Nothing leaves the
+# machine. Used by bench_replay.py and the offline tests.
+
+
+@contextlib.contextmanager
+def replay_environment(universe, latency=0.0):
+    with contextlib.ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        stub = stack.enter_context(VenueStub(universe['gamma'], universe['election_events'], latency=latency))
+        database = FakeSupabase(
+            {'kalshi_markets': [], 'polymarket_markets': [], 'duplicate_markets': []}, latency=latency)
+        embedding_cache = EmbeddingCache(os.path.join(directory, 'embeddings'), 'fake')
+
+        for patch in (
+            mock.patch.object(utils, 'supabase', database),
+            mock.patch.object(market_app, 'kalshi_client', FakeKalshiApi(universe['kalshi'], latency)),
+            mock.patch.object(market_app, 'KALSHI_MAX_MARKETS', len(universe['kalshi'])),
+            mock.patch.object(market_app, 'POLYMARKET_MAX_MARKETS', len(universe['gamma'])),
+            mock.patch.object(market_app, 'POLYMARKET_MIN_VOLUME', 0),
+            mock.patch.object(market_app, 'DEDUP_INCREMENTAL', True),
+            mock.patch.object(kalshiUtils, 'KALSHI_ELECTION_EVENTS_URL', stub.url('/v1/events')),
+            mock.patch.object(polymarketUtils, 'GAMMA_MARKETS_URL', stub.url('/markets')),
+            # the stand-ins are not rate limited
+            mock.patch.dict(rate_limit._limiters, {venue: rate_limit.VenueLimiter(venue, 1e9, 1e9) for venue in RATE_LIMITS}),
+            mock.patch.object(price_history, '_store', price_history.PriceHistoryStore(os.path.join(directory, 'prices'))),
+            mock.patch.object(embedding_model, 'encode', FakeEncoder()),
+            mock.patch.object(utils, 'get_embedding_cache', lambda: embedding_cache),
+            mock.patch.object(ann_index, 'ANN_INDEX_DIR', os.path.join(directory, 'ann')),
+            mock.patch.object(ann_index, '_indexes', {}),
+            mock.patch.object(utils, 'DEDUP_STATE_PATH', os.path.join(directory, 'dedup_state.json')),
+            # dedup jobs run on a thread here: the stand-ins above only exist in this process
+            mock.patch.object(market_app, 'dedup_jobs', DedupJobs(
+                os.path.join(directory, 'dedup_jobs'), market_app.reload_spread_pairs,
+                stack.enter_context(ThreadPoolExecutor(max_workers=1)))),
+            mock.patch.object(market_app.market_snapshot, '_snapshot', None),
+            mock.patch.dict(market_app.latest_markets, clear=True),
+            mock.patch.dict(market_app.latest_source_status, clear=True),
+        ):
+            stack.enter_context(patch)
+
+        yield SimpleNamespace(client=market_app.app.test_client(), database=database, stub=stub)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies, items):
+    latencies = np.asarray(latencies)
+    return {
+        'runs': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'items_per_s': float(items / latencies.mean()) if latencies.mean() else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def check(response):
+    assert response.status_code == 200, f'{response.request.path}: {response.status_code} {response.get_data(as_text=True)[:200]}'
+    return response
+
+
+# run a dedup job to completion through the API
+def deduplicate(client, full=False):
+    job = check(client.post('/api/deduplicate_markets', query_string={'full': str(full).lower(), 'wait': 'true'})).get_json()
+    assert job['status'] == 'done', f'dedup job {job["id"]}: {job.get("error")}'
+    return job
+
+
+# replay a universe of num_markets markets through a market refresh, the market listings, dedup
+# (full, then incremental) and the duplicate pair listing. Returns {stage: summary}, plus 'universe'.
+def run_replay(num_markets, requests=50, refreshes=3, latency=0.0, seed=0):
+    universe = synthetic_universe(num_markets, seed=seed)
+    expected_markets = len(universe['kalshi']) + len(universe['election_events']) + len(universe['gamma'])
+    results = {}
+
+    with replay_environment(universe, latency) as env:
+        client = env.client
+
+        # the first request refreshes every venue; later refreshes only write what changed
+        latencies = timed(lambda: check(client.get('/api/markets')), 1)
+        latencies += timed(market_app.market_snapshot.refresh, refreshes - 1)
+        results['refresh_markets'] = summarize(latencies, expected_markets)
+        served = len(market_app.market_snapshot.get().markets)
+        assert served == expected_markets, f'served {served} of {expected_markets} markets'
+
+        results['get_markets'] = summarize(
+            timed(lambda: check(client.get('/api/markets')), requests), expected_markets)
+        results['get_markets_page'] = summarize(timed(lambda: check(client.get(
+            '/api/markets', query_string={'source': 'polymarket', 'min_volume': 1000, 'limit': 500})), requests), 500)
+
+        results['dedup_full'] = summarize(
+            timed(lambda: deduplicate(client, full=True), 1),
+            expected_markets)
+        pairs = {(row['kalshi_market_id'], row['polymarket_market_id']) for row in env.database.tables['duplicate_markets']}
+        results['dedup_full']['pairs'] = len(pairs)
+        results['dedup_full']['recall'] = len(pairs & set(universe['duplicates'])) / max(len(universe['duplicates']), 1)
+
+        results['dedup_incremental_build'] = summarize(
+            timed(lambda: deduplicate(client), 1), expected_markets)
+        results['dedup_incremental_noop'] = summarize(
+            timed(lambda: deduplicate(client), 1), 0)
+
+        results['get_deduplicated_markets'] = summarize(
+            timed(lambda: check(client.get('/api/deduplicated_markets')), requests), len(pairs))
+
+    results['universe'] = {'markets': expected_markets, 'planted_duplicates': len(universe['duplicates'])}
+    return results
@@ -0,0 +1,154 @@
+import re
+
+import numpy as np
+
+from config import BLOCK_CLOSE_DAYS, BLOCK_UNDATED_MAX_SIZE, BLOCK_MAX_SIZE
+from market import parse_close_time
+
+# blocking for full dedup: rather than scoring every kalshi x polymarket pair, only pairs that share
+# a block are scored (see matching.candidate_matches).
+#
+# A block is a salient title token (words, names, numbers; stopwords dropped) together with a
+# close-date bucket of BLOCK_CLOSE_DAYS days. A kalshi market sits in one bucket per token and a
+# polymarket market looks in its own bucket and the two next to it, so a candidate pair shares a
+# token and closes within about two buckets; pairs further apart than BLOCK_CLOSE_DAYS are then dropped.
+# Markets without a close time can't be bucketed: kalshi ones are also found by every polymarket
+# market sharing a token, and polymarket ones look up kalshi markets by token alone.
+#
+# The close date is a soft block: the venues date the same question differently (a kalshi market's
+# close against the polymarket event's end), often by more than the window. So a rare token, on at
+# most BLOCK_UNDATED_MAX_SIZE markets of each venue (typically the name the question is about),
+# also makes a candidate pair whatever the close dates; only common tokens need the dates to agree.
+#
+# Blocks with more than BLOCK_MAX_SIZE markets on either side (tokens as common as stopwords) are
+# skipped. candidate_recall measures what blocking costs against the brute-force matches.
+
+STOPWORDS = frozenset((
+    'the', 'and', 'for', 'will', 'be', 'by', 'in', 'of', 'on', 'to', 'a', 'an', 'at', 'or', 'is', 'are',
+    'than', 'more', 'less', 'before', 'after', 'end', 'with', 'this', 'that', 'what', 'who', 'which',
+    'does', 'did', 'has', 'have', 'get', 'any', 'how', 'many', 'much', 'yes', 'not', 'from', 'above',
+    'below', 'over', 'under', 'between', 'its', 'his', 'her', 'their', 'win', 'happen'
+))
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[.,][0-9]+)*')
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# the lowercased salient tokens of a title; numbers lose their thousands separators
+def title_tokens(title):
+    tokens = set()
+    for token in TOKEN_PATTERN.findall((title or '').lower()):
+        token = token.replace(',', '')
+        if token in STOPWORDS or (len(token) < 3 and not token[0].isdigit()):
+            continue
+        tokens.add(token)
+    return tokens
+
+# days since the epoch the market closes on, or None
+def close_day(market):
+    close_time = parse_close_time(market.close_time)
+    return None if close_time is None else int(close_time.timestamp() // SECONDS_PER_DAY)
+
+# (token ids, market positions) for every salient title token, and each market's close day (NaN if unknown)
+def _token_postings(markets, token_ids):
+    tokens, positions, days = [], [], np.full(len(markets), np.nan)
+    for position, market in enumerate(markets):
+        day = close_day(market)
+        if day is not None:
+            days[position] = day
+        for token in title_tokens(market.title):
+            tokens.append(token_ids.setdefault(token, len(token_ids)))
+            positions.append(position)
+    return np.asarray(tokens, dtype=np.int64), np.asarray(positions, dtype=np.int64), days
+
+# sort keys into groups: (order, unique keys, group starts in sorted order, group sizes)
+def _group(keys):
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    starts = np.flatnonzero(new_key)
+    return order, sorted_keys[starts], starts, np.diff(np.append(starts, len(keys)))
+
+# the kalshi x polymarket pairs sharing a block, as (kalshi positions, polymarket positions) arrays
+# of unique pairs ordered by kalshi position, then polymarket position
+def candidate_pairs(kalshi_markets, polymarket_markets, close_days=BLOCK_CLOSE_DAYS, max_block_size=BLOCK_MAX_SIZE,
+                    undated_max_size=BLOCK_UNDATED_MAX_SIZE):
+    token_ids = {}
+    kalshi_tokens, kalshi_positions, kalshi_days = _token_postings(kalshi_markets, token_ids)
+    polymarket_tokens, polymarket_positions, polymarket_days = _token_postings(polymarket_markets, token_ids)
+    empty = np.empty(0, dtype=np.int64)
+    if len(kalshi_tokens) == 0 or len(polymarket_tokens) == 0:
+        return empty, empty
+
+    # a block is token * stride + slot. Slot 0 holds kalshi markets with no close time, slot 1 every
+    # kalshi market (looked up by polymarket markets with no close time), slots 3.. the close buckets.
+    kalshi_buckets = np.floor(kalshi_days[kalshi_positions] / close_days)
+    polymarket_buckets = np.floor(polymarket_days[polymarket_positions] / close_days)
+    known_buckets = np.concatenate([kalshi_buckets, polymarket_buckets])
+    known_buckets = known_buckets[~np.isnan(known_buckets)]
+    first_bucket = int(known_buckets.min()) if len(known_buckets) else 0
+    stride = (int(known_buckets.max()) - first_bucket if len(known_buckets) else 0) + 5
+
+    def bucket_slots(buckets):
+        return np.where(np.isnan(buckets), 0, buckets - first_bucket + 3).astype(np.int64)
+
+    kalshi_blocks = np.concatenate([kalshi_tokens * stride + bucket_slots(kalshi_buckets), kalshi_tokens * stride + 1])
+    kalshi_positions = np.concatenate([kalshi_positions, kalshi_positions])
+
+    # polymarket markets look in their own bucket, the ones either side of it and slot 0, or in
+    # slot 1 when they have no close time. A rare token is also looked up in slot 1, undated.
+    polymarket_known = ~np.isnan(polymarket_buckets)
+    known_tokens = polymarket_tokens[polymarket_known]
+    known_blocks = known_tokens * stride + bucket_slots(polymarket_buckets[polymarket_known])
+    known_positions = polymarket_positions[polymarket_known]
+    kalshi_token_counts = np.bincount(kalshi_tokens, minlength=len(token_ids))
+    polymarket_token_counts = np.bincount(polymarket_tokens, minlength=len(token_ids))
+    rare = (kalshi_token_counts[known_tokens] <= undated_max_size) & (polymarket_token_counts[known_tokens] <= undated_max_size)
+    polymarket_blocks = np.concatenate([
+        known_blocks - 1, known_blocks, known_blocks + 1, known_blocks - bucket_slots(polymarket_buckets[polymarket_known]),
+        polymarket_tokens[~polymarket_known] * stride + 1, known_tokens[rare] * stride + 1
+    ])
+    polymarket_positions = np.concatenate(
+        [known_positions] * 4 + [polymarket_positions[~polymarket_known], known_positions[rare]])
+    # lookups whose pairs keep any close-date gap
+    undated = np.zeros(len(polymarket_blocks), dtype=bool)
+    undated[len(polymarket_blocks) - int(rare.sum()):] = True
+
+    # kalshi postings grouped by block; each polymarket lookup finds its block's group
+    order, blocks, block_starts, block_sizes = _group(kalshi_blocks)
+    kalshi_by_block = kalshi_positions[order]
+    found = np.searchsorted(blocks, polymarket_blocks)
+    found[found == len(blocks)] = 0
+    hit = blocks[found] == polymarket_blocks
+    polymarket_order, _, _, polymarket_sizes = _group(polymarket_blocks)
+    lookups_per_block = np.empty(len(polymarket_blocks), dtype=np.int64)
+    lookups_per_block[polymarket_order] = np.repeat(polymarket_sizes, polymarket_sizes)
+    hit &= (block_sizes[found] <= max_block_size) & (lookups_per_block <= max_block_size)
+
+    # pair every polymarket lookup with each kalshi market in the block it found
+    repeats = np.where(hit, block_sizes[found], 0)
+    total = int(repeats.sum())
+    if total == 0:
+        return empty, empty
+    offsets = np.arange(total) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    pair_kalshi = kalshi_by_block[np.repeat(block_starts[found], repeats) + offsets]
+    pair_polymarket = np.repeat(polymarket_positions, repeats)
+
+    # buckets are coarse; keep pairs closing within close_days of each other (or with no close
+    # time), and every pair sharing a rare token
+    day_gap = np.abs(kalshi_days[pair_kalshi] - polymarket_days[pair_polymarket])
+    keep = ~(day_gap > close_days) | np.repeat(undated, repeats)
+    pair_keys = pair_kalshi[keep] * len(polymarket_markets) + pair_polymarket[keep]
+
+    # pairs sharing several tokens were found once per token
+    pair_keys.sort()
+    distinct = np.ones(len(pair_keys), dtype=bool)
+    distinct[1:] = pair_keys[1:] != pair_keys[:-1]
+    return np.divmod(pair_keys[distinct], len(polymarket_markets))
+
+# share of the reference (kalshi, polymarket, score) matches that are among the candidate pairs
+def candidate_recall(kalshi_positions, polymarket_positions, reference_matches):
+    if not reference_matches:
+        return 1.0
+    candidates = set(zip(kalshi_positions.tolist(), polymarket_positions.tolist()))
+    found = sum((kalshi_index, polymarket_index) in candidates for kalshi_index, polymarket_index, _ in reference_matches)
+    return found / len(reference_matches)
@@ -1,5 +1,118 @@
+import os
+
 SOURCES = ["kalshi", "polymarket"]
 SOURCE_TABLES = {
     "kalshi": "kalshi_markets",
     "polymarket": "polymarket_markets"
 }
+
+# cross-venue duplicate matching
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+MATCH_TOP_K = 5  # candidates kept per kalshi market before one-to-one selection
+MATCH_BLOCK_SIZE = 1024  # kalshi rows scored per block
+MATCH_POLYMARKET_BLOCK_SIZE = 4096  # polymarket rows scored per block
+DEDUP_BLOCKING = os.getenv('DEDUP_BLOCKING', 'true').lower() == 'true'  # full dedup only scores pairs sharing a block
+BLOCK_CLOSE_DAYS = int(os.getenv('BLOCK_CLOSE_DAYS', 3))  # close-date bucket width, and the close-date gap allowed for pairs sharing any token
+BLOCK_UNDATED_MAX_SIZE = 50  # a token on at most this many markets of each venue makes a candidate whatever the close dates
+BLOCK_MAX_SIZE = 2000  # blocks with more markets than this on either side are skipped
+
+# sentence embeddings used for duplicate matching
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # torch | onnx | onnx-quantized
+EMBEDDING_ONNX_FILE = os.getenv('EMBEDDING_ONNX_FILE', 'onnx/model_qint8_avx512_vnni.onnx')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_WARMUP = os.getenv('EMBEDDING_WARMUP', 'false').lower() == 'true'  # load the model when a dedup pool process starts
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '.cache/embeddings')
+EMBEDDING_CACHE_MAX_IDLE_SECONDS = 7 * 24 * 60 * 60  # evict texts not seen by dedup for a week
+
+# approximate nearest-neighbour indexes for incremental dedup (see ann_index.py)
+DEDUP_INCREMENTAL = os.getenv('DEDUP_INCREMENTAL', 'true').lower() == 'true'  # match only new/changed markets
+ANN_INDEX_DIR = os.getenv('ANN_INDEX_DIR', '.cache/ann')
+ANN_NPROBE = 8  # clusters scanned per query
+ANN_MIN_TRAIN_SIZE = 1024  # search exhaustively until an index holds this many markets
+
+# column identifying a market in each source table
+MARKET_KEYS = {
+    "kalshi": "ticker",
+    "polymarket": "id"
+}
+
+# polymarket gamma-api pagination
+POLYMARKET_FETCH_WORKERS = int(os.getenv('POLYMARKET_FETCH_WORKERS', 4))  # pages in flight, 1 = sequential
+POLYMARKET_FETCH_RETRIES = 4  # retries for 429/5xx responses and connection errors
+POLYMARKET_FETCH_BACKOFF = 0.5  # seconds, doubled on each retry, with full jitter
+POLYMARKET_FETCH_TIMEOUT = 30  # seconds per page request
+POLYMARKET_POOL_SIZE = max(POLYMARKET_FETCH_WORKERS, 16)  # keep-alive connections kept by the shared session
+
+# concurrent source refresh in /api/markets (see sources.py)
+SOURCE_FETCH_WORKERS = 8
+KALSHI_MAX_MARKETS = 10000  # regular (non-election) markets fetched per refresh
+POLYMARKET_MAX_MARKETS = 1000  # markets fetched per refresh
+POLYMARKET_MIN_VOLUME = 100000  # only markets with at least this volume are fetched
+DEFAULT_SOURCE_TIMEOUT = 120  # seconds
+SOURCE_TIMEOUTS = {
+    "kalshi": int(os.getenv('KALSHI_SOURCE_TIMEOUT', DEFAULT_SOURCE_TIMEOUT)),
+    "polymarket": int(os.getenv('POLYMARKET_SOURCE_TIMEOUT', DEFAULT_SOURCE_TIMEOUT))
+}
+
+# market table writes (see utils.upsert_markets)
+UPSERT_CHUNK_SIZE = 500  # rows per upsert request
+UPSERT_WORKERS = 4  # chunks in flight
+IN_QUERY_CHUNK_SIZE = 200  # keys per bulk in_ lookup, keeps PostgREST query strings short
+INGEST_QUEUE_PAGES = 4  # fetched pages waiting for the table writer before fetching pauses (see ingest.py)
+INGEST_WRITER_CHECK_SECONDS = 1.0  # how often a producer blocked on a full queue checks the writer is still alive
+
+# /api/markets snapshot (see market_cache.py)
+MARKETS_CACHE_TTL = int(os.getenv('MARKETS_CACHE_TTL', 300))  # seconds before a background refresh
+
+# paginated / streamed market listings (see market_query.py)
+DEFAULT_PAGE_LIMIT = 500
+MAX_PAGE_LIMIT = 5000
+DEDUP_PAGE_SIZE = 1000  # duplicate pairs read and joined per database round
+
+# per-refresh price history (see price_history.py)
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'data/price_history')
+PRICE_HISTORY_RAW_DAYS = 7  # days kept at full refresh resolution
+PRICE_HISTORY_DOWNSAMPLE_SECONDS = 60 * 60  # resolution of older days
+DEFAULT_HISTORY_DAYS = 7  # range returned by /api/markets/<id>/history without start/end
+DEDUP_STATE_PATH = os.getenv('DEDUP_STATE_PATH', '.cache/dedup_state.json')  # last_updated high-water marks
+DEDUP_JOB_DIR = os.getenv('DEDUP_JOB_DIR', '.cache/dedup_jobs')  # job queue, per-job status, progress and unpaired market files
+DEDUP_JOB_HISTORY = 20  # finished dedup jobs kept for /api/dedup_jobs/<id>
+DEDUP_JOB_POLL_SECONDS = 1.0  # how often the leader checks the job queue for jobs other workers submitted
+
+# live price feed at /api/markets/stream (see market_feed.py)
+FEED_QUEUE_SIZE = 32  # undelivered events per subscriber before it is resynced with a snapshot
+FEED_HEARTBEAT_SECONDS = 15
+FEED_MAX_SUBSCRIBERS = int(os.getenv('FEED_MAX_SUBSCRIBERS', 10000))
+
+# per-venue request budget and retries (see rate_limit.py)
+RATE_LIMITS = {  # requests per second, burst
+    'kalshi': (float(os.getenv('KALSHI_RATE_LIMIT', 10)), 10),
+    'polymarket': (float(os.getenv('POLYMARKET_RATE_LIMIT', 10)), 20)
+}
+KALSHI_FETCH_RETRIES = 4
+KALSHI_FETCH_BACKOFF = 0.5  # seconds, doubled on each retry, with full jitter
+MAX_RETRY_BACKOFF = 30  # seconds
+
+# adaptive per-venue refresh schedule (see refresh_scheduler.py)
+REFRESH_MIN_INTERVAL = int(os.getenv('REFRESH_MIN_INTERVAL', 60))  # seconds
+REFRESH_MAX_INTERVAL = int(os.getenv('REFRESH_MAX_INTERVAL', 60 * 60))  # seconds, the old hourly refresh
+REFRESH_HOT_VOLUME_24H = 50000  # a market trading this much in 24h is hot
+REFRESH_HOT_INTERVAL = 5 * 60  # seconds, for a venue with REFRESH_SIGNIFICANT_SHARE of its markets hot
+REFRESHES_BEFORE_CLOSE = 4  # refreshes of a venue before REFRESH_SIGNIFICANT_SHARE of its markets have closed
+REFRESH_SIGNIFICANT_SHARE = 0.05  # share of a venue's markets that has to be hot or closing to speed up its refresh
+REFRESH_BUDGET_INTERVAL = 60 * 60  # seconds; a venue averages at most one refresh per this long, the old hourly budget
+REFRESH_BUDGET_BURST = 4  # refreshes a quiet venue can bank for busy periods
+REFRESH_BUDGET_SHARE = 0.5  # share of a venue's rate limit that scheduled refreshes may use on average
+
+# /metrics and request profiling (see metrics.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'  # allows ?profile=true on any request
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+# several serving workers (gunicorn -w N, without --preload) on one host (see leader.py)
+LEADER_LOCK_PATH = os.getenv('LEADER_LOCK_PATH', '.cache/leader.lock')  # held by the worker that runs the schedulers
+LEADER_RETRY_SECONDS = 5  # how often followers retry the lock and check for a newer shared snapshot
+SHARED_SNAPSHOT_PATH = os.getenv('SHARED_SNAPSHOT_PATH', '.cache/market_snapshot.bin')  # leader's snapshot, mapped by followers
+SHARED_SNAPSHOT_WAIT = 30  # seconds a follower waits for the leader's first snapshot before building its own
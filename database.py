@@ -1,10 +1,33 @@
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-supabase = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
\ No newline at end of file
+# the one supabase client of the process, shared by every module that queries the database. It is
+# created (and the supabase SDK imported) on first use, so importing the app stays fast and
+# processes that never query, like dedup pool workers before their first job, don't build one.
+class LazyClient:
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+def create_supabase_client():
+    from supabase import create_client
+    return create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY")
+    )
+
+supabase = LazyClient(create_supabase_client)
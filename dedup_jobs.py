@@ -0,0 +1,316 @@
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from config import DEDUP_JOB_DIR, DEDUP_JOB_HISTORY, DEDUP_JOB_POLL_SECONDS, EMBEDDING_WARMUP
+
+# dedup (embedding, similarity search, pair writes) runs as a job on a process pool, so it neither
+# holds a request thread nor competes with request handling for the serving process's GIL.
+#
+# submit() returns the job at once. A trigger that arrives while a job covering it is queued or
+# running joins that job instead of starting another one: an incremental trigger joins any job, a
+# full trigger joins a full job, turns a queued incremental job into a full one, or queues a single
+# full job behind a running incremental one. At most one job runs at a time.
+#
+# Every serving worker takes triggers, but only the leader (see leader.py) runs jobs, so the queue
+# lives on disk in DEDUP_JOB_DIR: queue.json names the running and queued job, and each job's
+# status is a JSON file, all changed under an flock on jobs.lock. Any worker can submit, coalesce
+# onto a job another worker submitted, and answer a job's status. The leader runs the queued job
+# when it submits one itself, when its job finishes and every DEDUP_JOB_POLL_SECONDS for the other
+# workers' submissions. While a job runs the leader holds an flock on running.lock; a leader that
+# died mid-job drops it, and the next leader marks that job failed instead of waiting on it forever.
+#
+# The worker reports its stage in a small JSON file per job and writes the markets left unpaired
+# to an NDJSON file next to it; only a summary dict crosses the process boundary. Pool processes
+# are spawned rather than forked, since the serving process has scheduler and request threads.
+
+FINISHED = ('done', 'failed')
+
+def job_path(job_dir, job_id):
+    return os.path.join(job_dir, f'{job_id}.job.json')
+
+def progress_path(job_dir, job_id):
+    return os.path.join(job_dir, f'{job_id}.progress.json')
+
+def results_path(job_dir, job_id):
+    return os.path.join(job_dir, f'{job_id}.ndjson')
+
+def _write_json(path, data):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default  # not written yet, or removed
+
+def _init_worker():
+    if EMBEDDING_WARMUP:
+        import embedding_model
+        embedding_model.warm_up()
+
+# body of a dedup job, run in a pool process. Returns {'unpaired_markets': count}.
+def run_dedup_job(job_id, full, job_dir):
+    import utils  # imported here so the serving process never loads the embedding model for dedup
+
+    def report(stage, **details):
+        _write_json(progress_path(job_dir, job_id), {'stage': stage, 'updated_at': time.time(), **details})
+
+    if full:
+        report('loading markets')
+        markets = utils.get_all_markets()
+        if not markets:
+            raise ValueError('No markets found in any source table')
+        report('matching', markets=len(markets))
+        unpaired_markets = utils.find_duplicate_markets(markets)
+    else:
+        report('matching changed markets')
+        unpaired_markets = utils.run_incremental_deduplication()
+
+    report('writing results', unpaired_markets=len(unpaired_markets))
+    path = results_path(job_dir, job_id)
+    with open(path + '.tmp', 'w') as f:
+        for market in unpaired_markets:
+            f.write(json.dumps(market.to_row(), default=str) + '\n')
+    os.replace(path + '.tmp', path)
+    return {'unpaired_markets': len(unpaired_markets)}
+
+class DedupJobs:
+    # on_done(job) runs in the leader after each successful job. executor defaults to a one-process
+    # spawn pool, created when the leader starts its first job.
+    def __init__(self, job_dir=DEDUP_JOB_DIR, on_done=None, executor=None, history=DEDUP_JOB_HISTORY,
+                 poll_seconds=DEDUP_JOB_POLL_SECONDS):
+        self.job_dir = job_dir
+        self.on_done = on_done
+        self.executor = executor
+        self.owns_executor = executor is None
+        self.history = history
+        self.poll_seconds = poll_seconds
+        self.condition = threading.Condition()
+        self.runner = False  # set by start() in the leader
+        self.running_file = None  # running.lock, held while this process runs a job
+        self.stopped = threading.Event()
+
+    # the queue, locked against every other thread and worker: yields {'running': id, 'queued': id},
+    # saved on exit
+    @contextmanager
+    def _queue(self):
+        with self.condition:
+            os.makedirs(self.job_dir, exist_ok=True)
+            with open(os.path.join(self.job_dir, 'jobs.lock'), 'a+') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    path = os.path.join(self.job_dir, 'queue.json')
+                    queue = _read_json(path, {'running': None, 'queued': None})
+                    saved = dict(queue)
+                    yield queue
+                    if queue != saved:
+                        _write_json(path, queue)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _job(self, job_id):
+        return _read_json(job_path(self.job_dir, job_id)) if job_id else None
+
+    def _save_job(self, job):
+        _write_json(job_path(self.job_dir, job['id']), job)
+
+    def _new_job(self, full):
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': 'full' if full else 'incremental',
+            'status': 'queued',
+            'triggers': 1,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        self._save_job(job)
+        self._evict()
+        return job
+
+    # drop the oldest finished jobs, and their files, beyond the history limit
+    def _evict(self):
+        jobs = [_read_json(os.path.join(self.job_dir, name))
+                for name in os.listdir(self.job_dir) if name.endswith('.job.json')]
+        jobs = sorted((job for job in jobs if job is not None), key=lambda job: job['submitted_at'])
+        excess = len(jobs) - self.history
+        for job in jobs:
+            if excess <= 0:
+                break
+            if job['status'] in FINISHED:
+                excess -= 1
+                for path in (job_path(self.job_dir, job['id']), progress_path(self.job_dir, job['id']),
+                             results_path(self.job_dir, job['id'])):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    # True if a job is marked running but no process holds running.lock: its leader exited mid-job
+    def _runner_exited(self):
+        if self.running_file is not None:
+            return False
+        with open(os.path.join(self.job_dir, 'running.lock'), 'a+') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return True
+
+    def _release_running(self):
+        if self.running_file is not None:
+            fcntl.flock(self.running_file, fcntl.LOCK_UN)
+            self.running_file.close()
+            self.running_file = None
+
+    # in the leader: start the queued job if none is running. Returns the started job's future.
+    def _start_next(self):
+        with self._queue() as queue:
+            if queue['running'] is not None:
+                if not self._runner_exited():
+                    return None
+                job = self._job(queue['running'])
+                if job is not None:
+                    logging.error(f"Dedup job {job['id']} was left running by a worker that exited")
+                    job.update(status='failed', error='worker exited while running the job', finished_at=time.time())
+                    self._save_job(job)
+                queue['running'] = None
+            job = self._job(queue['queued'])
+            queue['queued'] = None
+            if job is None:
+                return None
+
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker)
+            self.running_file = open(os.path.join(self.job_dir, 'running.lock'), 'a+')
+            fcntl.flock(self.running_file, fcntl.LOCK_EX)
+            job.update(status='running', started_at=time.time())
+            try:
+                future = self.executor.submit(run_dedup_job, job['id'], job['kind'] == 'full', self.job_dir)
+            except Exception as e:
+                logging.error(f"Could not start dedup job {job['id']}: {e}", exc_info=True)
+                job.update(status='failed', error=str(e), finished_at=time.time())
+                self._release_running()
+                if self.owns_executor:
+                    self.executor = None
+                future = None
+            else:
+                queue['running'] = job['id']
+            self._save_job(job)
+        if future is not None:
+            future.add_done_callback(lambda future, job_id=job['id']: self._finished(job_id, future))
+        return future
+
+    # start a dedup job, or join the queued or running one that covers it. Returns the job.
+    def submit(self, full=False):
+        with self._queue() as queue:
+            job = None
+            for job_id in (queue['running'], queue['queued']):
+                candidate = self._job(job_id)
+                if candidate is not None and (candidate['kind'] == 'full' or not full):
+                    job = candidate
+                    break
+            if job is None:
+                # a queued job hasn't started, so a full trigger can make it a full job
+                job = self._job(queue['queued'])
+                if job is not None:
+                    job['kind'] = 'full'
+            if job is None:
+                job = self._new_job(full)
+                queue['queued'] = job['id']
+            else:
+                job['triggers'] += 1
+                self._save_job(job)
+        if self.runner:
+            self._start_next()
+        return self.status(job['id'])
+
+    # the job's outcome is saved after on_done, so a caller waiting on the job sees what it changed
+    def _finished(self, job_id, future):
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = {}, e
+            logging.error(f'Dedup job {job_id} failed: {e}', exc_info=True)
+
+        outcome = dict(result, status='failed' if error else 'done', finished_at=time.time())
+        if error:
+            outcome['error'] = str(error)
+        else:
+            job = {**self._job(job_id), **outcome}
+            logging.info(f"Dedup job {job_id} done in {job['finished_at'] - job['started_at']:.1f}s: "
+                         f"{job['unpaired_markets']} markets unpaired")
+            if self.on_done:
+                try:
+                    self.on_done(job)
+                except Exception as e:
+                    logging.error(f'Error after dedup job {job_id}: {e}', exc_info=True)
+
+        with self._queue() as queue:
+            # a worker that died takes the whole pool with it; the next job gets a fresh one
+            if isinstance(error, BrokenProcessPool) and self.owns_executor:
+                self.executor = None
+            job = self._job(job_id)  # read again for triggers that joined meanwhile
+            job.update(outcome)
+            self._save_job(job)
+            if queue['running'] == job_id:
+                queue['running'] = None
+            self._release_running()
+            self.condition.notify_all()
+        self._start_next()
+
+    # run jobs in this process: start the queued job now, then poll for the other workers' submissions
+    def start(self):
+        self.runner = True
+        self._start_next()
+
+        def run():
+            while not self.stopped.wait(self.poll_seconds):
+                try:
+                    self._start_next()
+                except Exception as e:
+                    logging.error(f'Error starting a dedup job: {e}', exc_info=True)
+
+        threading.Thread(target=run, name='dedup-jobs', daemon=True).start()
+
+    # the job with the worker's latest stage while it runs, or None for an unknown job
+    def status(self, job_id):
+        job = self._job(job_id)
+        if job is not None and job['status'] == 'running':
+            job.update(_read_json(progress_path(self.job_dir, job_id), {}))
+        return job
+
+    # block until the job finishes (or timeout seconds pass) and return its status. A job finished
+    # by this process wakes the wait at once, one finished by the leader is seen on the next poll.
+    def wait(self, job_id, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                job = self.status(job_id)
+                if job is None or job['status'] in FINISHED:
+                    return job
+                remaining = self.poll_seconds if deadline is None else min(self.poll_seconds, deadline - time.monotonic())
+                if remaining <= 0:
+                    return job
+                self.condition.wait(remaining)
+
+    def results_path(self, job_id):
+        return results_path(self.job_dir, job_id)
+
+    def shutdown(self):
+        self.stopped.set()
+        if self.executor is not None and self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME
+
+# on-disk embedding store so dedup runs only encode markets whose text is new or changed.
+#
+# Layout of the cache directory:
+#   embeddings.f32  - memory-mapped float32 array, one row per cached text (capacity x dim)
+#   index.json      - model name, dim, capacity and {hash: [row, last_seen]} for every entry
+#
+# Entries are keyed by the sha1 of the exact text fed to model.encode, so an edited title or
+# description is simply a new key. Rows of evicted entries are recycled for new ones.
+
+INITIAL_CAPACITY = 1024
+
+# hash of the exact text given to the encoder
+def text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, directory, model_name):
+        self.directory = directory
+        self.model_name = model_name
+        self.data_path = os.path.join(directory, 'embeddings.f32')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+
+        self.dim = None
+        self.capacity = 0
+        self.entries = {}  # hash -> [row, last_seen]
+        self.free_rows = []
+        self.vectors = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.data_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index['model_name'] != self.model_name:
+                logging.info(f"Embedding cache built for {index['model_name']}, starting fresh for {self.model_name}")
+                return
+            self.dim = index['dim']
+            self.capacity = index['capacity']
+            self.entries = index['entries']
+            used_rows = {row for row, _ in self.entries.values()}
+            self.free_rows = sorted(set(range(self.capacity)) - used_rows, reverse=True)
+            self.vectors = np.memmap(self.data_path, dtype=np.float32, mode='r+', shape=(self.capacity, self.dim))
+            logging.info(f'Loaded embedding cache with {len(self.entries)} entries from {self.directory}')
+        except Exception as e:
+            logging.error(f'Error loading embedding cache, starting fresh: {e}', exc_info=True)
+            self.dim, self.capacity, self.entries, self.free_rows, self.vectors = None, 0, {}, [], None
+
+    # grow the backing file (doubling) so at least `needed` more rows fit
+    def _reserve(self, needed):
+        if len(self.free_rows) >= needed:
+            return
+        new_capacity = max(self.capacity, INITIAL_CAPACITY)
+        while new_capacity - self.capacity + len(self.free_rows) < needed:
+            new_capacity *= 2
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self.data_path, 'ab') as f:
+            f.truncate(new_capacity * self.dim * np.dtype(np.float32).itemsize)
+        self.vectors = np.memmap(self.data_path, dtype=np.float32, mode='r+', shape=(new_capacity, self.dim))
+
+        self.free_rows = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_rows
+        self.capacity = new_capacity
+
+    # return embeddings for texts (in order), calling encode_fn only on texts that are not cached.
+    # encode_fn takes a list of strings and returns a (len, dim) array.
+    def encode(self, texts, encode_fn):
+        keys = [text_key(text) for text in texts]
+        now = time.time()
+
+        with self.lock:
+            misses = {}
+            for key, text in zip(keys, texts):
+                if key not in self.entries and key not in misses:
+                    misses[key] = text
+
+            hits = sum(1 for key in keys if key not in misses)
+            logging.info(
+                f'Embedding cache: {hits}/{len(keys)} hits '
+                f'({hits / len(keys) if keys else 1:.1%}), encoding {len(misses)} new texts')
+
+            if misses:
+                encoded = np.asarray(encode_fn(list(misses.values())), dtype=np.float32)
+                if self.dim is None:
+                    self.dim = encoded.shape[1]
+                self._reserve(len(misses))
+                for key, vector in zip(misses, encoded):
+                    row = self.free_rows.pop()
+                    self.vectors[row] = vector
+                    self.entries[key] = [row, now]
+
+            rows = np.empty(len(keys), dtype=np.int64)
+            for position, key in enumerate(keys):
+                entry = self.entries[key]
+                entry[1] = now
+                rows[position] = entry[0]
+
+            if self.vectors is None:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            result = self.vectors[rows]
+            self._save()
+            return np.asarray(result)
+
+    # drop entries that have not been requested for max_idle_seconds (e.g. markets that closed and
+    # are no longer matched) and recycle their rows
+    def prune(self, max_idle_seconds):
+        cutoff = time.time() - max_idle_seconds
+        with self.lock:
+            stale = [key for key, (_, last_seen) in self.entries.items() if last_seen < cutoff]
+            for key in stale:
+                self.free_rows.append(self.entries.pop(key)[0])
+            if stale:
+                logging.info(f'Evicted {len(stale)} idle entries from embedding cache')
+                self._save()
+            return len(stale)
+
+    def _save(self):
+        if self.vectors is None:
+            return
+        self.vectors.flush()
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'dim': self.dim,
+                'capacity': self.capacity,
+                'entries': self.entries
+            }, f)
+        os.replace(temp_path, self.index_path)
+
+    def __len__(self):
+        return len(self.entries)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# process-wide cache for the configured model, created on first use
+def get_embedding_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME)
+        return _cache
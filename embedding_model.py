@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, EMBEDDING_BATCH_SIZE
+from metrics import observe
+
+# process-wide SentenceTransformer holder. The model is loaded once, on first use (or eagerly via
+# warm_up when a dedup pool process starts, see dedup_jobs._init_worker), and shared by every dedup
+# run and thread of that process.
+#
+# EMBEDDING_BACKEND selects how encoding runs on CPU:
+#   torch           - default pytorch model
+#   onnx            - onnxruntime export of the same model
+#   onnx-quantized  - int8 dynamically quantized onnx weights (EMBEDDING_ONNX_FILE)
+
+_model = None
+_model_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'backend': EMBEDDING_BACKEND,
+    'load_seconds': None,
+    'sentences_encoded': 0,
+    'encode_seconds': 0.0
+}
+
+def _load_model():
+    # imported here so processes that never encode don't pay for torch/transformers
+    from sentence_transformers import SentenceTransformer
+
+    if EMBEDDING_BACKEND == 'torch':
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if EMBEDDING_BACKEND == 'onnx':
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend='onnx')
+    if EMBEDDING_BACKEND == 'onnx-quantized':
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend='onnx', model_kwargs={'file_name': EMBEDDING_ONNX_FILE})
+    raise ValueError(f'Unknown embedding backend: {EMBEDDING_BACKEND}')
+
+# return the shared model, loading it on first call
+def get_model():
+    global _model
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            start = time.perf_counter()
+            _model = _load_model()
+            load_seconds = time.perf_counter() - start
+            with _stats_lock:
+                _stats['load_seconds'] = load_seconds
+            logging.info(f'Loaded embedding model {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND}) in {load_seconds:.2f}s')
+    return _model
+
+# encode a list of strings with the shared model
+def encode(texts, batch_size=None):
+    model = get_model()
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size or EMBEDDING_BATCH_SIZE)
+    elapsed = time.perf_counter() - start
+    observe('embedding_model_encode', elapsed)
+
+    with _stats_lock:
+        _stats['sentences_encoded'] += len(texts)
+        _stats['encode_seconds'] += elapsed
+    if texts:
+        logging.info(f'Encoded {len(texts)} sentences in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.0f} sentences/s)')
+    return embeddings
+
+# load the model and run one small batch so the first real dedup run doesn't pay warm-up cost
+def warm_up():
+    try:
+        encode(['warm up'])
+    except Exception as e:
+        logging.error(f'Error warming up embedding model: {e}', exc_info=True)
+
+# load time and cumulative encode throughput since process start
+def get_model_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['sentences_per_second'] = (
+        stats['sentences_encoded'] / stats['encode_seconds'] if stats['encode_seconds'] else None
+    )
+    return stats
@@ -0,0 +1,121 @@
+import logging
+import queue
+import threading
+import time
+
+from config import INGEST_QUEUE_PAGES, INGEST_WRITER_CHECK_SECONDS, UPSERT_CHUNK_SIZE, UPSERT_WORKERS
+from metrics import observe, count
+from utils import upsert_markets, forget_missing_fingerprints, market_row_key
+
+# streaming ingestion of one venue refresh. Pages of normalized markets come from the venue's page
+# iterator (fetched and normalized on the calling thread and the venue's own fetch threads) and go
+# through a bounded queue to a writer thread that upserts each page as it arrives, so network,
+# normalization and database time overlap instead of running one after the other. Pages that queued
+# up while the writer was busy are written together, up to UPSERT_WORKERS full chunks, so small
+# pages don't each cost a round of upserts.
+#
+# The queue holds at most INGEST_QUEUE_PAGES pages. When the writer falls behind, putting the next
+# page blocks, which stops the iterator asking for more pages: the fetch side never runs more than
+# the queue plus its own requests in flight ahead of the database. Every page's fetch and write
+# time goes into the ingest_fetch / ingest_write histograms.
+#
+# A writer that dies (an error outside a batch's upsert) would leave the producer blocked on a full
+# queue forever, so puts wait INGEST_WRITER_CHECK_SECONDS at a time and check the writer is alive
+# in between; the refresh then fails with the writer's error.
+#
+# The refresh's market list holds the same Market objects as the pages, not copies: the snapshot,
+# price history, spread engine and feed all need every market of the refresh, so the list is the
+# one copy of the universe a refresh keeps, and the pages are dropped once written.
+
+_DONE = object()
+
+# write pages to table_name as they are produced. Returns (every market, stats) once the last page
+# is written; an error from the page iterator is raised after the pages before it are written, and
+# a writer that stopped raises RuntimeError. A refresh that completes also drops the write
+# fingerprints of markets the venue no longer lists.
+def ingest_pages(pages, table_name, source, max_pages=INGEST_QUEUE_PAGES):
+    page_queue = queue.Queue(maxsize=max_pages)
+    write_stats = {'written': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'write_seconds': 0.0}
+    writer_errors = []
+
+    def write_batches():
+        done = False
+        while not done:
+            batch = page_queue.get()
+            if batch is _DONE:
+                return
+            batch = list(batch)  # the producer still reads the page it queued
+            while len(batch) < UPSERT_CHUNK_SIZE * UPSERT_WORKERS:
+                try:
+                    page = page_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if page is _DONE:
+                    done = True
+                    break
+                batch.extend(page)
+
+            start = time.perf_counter()
+            try:
+                batch_stats = upsert_markets(batch, table_name)
+            except Exception as e:
+                logging.error(f'Error writing {len(batch)} {source} markets: {e}', exc_info=True)
+                batch_stats = {'failed': len(batch)}
+            seconds = time.perf_counter() - start
+            observe('ingest_write', seconds, source=source)
+            for key in ('written', 'skipped', 'failed', 'bytes'):
+                write_stats[key] += batch_stats.get(key, 0)
+            write_stats['write_seconds'] += seconds
+
+    def write():
+        try:
+            write_batches()
+        except Exception as e:
+            logging.error(f'{source} ingest writer stopped: {e}', exc_info=True)
+            writer_errors.append(e)
+
+    writer = threading.Thread(target=write, name=f'{source}-ingest-writer', daemon=True)
+    writer.start()
+
+    # queue item for the writer, blocking while it is max_pages pages behind; False if it stopped
+    def put(item):
+        while writer.is_alive():
+            try:
+                page_queue.put(item, timeout=INGEST_WRITER_CHECK_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    markets = []
+    stats = {'pages': 0, 'markets': 0, 'fetch_seconds': 0.0, 'blocked_seconds': 0.0}
+    requested = time.perf_counter()
+    try:
+        for page in pages:
+            fetched = time.perf_counter()
+            if not put(page):
+                raise RuntimeError(f'{source} ingest writer stopped') from (writer_errors[0] if writer_errors else None)
+            queued = time.perf_counter()
+
+            observe('ingest_fetch', fetched - requested, source=source)
+            count('ingest_pages', source=source)
+            count('ingest_markets', len(page), source=source)
+            stats['pages'] += 1
+            stats['markets'] += len(page)
+            stats['fetch_seconds'] += fetched - requested
+            stats['blocked_seconds'] += queued - fetched
+            markets.extend(page)
+            requested = time.perf_counter()
+    finally:
+        put(_DONE)
+        writer.join()
+        stats.update(write_stats)
+        logging.info(
+            f"Ingested {stats['markets']} {source} markets in {stats['pages']} pages: {stats['written']} written, "
+            f"{stats['skipped']} unchanged, {stats['failed']} failed; {stats['fetch_seconds']:.1f}s fetching, "
+            f"{stats['write_seconds']:.1f}s writing, {stats['blocked_seconds']:.1f}s waiting on the writer")
+    # the writer can also stop after the last page was queued
+    if writer_errors:
+        raise RuntimeError(f'{source} ingest writer stopped') from writer_errors[0]
+    forget_missing_fingerprints(table_name, (market_row_key(market) for market in markets))
+    return markets, stats
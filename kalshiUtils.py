@@ -3,6 +3,7 @@ import requests
 import time
 import base64
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import pprint
 from dotenv import load_dotenv
@@ -10,14 +11,22 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 
-import kalshi_python
 import logging
 
+from config import KALSHI_FETCH_RETRIES, KALSHI_FETCH_BACKOFF
+from rate_limit import get_limiter
+from market import Market
+from metrics import timed
+
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
+KALSHI_ELECTION_EVENTS_URL = 'https://api.elections.kalshi.com/v1/events'
+
 def initialize_kalshi_client():
+    import kalshi_python  # the SDK is slow to import; only processes that refresh kalshi need it
+
     config = kalshi_python.Configuration()
     return kalshi_python.ApiInstance(
         email=os.getenv('KALSHI_EMAIL'),
@@ -25,116 +34,120 @@ def initialize_kalshi_client():
         configuration=config,
     )
 
-def fetch_kalshi_markets(kalshi_api, limit=1000, status='open'):
-    try:
-        # Fetch both regular and election markets
-        regular_markets = fetch_non_election_kalshi_markets(kalshi_api, limit=limit, status=status)
-        election_markets = fetch_kalshi_election_markets(kalshi_api)
-        
-        logging.info(f"Fetched {len(regular_markets)} regular markets and {len(election_markets)} election markets from Kalshi")
+# regular and election markets. Either endpoint failing (after retries) leaves its markets out;
+# both failing raises, so the refresh is reported as failed instead of as zero markets.
+def fetch_kalshi_markets(kalshi_api, limit=1000, status='open', num_markets=10000):
+    return [market for page in iter_kalshi_market_pages(kalshi_api, limit, status, num_markets) for market in page]
 
-        # Combine both types of markets
-        return regular_markets + election_markets
-    except Exception as e:
-        logging.error(f'Error fetching Kalshi markets: {e}')
-        return []
+# the markets of fetch_kalshi_markets, a page of Markets at a time: each regular page as it arrives, then the
+# election markets, which are fetched alongside since they come from a different endpoint
+def iter_kalshi_market_pages(kalshi_api, limit=1000, status='open', num_markets=10000):
+    errors = {}
+    regular_count = 0
+    election_markets = []
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='kalshi-fetch') as executor:
+        election_future = executor.submit(fetch_kalshi_election_markets, kalshi_api)
+        try:
+            for page in iter_non_election_kalshi_pages(kalshi_api, limit=limit, status=status, num_markets=num_markets):
+                regular_count += len(page)
+                yield page
+        except Exception as e:
+            logging.error(f'Error fetching regular Kalshi markets: {e}', exc_info=True)
+            errors['regular'] = e
+
+        try:
+            election_markets = election_future.result()
+        except Exception as e:
+            logging.error(f'Error fetching election Kalshi markets: {e}', exc_info=True)
+            errors['election'] = e
+
+    if len(errors) == 2:
+        raise errors['regular']
+
+    if election_markets:
+        yield election_markets
+    logging.info(f"Fetched {regular_count} regular markets and {len(election_markets)} election markets from Kalshi")
 
 def fetch_non_election_kalshi_markets(kalshi_api, limit=1000, status='open', num_markets=10000):
-    try:
-        all_markets = []
-        cursor = None
+    return [market for page in iter_non_election_kalshi_pages(kalshi_api, limit, status, num_markets) for market in page]
+
+# regular markets one API page at a time, normalized to Markets
+def iter_non_election_kalshi_pages(kalshi_api, limit=1000, status='open', num_markets=10000):
+    fetched = 0
+    cursor = None
+    
+    while fetched < num_markets:
+        # Get next batch of markets using cursor if available
+        markets_response = get_limiter('kalshi').call(
+            kalshi_api.get_markets,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            retries=KALSHI_FETCH_RETRIES,
+            backoff=KALSHI_FETCH_BACKOFF
+        )
         
-        while len(all_markets) < num_markets:
-            # Get next batch of markets using cursor if available
-            markets_response = kalshi_api.get_markets(
-                limit=limit,
-                cursor=cursor,
-                status=status
-            )
+        if not markets_response.markets:
+            break  # No more markets available
             
-            if not markets_response.markets:
-                break  # No more markets available
-                
-            # Format the current batch
+        # Format the current batch
+        page = []
+        with timed('normalize', venue='kalshi'):
             for market in markets_response.markets:
-                
+            
                 try:
-                    formatted_market = {
-                        "kalshi_id": 'N/A', # non-election markets dont have an ID field
-                        "source": "kalshi",
-                        "title": market.title,
-                        "description": '',
-                        # "description": (market['underlying'] if market['underlying'] else '') + (market['description_context'] if market['description_context'] else ''),
-                        "yes_price": market.yes_ask / 100 if hasattr(market, 'yes_ask') else 0,
-                        "no_price": market.no_ask / 100 if hasattr(market, 'no_ask') else 0,
-                        "ticker": market.ticker,
-                        "volume": market.volume,
-                        "volume_24h": market.volume_24h,
-                        "close_time": market.close_time
-                    }
-                    all_markets.append(formatted_market)
+                    formatted_market = Market.from_kalshi(market)
+                    page.append(formatted_market)
                 except Exception as e:
                     logging.error(f'Error formatting Kalshi non-election market: {e}', exc_info=True)
                     logging.error(f"Pretty printed non-election market: {pprint.pformat(market)}")
                     raise  # Re-raise the exception to propagate it up
 
-            cursor = markets_response.cursor
-            
-            # If no cursor returned, we've reached the end
-            if not cursor:
-                break
-                
-            logging.info(f"Progress: Fetched {len(all_markets)} markets")
-            
-        return all_markets
+        fetched += len(page)
+        yield page
+
+        cursor = markets_response.cursor
         
-    except Exception as e:
-        logging.error(f'Error fetching regular Kalshi markets: {e}', exc_info=True)
-        return []
+        # If no cursor returned, we've reached the end
+        if not cursor:
+            break
+            
+        logging.info(f"Progress: Fetched {fetched} markets")
+    
 
 def fetch_kalshi_election_markets(kalshi_api):
     #for temporary use while kalshi has two different endpoints for election vs other markets
     #Election Markets: api.elections.kalshi.com/trade-api/v2
     #Other Markets: trading-api.kalshi.com/trade-api/v2
 
-    try:
-        response = requests.get('https://api.elections.kalshi.com/v1/events')
-        response.raise_for_status()
-        election_data = response.json()
-        
-        # # Log the structure of the first event and market
-        # if election_data['events']:
-        #     logging.info("Sample Event Structure:")
-        #     logging.info(json.dumps(election_data['events'][0], indent=2))
-        #     if election_data['events'][0]['markets']:
-        #         logging.info("Sample Market Structure:")
-        #         logging.info(json.dumps(election_data['events'][0]['markets'][0], indent=2))
-        
-        formatted_markets = []
-        # an event can have multiple markets within it. ie event: price of ethereum, markets: price above 1k, 2k, 3k
+    election_data = get_limiter('kalshi').call(
+        _get_election_events, retries=KALSHI_FETCH_RETRIES, backoff=KALSHI_FETCH_BACKOFF)
+    
+    # # Log the structure of the first event and market
+    # if election_data['events']:
+    #     logging.info("Sample Event Structure:")
+    #     logging.info(json.dumps(election_data['events'][0], indent=2))
+    #     if election_data['events'][0]['markets']:
+    #         logging.info("Sample Market Structure:")
+    #         logging.info(json.dumps(election_data['events'][0]['markets'][0], indent=2))
+    
+    formatted_markets = []
+    # an event can have multiple markets within it. ie event: price of ethereum, markets: price above 1k, 2k, 3k
+    with timed('normalize', venue='kalshi'):
         for event in election_data['events']:
             logging.debug(f"Formatted Kalshi election market: {pprint.pformat(event)}")
             for market in event['markets']:
                 try:
-                    formatted_market = {
-                        "kalshi_id": market['id'],
-                        "source": "kalshi",
-                        "title": market['title'],
-                        "description": event['underlying'] + event['description_context'],
-                        "yes_price": market['yes_ask'],
-                        "no_price": 1 - market['yes_ask'], # kalshi election markets dont have a no_ask value
-                        "ticker": market['ticker_name'],
-                        "volume": market['volume'],
-                        "volume_24h": market.get('volume_24h', 'N/A'),
-                        "close_time": market['close_date']
-                    }
+                    formatted_market = Market.from_kalshi_election(event, market)
                     formatted_markets.append(formatted_market)
                 except Exception as e:
                     logging.error(f'Error formatting Kalshi election market: {e}', exc_info=True)
                     logging.debug(f"Formatted Kalshi election market: {pprint.pformat(market)}")
                     raise e
 
-        return formatted_markets
-    except Exception as e:
-        logging.error(f'Error fetching Kalshi election markets: {e}', exc_info=True)
-        return []
+    return formatted_markets
+
+def _get_election_events():
+    response = requests.get(KALSHI_ELECTION_EVENTS_URL)
+    response.raise_for_status()
+    return response.json()
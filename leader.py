@@ -0,0 +1,85 @@
+import fcntl
+import logging
+import os
+import threading
+
+from config import LEADER_LOCK_PATH, LEADER_RETRY_SECONDS
+
+# leader election between the serving workers of one host.
+#
+# Every worker imports app.py, and each used to start its own refresh scheduler and dedup cron, so
+# N workers fetched every venue N times and ran N dedups. Now the workers race for an exclusive
+# flock on LEADER_LOCK_PATH: the winner runs the schedulers and publishes its market snapshot to a
+# shared file (see market_cache.SharedSnapshot), the others serve that file. Followers retry the
+# lock every LEADER_RETRY_SECONDS, and the kernel drops the lock when the leader's process exits
+# (even if it is killed), so another worker takes over without any cleanup.
+#
+# flock is held by an open file description, which fork shares: run gunicorn without --preload, or
+# the master would take the lock at import and every worker would share it.
+
+class LeaderLock:
+    def __init__(self, path=LEADER_LOCK_PATH):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self.file is not None
+
+    # take the lock if no other process (or LeaderLock) holds it; True while this one holds it
+    def try_acquire(self):
+        with self.lock:
+            if self.file is not None:
+                return True
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            f = open(self.path, 'a+')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            # the holder's pid, for whoever wonders which worker is refreshing
+            f.seek(0)
+            f.truncate()
+            f.write(f'{os.getpid()}\n')
+            f.flush()
+            self.file = f
+            return True
+
+    def release(self):
+        self.stopped.set()
+        with self.lock:
+            if self.file is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+                self.file.close()
+                self.file = None
+
+    # run on_elected() once this process holds the lock: right away if it can take it now, else from
+    # a background thread that retries every interval, calling on_follower() between attempts
+    def watch(self, on_elected, on_follower=None, interval=LEADER_RETRY_SECONDS):
+        if self.try_acquire():
+            logging.info(f'Worker {os.getpid()} is the leader')
+            on_elected()
+            return None
+
+        def run():
+            while not self.stopped.is_set():
+                if self.try_acquire():
+                    logging.info(f'Worker {os.getpid()} took over as the leader')
+                    try:
+                        on_elected()
+                    except Exception as e:
+                        logging.error(f'Error starting the leader: {e}', exc_info=True)
+                    return
+                if on_follower is not None:
+                    try:
+                        on_follower()
+                    except Exception as e:
+                        logging.error(f'Error following the leader: {e}', exc_info=True)
+                self.stopped.wait(interval)
+
+        thread = threading.Thread(target=run, name='leader-election', daemon=True)
+        thread.start()
+        return thread
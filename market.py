@@ -0,0 +1,201 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+# the one market record every source is normalized into, and its columnar batch form.
+#
+# Market is a __slots__ class: no per-instance __dict__, so a market costs its fields and nothing
+# else, and every market has the same attributes whichever venue it came from. The venue
+# constructors below are the only place venue payloads are interpreted. For code written against
+# the old dict markets, market['title'] and market.get('ticker') still work; to_row() gives the
+# table row / API object.
+#
+# MarketBatch holds many markets as NumPy columns (prices, volumes, close times) plus lists for the
+# strings. Its columns are the arrays themselves, so vectorized consumers take them without a copy.
+
+class Market:
+    __slots__ = ('source', 'ticker', 'id', 'kalshi_id', 'title', 'description',
+                 'yes_price', 'no_price', 'volume', 'volume_24h', 'close_time')
+
+    def __init__(self, source, title, description='', yes_price=None, no_price=None, volume=None,
+                 volume_24h=None, close_time=None, ticker=None, id=None, kalshi_id=None):
+        self.source = source
+        self.ticker = ticker
+        self.id = id
+        self.kalshi_id = kalshi_id
+        self.title = title
+        self.description = description
+        self.yes_price = yes_price
+        self.no_price = no_price
+        self.volume = volume
+        self.volume_24h = volume_24h
+        self.close_time = close_time
+
+    # kalshi_python market from the trade API's get_markets
+    @classmethod
+    def from_kalshi(cls, market):
+        return cls(
+            source='kalshi',
+            ticker=market.ticker,
+            kalshi_id='N/A',  # non-election markets dont have an ID field
+            title=market.title,
+            description='',
+            yes_price=market.yes_ask / 100 if hasattr(market, 'yes_ask') else 0,
+            no_price=market.no_ask / 100 if hasattr(market, 'no_ask') else 0,
+            volume=market.volume,
+            volume_24h=market.volume_24h,
+            close_time=market.close_time
+        )
+
+    # market of an event from the kalshi elections API
+    @classmethod
+    def from_kalshi_election(cls, event, market):
+        return cls(
+            source='kalshi',
+            ticker=market['ticker_name'],
+            kalshi_id=market['id'],
+            title=market['title'],
+            description=event['underlying'] + event['description_context'],
+            yes_price=market['yes_ask'],
+            no_price=1 - market['yes_ask'],  # kalshi election markets dont have a no_ask value
+            volume=market['volume'],
+            volume_24h=market.get('volume_24h', 'N/A'),
+            close_time=market['close_date']
+        )
+
+    # market from the polymarket gamma API
+    @classmethod
+    def from_polymarket(cls, market):
+        outcome_prices = json.loads(market['outcomePrices'])
+        return cls(
+            source='polymarket',
+            id=str(market['id']),
+            title=market['question'],
+            description=market['description'],
+            yes_price=float(outcome_prices[0]),
+            no_price=float(outcome_prices[1]),
+            volume=market['volume'],
+            volume_24h=market.get('volume24hr', 0),
+            close_time=market['events'][0]['endDate']  ## TODO: consider case with multiple events
+        )
+
+    # row of a source market table. source defaults to the row's own source column.
+    @classmethod
+    def from_row(cls, row, source=None):
+        return cls(
+            source=source or row.get('source'),
+            ticker=row.get('ticker'),
+            id=None if row.get('id') is None else str(row['id']),
+            kalshi_id=row.get('kalshi_id'),
+            title=row['title'],
+            description=row.get('description') or '',
+            yes_price=row.get('yes_price'),
+            no_price=row.get('no_price'),
+            volume=row.get('volume'),
+            volume_24h=row.get('volume_24h'),
+            close_time=row.get('close_time')
+        )
+
+    # ticker for kalshi, id for polymarket
+    @property
+    def key(self):
+        return self.ticker if self.source == 'kalshi' else self.id
+
+    # "source:key", unique across venues: price history, live feed and listing cursor identity
+    @property
+    def source_key(self):
+        return f'{self.source}:{self.key}'
+
+    # source table row / API object; venue id fields that don't apply are left out
+    def to_row(self):
+        row = {
+            'source': self.source,
+            'title': self.title,
+            'description': self.description,
+            'yes_price': self.yes_price,
+            'no_price': self.no_price,
+            'volume': self.volume,
+            'volume_24h': self.volume_24h,
+            'close_time': self.close_time
+        }
+        for name in ('ticker', 'id', 'kalshi_id'):
+            value = getattr(self, name)
+            if value is not None:
+                row[name] = value
+        return row
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        if name not in self.__slots__ or getattr(self, name) is None:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __repr__(self):
+        return f'Market({self.source}:{self.key} {self.title!r})'
+
+# parse a market close_time (datetime, or ISO 8601 string from the venues / database) into an
+# aware datetime. Returns None when the value is missing or unparseable.
+def parse_close_time(close_time):
+    if isinstance(close_time, datetime):
+        return close_time if close_time.tzinfo else close_time.replace(tzinfo=timezone.utc)
+    if not close_time or not isinstance(close_time, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(close_time.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _timestamp(close_time):
+    parsed = parse_close_time(close_time)
+    return parsed.timestamp() if parsed else np.nan
+
+class MarketBatch:
+    NUMERIC_FIELDS = ('yes_price', 'no_price', 'volume', 'volume_24h')
+
+    def __init__(self, sources, keys, titles, descriptions, yes_price, no_price, volume, volume_24h, close_time):
+        self.sources = sources
+        self.keys = keys
+        self.titles = titles
+        self.descriptions = descriptions
+        self.yes_price = yes_price
+        self.no_price = no_price
+        self.volume = volume
+        self.volume_24h = volume_24h
+        self.close_time = close_time  # epoch seconds, NaN when unknown
+
+    @classmethod
+    def from_markets(cls, markets):
+        count = len(markets)
+        columns = {name: np.empty(count, dtype=np.float64) for name in cls.NUMERIC_FIELDS + ('close_time',)}
+        sources, keys, titles, descriptions = [], [], [], []
+        for position, market in enumerate(markets):
+            sources.append(market.source)
+            keys.append(market.key)
+            titles.append(market.title)
+            descriptions.append(market.description)
+            for name in cls.NUMERIC_FIELDS:
+                columns[name][position] = _float(getattr(market, name))
+            columns['close_time'][position] = _timestamp(market.close_time)
+        return cls(sources, keys, titles, descriptions, **columns)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # the numeric columns by name; the batch's own arrays, not copies
+    def columns(self):
+        return {name: getattr(self, name) for name in self.NUMERIC_FIELDS + ('close_time',)}
+
+    # text embedded for dedup, as utils.market_text
+    def texts(self):
+        return [f'{title} {description}' for title, description in zip(self.titles, self.descriptions)]
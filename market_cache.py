@@ -0,0 +1,185 @@
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from functools import cached_property
+
+from config import SHARED_SNAPSHOT_PATH
+
+# in-memory snapshot of the merged market list served by /api/markets.
+#
+# The snapshot holds the already-serialized JSON body and its ETag, so a request is a dict lookup
+# plus a bytes write no matter how slow the venues are. Once it is older than the TTL the next
+# request starts one background refresh and keeps getting the stale snapshot until it completes.
+# Refreshes are single-flight: concurrent requests (or the scheduler) never trigger a second one.
+# Only the very first request in a process waits for upstream.
+#
+# With several workers only the leader (see leader.py) refreshes; it publishes each snapshot to a
+# file that the other workers map read-only (SharedSnapshot). A published file is never modified,
+# only replaced, so a follower keeps serving the version it mapped until it sees a newer file.
+
+Snapshot = namedtuple('Snapshot', ['markets', 'body', 'etag', 'created_at', 'source_status'])
+
+class SnapshotCache:
+    # refresh_fn() returns (markets, source_status); serialize(markets) returns the JSON body bytes.
+    # on_refresh(snapshot) runs after each successful refresh.
+    def __init__(self, refresh_fn, serialize, ttl, on_refresh=None):
+        self.refresh_fn = refresh_fn
+        self.serialize = serialize
+        self.ttl = ttl
+        self.on_refresh = on_refresh
+        self._snapshot = None
+        self._refreshing = False
+        self._condition = threading.Condition()
+
+    def age(self):
+        snapshot = self._snapshot
+        return None if snapshot is None else time.time() - snapshot.created_at
+
+    def _run_refresh(self, refresh_fn=None):
+        try:
+            start = time.perf_counter()
+            markets, source_status = (refresh_fn or self.refresh_fn)()
+            body = self.serialize(markets)
+            snapshot = Snapshot(
+                markets=markets,
+                body=body,
+                etag=hashlib.sha1(body).hexdigest(),
+                created_at=time.time(),
+                source_status=source_status
+            )
+            with self._condition:
+                self._snapshot = snapshot
+            logging.info(f'Refreshed market snapshot: {len(markets)} markets, {len(body)} bytes in {time.perf_counter() - start:.1f}s')
+        except Exception as e:
+            logging.error(f'Error refreshing market snapshot: {e}', exc_info=True)
+            return
+        finally:
+            with self._condition:
+                self._refreshing = False
+                self._condition.notify_all()
+
+        if self.on_refresh is not None:
+            try:
+                self.on_refresh(snapshot)
+            except Exception as e:
+                logging.error(f'Error publishing market snapshot: {e}', exc_info=True)
+
+    # current snapshot; starts a background refresh when it is stale and only blocks when there
+    # is no snapshot yet
+    def get(self):
+        with self._condition:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                if time.time() - snapshot.created_at > self.ttl and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._run_refresh, name='market-snapshot-refresh', daemon=True).start()
+                return snapshot
+        return self.refresh(force=False)
+
+    # refresh now and return the new snapshot. If a refresh is already running, wait for it instead
+    # of starting another one. With force=False an existing snapshot is returned as is. refresh_fn
+    # replaces the cache's own for this refresh, e.g. to refetch only some sources.
+    def refresh(self, force=True, refresh_fn=None):
+        with self._condition:
+            if not force and self._snapshot is not None:
+                return self._snapshot
+            leader = not self._refreshing
+            self._refreshing = True
+        if leader:
+            self._run_refresh(refresh_fn)
+
+        with self._condition:
+            while self._refreshing:
+                self._condition.wait()
+            if self._snapshot is None:
+                raise RuntimeError('No market snapshot available')
+            return self._snapshot
+
+# shared snapshot file: MAGIC, the header length as a little-endian uint32, a JSON header
+# ({etag, created_at, source_status, body_length, ...}) and the body, which runs to the end of the file
+MAGIC = b'MKTSNAP1'
+HEADER_LENGTH = struct.Struct('<I')
+
+# a published snapshot mapped read-only; body is a memoryview into the mapping, so followers share
+# the page cache instead of holding a copy of the body each. markets are parsed on first use.
+class MappedSnapshot:
+    def __init__(self, path, load_markets=None):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # ValueError for an empty file
+        self.path = path
+        self.version = (stat.st_ino, stat.st_mtime_ns)
+        self.load_markets = load_markets
+
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        if len(mapping) < header_start or mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a market snapshot')
+        header_length, = HEADER_LENGTH.unpack_from(mapping, len(MAGIC))
+        self.header = json.loads(mapping[header_start:header_start + header_length])
+        self.body_offset = header_start + header_length
+        self.body = memoryview(mapping)[self.body_offset:self.body_offset + self.header['body_length']]
+        if len(self.body) != self.header['body_length']:
+            raise ValueError(f'{path} is truncated')
+        self.etag = self.header['etag']
+        self.created_at = self.header['created_at']
+        self.source_status = self.header['source_status']
+
+    @cached_property
+    def markets(self):
+        rows = json.loads(bytes(self.body))
+        return self.load_markets(rows) if self.load_markets else rows
+
+    # the body as a file, for wsgi.file_wrapper (sendfile under gunicorn). A file replaced since it
+    # was mapped can't be reopened, so that rare request gets a copy of the mapped body instead.
+    def open_body(self):
+        f = open(self.path, 'rb')
+        stat = os.fstat(f.fileno())
+        if (stat.st_ino, stat.st_mtime_ns) != self.version:
+            f.close()
+            return io.BytesIO(self.body)
+        f.seek(self.body_offset)
+        return f
+
+class SharedSnapshot:
+    # load_markets(rows) turns the body's rows back into markets for MappedSnapshot.markets
+    def __init__(self, path=SHARED_SNAPSHOT_PATH, load_markets=None):
+        self.path = path
+        self.load_markets = load_markets
+        self._mapped = None
+        self._lock = threading.Lock()
+
+    # write snapshot (and any extra header fields) to a temporary file and swap it in
+    def publish(self, snapshot, **extra):
+        header = json.dumps({
+            'etag': snapshot.etag,
+            'created_at': snapshot.created_at,
+            'source_status': snapshot.source_status,
+            'body_length': len(snapshot.body),
+            **extra
+        }, default=str).encode()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            f.write(snapshot.body)
+        os.replace(temp_path, self.path)
+
+    # the latest published snapshot, mapped once per published file; None before the first publish
+    def get(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self._mapped is None or self._mapped.version != (stat.st_ino, stat.st_mtime_ns):
+                self._mapped = MappedSnapshot(self.path, self.load_markets)
+            return self._mapped
@@ -0,0 +1,156 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from config import FEED_QUEUE_SIZE, FEED_HEARTBEAT_SECONDS, FEED_MAX_SUBSCRIBERS
+
+# server-sent events feed of market price/volume changes, served by /api/markets/stream.
+#
+# Each market refresh is diffed once against the last published prices and the changed markets are
+# serialized once into a "delta" event; publishing appends that same string to every subscriber's
+# queue. A new subscriber first gets a "snapshot" event with every known price, also serialized
+# once per version and shared. Nothing here calls the venues: the feed only sees the refreshes the
+# market snapshot already does.
+#
+# Events carry [yes_price, no_price, volume] per market key ("source:ticker_or_id"):
+#   event: snapshot  data: {"seq": 12, "fields": [...], "markets": {key: [yes, no, volume], ...}}
+#   event: delta     data: {"seq": 13, "markets": {key: [yes, no, volume], ...}}
+# A published list is complete for each source in it, so a known market of those sources that is
+# missing from it has closed or been delisted: it is dropped, and its delta value is null.
+#
+# A client that reads slower than refreshes arrive (its queue reaches FEED_QUEUE_SIZE) has its
+# queued deltas dropped and gets one fresh snapshot instead, so memory per client is bounded.
+
+FIELDS = ('yes_price', 'no_price', 'volume')
+
+def _float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+def format_event(name, seq, data):
+    return f'id: {seq}\nevent: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class FeedFull(Exception):
+    pass
+
+class Subscriber:
+    def __init__(self):
+        self.queue = deque()
+        self.needs_snapshot = True
+        self.wakeup = threading.Event()
+        self.resyncs = 0
+
+class MarketFeed:
+    def __init__(self, queue_size=FEED_QUEUE_SIZE, max_subscribers=FEED_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.seq = 0
+        self.subscribers = set()
+        self._snapshot_event = (None, None)  # (seq, serialized snapshot event)
+
+    # diff a refreshed market list against the published prices and fan the changes out. The diff
+    # and the price swap happen under the lock, so concurrent publishers (the refresh thread and a
+    # follower's snapshot sync) never emit the same change twice or lose one.
+    # Returns the number of changed (or dropped) markets.
+    def publish(self, markets):
+        start = time.perf_counter()
+        with self.lock:
+            changed = {}
+            sources = set()
+            listed = set()
+            for market in markets:
+                key = market.source_key
+                sources.add(market.source)
+                listed.add(key)
+                values = [_float(market.get(field)) for field in FIELDS]
+                if self.prices.get(key) != values:
+                    changed[key] = values
+            for key in self.prices:
+                if key not in listed and key.split(':', 1)[0] in sources:
+                    changed[key] = None
+            if not changed:
+                return 0
+
+            for key, values in changed.items():
+                if values is None:
+                    del self.prices[key]
+                else:
+                    self.prices[key] = values
+            self.seq += 1
+            event = format_event('delta', self.seq, {'seq': self.seq, 'markets': changed})
+            resynced = 0
+            for subscriber in self.subscribers:
+                if subscriber.needs_snapshot:
+                    continue
+                if len(subscriber.queue) >= self.queue_size:
+                    subscriber.queue.clear()
+                    subscriber.needs_snapshot = True
+                    subscriber.resyncs += 1
+                    resynced += 1
+                else:
+                    subscriber.queue.append(event)
+                subscriber.wakeup.set()
+            subscribers = len(self.subscribers)
+
+        logging.info(
+            f'Published {len(changed)} market changes to {subscribers} feed subscribers '
+            f'({resynced} resynced) in {(time.perf_counter() - start) * 1000:.1f}ms')
+        return len(changed)
+
+    def subscribe(self):
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise FeedFull(f'Feed is at its limit of {self.max_subscribers} subscribers')
+            subscriber = Subscriber()
+            self.subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    # called with the lock held
+    def _snapshot(self):
+        if self._snapshot_event[0] != self.seq:
+            self._snapshot_event = (self.seq, format_event(
+                'snapshot', self.seq, {'seq': self.seq, 'fields': FIELDS, 'markets': self.prices}))
+        return self._snapshot_event[1]
+
+    # called with the lock held
+    def _take(self, subscriber):
+        if subscriber.needs_snapshot:
+            subscriber.needs_snapshot = False
+            subscriber.queue.clear()
+            return self._snapshot()
+        return subscriber.queue.popleft() if subscriber.queue else None
+
+    # next event for a subscriber, or None once timeout passes without one
+    def next_event(self, subscriber, timeout):
+        with self.lock:
+            event = self._take(subscriber)
+            if event is not None:
+                return event
+            subscriber.wakeup.clear()
+        subscriber.wakeup.wait(timeout)
+        with self.lock:
+            return self._take(subscriber)
+
+    # SSE body for one subscriber: its events as they arrive, with a comment line as heartbeat so
+    # proxies keep the connection open and disconnected clients are noticed. Unsubscribes when
+    # the client goes away.
+    def stream(self, subscriber, heartbeat=FEED_HEARTBEAT_SECONDS):
+        try:
+            while True:
+                event = self.next_event(subscriber, heartbeat)
+                yield event if event is not None else ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+market_feed = MarketFeed()
@@ -0,0 +1,127 @@
+import base64
+import bisect
+import json
+import threading
+
+from config import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from utils import parse_close_time
+
+# query parameters shared by the market listing endpoints:
+#   source=kalshi,polymarket   only these venues (a duplicate pair matches when either side does)
+#   min_volume=1000            volume at least this (both venues' volume for duplicate pairs)
+#   close_after=, close_before=  ISO 8601 close_time range
+#   q=election                 case-insensitive title substring
+#   limit=500, cursor=...      page size and the next_cursor of the previous page
+#   format=ndjson              stream one JSON object per line instead of a JSON page
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# parse filters and paging from request args. Raises ValueError on bad input.
+def parse_market_query(args):
+    query = {
+        'sources': {source for source in args.get('source', '').split(',') if source} or None,
+        'min_volume': None,
+        'close_after': None,
+        'close_before': None,
+        'title': args.get('q', '').lower() or None,
+        'limit': None,
+        'cursor': decode_cursor(args['cursor']) if args.get('cursor') else None,
+        'ndjson': args.get('format') == 'ndjson'
+    }
+    if args.get('min_volume'):
+        query['min_volume'] = _float(args['min_volume'])
+        if query['min_volume'] is None:
+            raise ValueError(f"Invalid min_volume: {args['min_volume']}")
+    for bound in ('close_after', 'close_before'):
+        if args.get(bound):
+            query[bound] = parse_close_time(args[bound])
+            if query[bound] is None:
+                raise ValueError(f'Invalid {bound}: {args[bound]}')
+    if args.get('limit'):
+        try:
+            query['limit'] = min(max(int(args['limit']), 1), MAX_PAGE_LIMIT)
+        except ValueError:
+            raise ValueError(f"Invalid limit: {args['limit']}")
+    elif not query['ndjson']:
+        query['limit'] = DEFAULT_PAGE_LIMIT
+    return query
+
+# True when the request asks for anything other than the plain full list
+def is_market_query(args):
+    return any(args.get(name) for name in (
+        'source', 'min_volume', 'close_after', 'close_before', 'q', 'limit', 'cursor', 'format'))
+
+# volume and sources replace the market's own, e.g. for a duplicate pair row
+def matches_query(market, query, volume=None, sources=None):
+    if query['sources'] and query['sources'].isdisjoint(sources or (market.get('source'), )):
+        return False
+    if query['min_volume'] is not None:
+        volume = _float(market.get('volume')) if volume is None else volume
+        if volume is None or volume < query['min_volume']:
+            return False
+    if query['close_after'] or query['close_before']:
+        close_time = parse_close_time(market.get('close_time'))
+        if close_time is None:
+            return False
+        if query['close_after'] and close_time < query['close_after']:
+            return False
+        if query['close_before'] and close_time > query['close_before']:
+            return False
+    if query['title'] and query['title'] not in (market.get('title') or '').lower():
+        return False
+    return True
+
+_sorted_snapshot = (None, [], [])  # (etag, sorted keys, snapshot positions in key order)
+_sorted_snapshot_lock = threading.Lock()
+
+def _sorted_keys(snapshot):
+    global _sorted_snapshot
+    with _sorted_snapshot_lock:
+        if _sorted_snapshot[0] != snapshot.etag:
+            # Market.source_key is stable across snapshot refreshes, so a cursor resumes where it left off
+            order = sorted(range(len(snapshot.markets)), key=lambda position: snapshot.markets[position].source_key)
+            keys = [snapshot.markets[position].source_key for position in order]
+            _sorted_snapshot = (snapshot.etag, keys, order)
+        return _sorted_snapshot[1], _sorted_snapshot[2]
+
+# yield (cursor position, market) for snapshot markets matching query, in key order, starting after
+# the query's cursor. The cursor is the sort key of the last market returned.
+def iter_snapshot_markets(snapshot, query):
+    keys, order = _sorted_keys(snapshot)
+    start = bisect.bisect_right(keys, query['cursor']) if query['cursor'] else 0
+    for position in range(start, len(keys)):
+        market = snapshot.markets[order[position]]
+        if matches_query(market, query):
+            yield keys[position], market
+
+# take up to limit items from an iterator of (cursor position, item). Returns (items, next_cursor),
+# with next_cursor None when nothing is left.
+def take_page(items, limit):
+    page = []
+    last_position = None
+    for position, item in items:
+        if len(page) == limit:
+            return page, encode_cursor(last_position)
+        page.append(item)
+        last_position = position
+    return page, None
+
+# NDJSON body generator, one serialized item per line
+def ndjson_lines(items, dumps, limit=None):
+    for count, (_, item) in enumerate(items):
+        if limit is not None and count >= limit:
+            return
+        yield dumps(item) + '\n'
@@ -0,0 +1,119 @@
+import numpy as np
+
+# cross-venue matching on sentence embeddings. Only kalshi x polymarket pairs are ever scored
+# (same-source pairs are never duplicates we care about), and the similarity matrix is computed
+# in fixed-size tiles so peak memory is bounded by block_size * polymarket_block_size, not n^2.
+
+# scale each embedding row to unit length so a dot product between rows is their cosine similarity
+def normalize_embeddings(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2:
+        embeddings = embeddings.reshape(len(embeddings), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+# for every kalshi embedding, return up to top_k polymarket candidates scoring above threshold.
+# Embeddings are expected to be normalized (see normalize_embeddings).
+# Returns a list of (kalshi_index, polymarket_index, score) sorted by descending score.
+def top_k_matches(kalshi_embeddings, polymarket_embeddings, threshold=0.8, top_k=5,
+                  block_size=1024, polymarket_block_size=4096):
+    kalshi_embeddings = np.asarray(kalshi_embeddings, dtype=np.float32)
+    polymarket_embeddings = np.asarray(polymarket_embeddings, dtype=np.float32)
+    num_kalshi = len(kalshi_embeddings)
+    num_polymarket = len(polymarket_embeddings)
+    if num_kalshi == 0 or num_polymarket == 0 or top_k <= 0:
+        return []
+
+    top_k = min(top_k, num_polymarket)
+    kalshi_hits, polymarket_hits, hit_scores = [], [], []
+
+    for kalshi_start in range(0, num_kalshi, block_size):
+        kalshi_block = kalshi_embeddings[kalshi_start:kalshi_start + block_size]
+        rows = len(kalshi_block)
+
+        # running top_k (score, polymarket index) for every kalshi row in this block
+        best_scores = np.full((rows, top_k), -np.inf, dtype=np.float32)
+        best_indices = np.full((rows, top_k), -1, dtype=np.int64)
+
+        for polymarket_start in range(0, num_polymarket, polymarket_block_size):
+            polymarket_block = polymarket_embeddings[polymarket_start:polymarket_start + polymarket_block_size]
+            scores = kalshi_block @ polymarket_block.T
+
+            # columns [0, top_k) are the running best, the rest are this block's polymarket rows
+            candidate_scores = np.concatenate([best_scores, scores], axis=1)
+            keep = np.argpartition(-candidate_scores, top_k - 1, axis=1)[:, :top_k]
+            best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+            best_indices = np.where(
+                keep < top_k,
+                np.take_along_axis(best_indices, np.minimum(keep, top_k - 1), axis=1),
+                keep - top_k + polymarket_start
+            )
+
+        row_positions, column_positions = np.nonzero(best_scores > threshold)
+        kalshi_hits.append(row_positions + kalshi_start)
+        polymarket_hits.append(best_indices[row_positions, column_positions])
+        hit_scores.append(best_scores[row_positions, column_positions])
+
+    kalshi_hits = np.concatenate(kalshi_hits)
+    polymarket_hits = np.concatenate(polymarket_hits)
+    hit_scores = np.concatenate(hit_scores)
+
+    # stable sort so ties keep kalshi order, which keeps results deterministic between runs
+    order = np.argsort(-hit_scores, kind='stable')
+    return [
+        (int(kalshi_hits[i]), int(polymarket_hits[i]), float(hit_scores[i]))
+        for i in order
+    ]
+
+# top_k_matches restricted to the given candidate pairs (see blocking.candidate_pairs): each pair is
+# scored on its own, chunk_size pairs at a time, instead of scoring every kalshi x polymarket pair.
+# Returns a list of (kalshi_index, polymarket_index, score) sorted by descending score.
+def candidate_matches(kalshi_embeddings, polymarket_embeddings, kalshi_positions, polymarket_positions,
+                      threshold=0.8, top_k=5, chunk_size=8192):
+    kalshi_embeddings = np.asarray(kalshi_embeddings, dtype=np.float32)
+    polymarket_embeddings = np.asarray(polymarket_embeddings, dtype=np.float32)
+    if len(kalshi_positions) == 0 or top_k <= 0:
+        return []
+
+    scores = np.empty(len(kalshi_positions), dtype=np.float32)
+    for start in range(0, len(kalshi_positions), chunk_size):
+        end = start + chunk_size
+        scores[start:end] = np.einsum(
+            'ij,ij->i',
+            kalshi_embeddings[kalshi_positions[start:end]],
+            polymarket_embeddings[polymarket_positions[start:end]]
+        )
+
+    # keep the top_k scores above threshold per kalshi market
+    above = scores > threshold
+    kalshi_hits, polymarket_hits, hit_scores = kalshi_positions[above], polymarket_positions[above], scores[above]
+    order = np.lexsort((-hit_scores, kalshi_hits))
+    kalshi_hits, polymarket_hits, hit_scores = kalshi_hits[order], polymarket_hits[order], hit_scores[order]
+    new_kalshi = np.ones(len(kalshi_hits), dtype=bool)
+    new_kalshi[1:] = kalshi_hits[1:] != kalshi_hits[:-1]
+    group_starts = np.flatnonzero(new_kalshi)
+    rank = np.arange(len(kalshi_hits)) - np.repeat(group_starts, np.diff(np.append(group_starts, len(kalshi_hits))))
+    keep = rank < top_k
+    kalshi_hits, polymarket_hits, hit_scores = kalshi_hits[keep], polymarket_hits[keep], hit_scores[keep]
+
+    # same ordering as top_k_matches: descending score, ties in kalshi order
+    order = np.argsort(-hit_scores, kind='stable')
+    return [
+        (int(kalshi_hits[i]), int(polymarket_hits[i]), float(hit_scores[i]))
+        for i in order
+    ]
+
+# greedily pick the highest scoring matches so each market appears in at most one pair.
+# matches must already be sorted by descending score (as returned by top_k_matches).
+def select_one_to_one(matches):
+    used_kalshi = set()
+    used_polymarket = set()
+    pairs = []
+    for kalshi_index, polymarket_index, score in matches:
+        if kalshi_index in used_kalshi or polymarket_index in used_polymarket:
+            continue
+        used_kalshi.add(kalshi_index)
+        used_polymarket.add(polymarket_index)
+        pairs.append((kalshi_index, polymarket_index, score))
+    return pairs
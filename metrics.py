@@ -0,0 +1,193 @@
+import bisect
+import collections
+import functools
+import sys
+import threading
+import time
+
+from config import METRICS_ENABLED, METRIC_BUCKETS, PROFILE_SAMPLE_INTERVAL
+
+# in-process timings and counters, exposed in the Prometheus text format on /metrics.
+#
+#   with timed('embedding_encode'): ...           observes embedding_encode_seconds
+#   @timed('db_query', table='kalshi_markets')    same, around every call
+#   count('venue_retries', venue='kalshi')        adds to venue_retries_total
+#
+# Every timed stage is a histogram over METRIC_BUCKETS, one series per label set. Observing is
+# a bisect and two additions under a lock. With METRICS_ENABLED off, timed() hands back one shared
+# no-op context manager and count() returns at once, so instrumented code pays a function call.
+#
+# Gauges are read when /metrics is scraped, from callbacks registered with gauge().
+#
+# SamplingProfiler samples one thread's stack every PROFILE_SAMPLE_INTERVAL seconds from a
+# background thread and reports the stacks in the collapsed ("folded") format flame graph tools read.
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Registry:
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms = {}  # name -> {label tuple: Histogram}
+        self.counters = {}  # name -> {label tuple: value}
+        self.gauges = {}  # name -> (help, callback)
+
+    def observe(self, name, seconds, labels=()):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, labels=()):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    # callback() returns a number, or {label value tuple: number} with label_names naming the labels
+    def gauge(self, name, callback, help='', label_names=()):
+        self.gauges[name] = (help, callback, tuple(label_names))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            histograms = {name: {labels: (list(h.counts), h.sum) for labels, h in series.items()}
+                          for name, series in self.histograms.items()}
+            counters = {name: dict(series) for name, series in self.counters.items()}
+
+        for name, series in sorted(histograms.items()):
+            lines.append(f'# TYPE {name}_seconds histogram')
+            for labels, (counts, total) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_seconds_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_seconds_sum{_labels(labels)} {total}')
+                lines.append(f'{name}_seconds_count{_labels(labels)} {cumulative}')
+
+        for name, series in sorted(counters.items()):
+            lines.append(f'# TYPE {name}_total counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{name}_total{_labels(labels)} {value}')
+
+        for name, (help, callback, label_names) in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception:
+                continue
+            if help:
+                lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            if isinstance(value, dict):
+                for label_values, series_value in sorted(value.items()):
+                    if series_value is not None:
+                        lines.append(f'{name}{_labels(tuple(zip(label_names, label_values)))} {series_value}')
+            elif value is not None:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+registry = Registry()
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.observe(self.name, time.perf_counter() - self.start, self.labels)
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.name, self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __call__(self, fn):
+        return fn
+
+_no_timer = _NoTimer()
+
+# context manager / decorator observing the seconds spent in a stage
+def timed(name, **labels):
+    if not METRICS_ENABLED:
+        return _no_timer
+    return _Timer(name, tuple(sorted(labels.items())))
+
+# record a duration measured elsewhere
+def observe(name, seconds, **labels):
+    if METRICS_ENABLED:
+        registry.observe(name, seconds, tuple(sorted(labels.items())))
+
+def count(name, amount=1, **labels):
+    if METRICS_ENABLED:
+        registry.count(name, amount, tuple(sorted(labels.items())))
+
+def gauge(name, callback, help='', label_names=()):
+    registry.gauge(name, callback, help, label_names)
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    # one "frame;frame;frame count" line per distinct stack, most sampled first
+    def collapsed(self):
+        return ''.join(f'{stack} {samples}\n' for stack, samples in self.stacks.most_common())
@@ -1,18 +1,30 @@
 import os
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
-from py_clob_client.constants import POLYGON
-from py_clob_client.client import ClobClient
 import requests
+from requests.adapters import HTTPAdapter
 import pprint
 
+from config import POLYMARKET_FETCH_WORKERS, POLYMARKET_FETCH_RETRIES, POLYMARKET_FETCH_BACKOFF, POLYMARKET_FETCH_TIMEOUT
+from config import POLYMARKET_POOL_SIZE
+from rate_limit import get_limiter
+from market import Market
+from metrics import timed
+
 logging.basicConfig(level=logging.INFO)
 
 load_dotenv()
 
+GAMMA_MARKETS_URL = "https://gamma-api.polymarket.com/markets"
+
 def initialize_polymarket_clob_client():
+    # imported here: py_clob_client pulls in web3 and takes about a second to import
+    from py_clob_client.constants import POLYGON
+    from py_clob_client.client import ClobClient
 
     host = "https://clob.polymarket.com"
     key = os.getenv("WEB3_WALLET_PK")
@@ -20,38 +32,128 @@ def initialize_polymarket_clob_client():
 
     return ClobClient(host, key=key, chain_id=chain_id)
 
-def fetch_polymarket_markets(client, limit=100, total_markets=1000, volume_num_min=100000):
-    all_markets = []
+def fetch_polymarket_markets(client, limit=100, total_markets=1000, volume_num_min=100000,
+                             max_workers=POLYMARKET_FETCH_WORKERS, url=None):
+    return [market for page in iter_polymarket_pages(limit, total_markets, volume_num_min, max_workers, url) for market in page]
+
+# the markets of fetch_polymarket_markets, one normalized gamma page at a time in offset order
+def iter_polymarket_pages(limit=100, total_markets=1000, volume_num_min=100000,
+                          max_workers=POLYMARKET_FETCH_WORKERS, url=None):
+    url = url or GAMMA_MARKETS_URL
+    if max_workers > 1:
+        pages = iter_polymarket_pages_concurrently(limit, total_markets, volume_num_min, max_workers, url)
+    else:
+        pages = iter_polymarket_pages_sequentially(limit, total_markets, volume_num_min, url)
+
+    fetched = 0
+    for page in pages:
+        page = page[:total_markets - fetched]  # Return only the top 'total_markets' markets
+        fetched += len(page)
+        yield page
+
+    logging.info(f"Fetched {fetched} markets from Polymarket")
+
+def iter_polymarket_pages_sequentially(limit, total_markets, volume_num_min, url):
+    fetched = 0
     offset = 0
+    session = get_http_session()
     
-    while len(all_markets) < total_markets:
+    while fetched < total_markets:
         try:
-            url = f"https://gamma-api.polymarket.com/markets?limit={limit}&offset={offset}&volume_num_min={volume_num_min}&closed=false"
-            response = requests.get(url)
-            response.raise_for_status()
-            markets_data = response.json()
+            markets_data = fetch_polymarket_page(session, url, limit, offset, volume_num_min)
+        except requests.exceptions.RequestException as e:
+            # a truncated listing would be served (and diffed) as if the missing markets had closed
+            logging.error(f"Error fetching Polymarket markets at offset {offset}: {e}", exc_info=True)
+            raise
+
+        if not markets_data:
+            break  # No more markets to fetch
+
+        normalized_markets = massage_polymarket_data(markets_data)
+        fetched += len(normalized_markets)
+        yield normalized_markets
+
+        offset += limit
+
+        if len(markets_data) < limit:
+            break  # Less than 'limit' markets returned, we've reached the end
+
+# shared session so every page reuses pooled keep-alive connections
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POLYMARKET_POOL_SIZE)
+            _session = requests.Session()
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+def _get_page(session, url, params):
+    response = session.get(url, params=params, timeout=POLYMARKET_FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+# fetch one raw page of gamma-api markets within the polymarket rate limit. 429s, 5xxs and
+# connection errors are retried with jittered backoff (honouring Retry-After) before an error
+# reaches the caller.
+def fetch_polymarket_page(session, url, limit, offset, volume_num_min):
+    return get_limiter('polymarket').call(_get_page, session, url, {
+        'limit': limit,
+        'offset': offset,
+        'volume_num_min': volume_num_min,
+        'closed': 'false'
+    }, retries=POLYMARKET_FETCH_RETRIES, backoff=POLYMARKET_FETCH_BACKOFF)
+
+# fetch offset pages with up to max_workers requests in flight. Pages are consumed strictly in
+# offset order, so the result is the same as the sequential loop: it ends at the first short page
+# and anything requested beyond that page is discarded. A page that still fails after its retries
+# raises, like the sequential loop, so the refresh is reported as failed rather than truncated. New requests are only sent
+# when the consumer asks for the next page, so a slow consumer holds back fetching.
+def iter_polymarket_pages_concurrently(limit, total_markets, volume_num_min, max_workers, url):
+    session = get_http_session()
+    fetched = 0
+    pending = {}  # offset -> future
+    next_offset = 0
+    next_to_consume = 0
+    finished = False
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='polymarket-fetch')
+    try:
+        while not finished:
+            # markets that failed normalization don't count, so extend the offset budget by that many
+            offset_budget = total_markets + (next_to_consume - fetched)
+            while len(pending) < max_workers and next_offset < offset_budget:
+                pending[next_offset] = executor.submit(
+                    fetch_polymarket_page, session, url, limit, next_offset, volume_num_min)
+                next_offset += limit
+
+            if next_to_consume not in pending:
+                break  # every page within the budget has been consumed
+
+            try:
+                markets_data = pending.pop(next_to_consume).result()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error fetching Polymarket markets at offset {next_to_consume}: {e}", exc_info=True)
+                raise
 
             if not markets_data:
                 break  # No more markets to fetch
 
-            # logging.info(f"Fetched {len(markets_data)} markets from Polymarket (offset: {offset})")
-            
             normalized_markets = massage_polymarket_data(markets_data)
-            all_markets.extend(normalized_markets)
-            
-            offset += limit
-            
-            if len(markets_data) < limit:
-                break  # Less than 'limit' markets returned, we've reached the end
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching Polymarket markets: {e}", exc_info=True)
-            break
-    
-    logging.info(f"Fetched {len(all_markets)} markets from Polymarket")
-
-    return all_markets[:total_markets]  # Return only the top 'total_markets' markets
+            fetched += len(normalized_markets)
+            next_to_consume += limit
+            finished = len(markets_data) < limit or fetched >= total_markets
+            yield normalized_markets
+    finally:
+        for future in pending.values():
+            future.cancel()
+        executor.shutdown(wait=True)
 
+@timed('normalize', venue='polymarket')
 def massage_polymarket_data(markets_data):
     normalized_data = []
     if isinstance(markets_data, list):
@@ -62,21 +164,7 @@ def massage_polymarket_data(markets_data):
 
     for market in markets_data:
         try:
-            outcome_prices = json.loads(market['outcomePrices'])
-            yes_price = float(outcome_prices[0])
-            no_price = float(outcome_prices[1])
-            
-            normalized_market = {
-                # 'id': market['id'],
-                'source': 'polymarket',
-                'title': market['question'],
-                'description': market['description'],
-                'yes_price': yes_price,
-                'no_price': no_price,
-                'volume': market['volume'],
-                'volume_24h': market.get('volume24hr', 0),
-                'close_time': market['events'][0]['endDate'] ## TODO: consider case with multiple events
-            }
+            normalized_market = Market.from_polymarket(market)
             normalized_data.append(normalized_market)
         except Exception as e:
             logging.error(f"Error processing Polymarket market: {e}", exc_info=True)
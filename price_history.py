@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import PRICE_HISTORY_DIR, PRICE_HISTORY_RAW_DAYS, PRICE_HISTORY_DOWNSAMPLE_SECONDS
+
+# append-only price history of every market, one row per market per refresh.
+#
+# Rows are stored column by column in one directory per UTC day:
+#   <dir>/markets.json            Market.source_key -> int32 market number
+#   <dir>/YYYY-MM-DD/time.i8      epoch seconds
+#   <dir>/YYYY-MM-DD/market.i4    market number
+#   <dir>/YYYY-MM-DD/yes_price.f4, no_price.f4, volume.f8
+#
+# A day being written is in arrival (time) order. Days older than PRICE_HISTORY_RAW_DAYS are
+# compacted: downsampled to the last row per market per PRICE_HISTORY_DOWNSAMPLE_SECONDS bucket and
+# re-sorted by (market, time) with a market offsets index, so reading one market's range from them
+# is two binary searches. Reads only open the day directories that overlap the requested range.
+
+COLUMNS = (
+    ('time', np.int64),
+    ('market', np.int32),
+    ('yes_price', np.float32),
+    ('no_price', np.float32),
+    ('volume', np.float64)
+)
+FILE_SUFFIXES = {np.int64: 'i8', np.int32: 'i4', np.float32: 'f4', np.float64: 'f8'}
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+class PriceHistoryStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.markets_path = os.path.join(directory, 'markets.json')
+        self.market_numbers = {}
+        self.markets_version = None
+        self._load_market_numbers()
+
+    # reread markets.json when another process (the leader, in a follower) replaced it; every
+    # write replaces the file, so a new inode or mtime means new numbers
+    def _load_market_numbers(self):
+        try:
+            stat = os.stat(self.markets_path)
+        except FileNotFoundError:
+            return
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self.markets_version:
+            with open(self.markets_path) as f:
+                self.market_numbers = json.load(f)
+            self.markets_version = version
+
+    def _column_path(self, day, name, dtype):
+        return os.path.join(self.directory, day, f'{name}.{FILE_SUFFIXES[dtype]}')
+
+    def _save_market_numbers(self):
+        temp_path = self.markets_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.market_numbers, f)
+        os.replace(temp_path, self.markets_path)
+        stat = os.stat(self.markets_path)
+        self.markets_version = (stat.st_ino, stat.st_mtime_ns)
+
+    # append one row per market with the given (or current) time
+    def append(self, markets, timestamp=None):
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        day = _day(timestamp)
+
+        with self.lock:
+            os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+            # a new leader numbers markets on from where the previous one stopped
+            self._load_market_numbers()
+            new_numbers = False
+            numbers = np.empty(len(markets), dtype=np.int32)
+            for position, market in enumerate(markets):
+                key = market.source_key
+                if key not in self.market_numbers:
+                    self.market_numbers[key] = len(self.market_numbers)
+                    new_numbers = True
+                numbers[position] = self.market_numbers[key]
+            if new_numbers:
+                self._save_market_numbers()
+
+            columns = {
+                'time': np.full(len(markets), timestamp, dtype=np.int64),
+                'market': numbers,
+                'yes_price': np.array([_float(market.get('yes_price')) for market in markets], dtype=np.float32),
+                'no_price': np.array([_float(market.get('no_price')) for market in markets], dtype=np.float32),
+                'volume': np.array([_float(market.get('volume')) for market in markets], dtype=np.float64)
+            }
+            for name, dtype in COLUMNS:
+                with open(self._column_path(day, name, dtype), 'ab') as f:
+                    columns[name].tofile(f)
+
+    def _read_day(self, day):
+        columns = {}
+        for name, dtype in COLUMNS:
+            path = self._column_path(day, name, dtype)
+            columns[name] = np.memmap(path, dtype=dtype, mode='r') if os.path.getsize(path) else np.empty(0, dtype=dtype)
+        # a write interrupted between column files leaves them at different lengths
+        length = min(len(column) for column in columns.values())
+        return {name: column[:length] for name, column in columns.items()}
+
+    def _is_compacted(self, day):
+        return os.path.exists(os.path.join(self.directory, day, 'offsets.npz'))
+
+    def _days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if len(name) == 10 and os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    # rows for one market between start and end (epoch seconds, inclusive), as column lists
+    def history(self, key, start, end):
+        result = {name: [] for name, _ in COLUMNS if name != 'market'}
+        with self.lock:
+            self._load_market_numbers()
+            number = self.market_numbers.get(key)
+        if number is None:
+            return None
+
+        first_day, last_day = _day(start), _day(end)
+        for day in self._days():
+            if day < first_day or day > last_day:
+                continue
+            columns = self._read_day(day)
+            if self._is_compacted(day):
+                with np.load(os.path.join(self.directory, day, 'offsets.npz')) as offsets:
+                    markets, starts = offsets['markets'], offsets['starts']
+                position = np.searchsorted(markets, number)
+                if position == len(markets) or markets[position] != number:
+                    continue
+                lower, upper = starts[position], starts[position + 1]
+                times = columns['time'][lower:upper]
+                rows = np.arange(lower + np.searchsorted(times, start), lower + np.searchsorted(times, end, side='right'))
+            else:
+                times = columns['time']
+                lower, upper = np.searchsorted(times, start), np.searchsorted(times, end, side='right')
+                rows = lower + np.flatnonzero(columns['market'][lower:upper] == number)
+
+            for name in result:
+                result[name].extend(columns[name][rows].tolist())
+
+        result['yes_price'] = [None if np.isnan(value) else value for value in result['yes_price']]
+        result['no_price'] = [None if np.isnan(value) else value for value in result['no_price']]
+        result['volume'] = [None if np.isnan(value) else value for value in result['volume']]
+        return result
+
+    # downsample and re-sort every day older than raw_days
+    def compact(self, raw_days=PRICE_HISTORY_RAW_DAYS, bucket_seconds=PRICE_HISTORY_DOWNSAMPLE_SECONDS, now=None):
+        cutoff = _day((now if now is not None else time.time()) - raw_days * 86400)
+        with self.lock:
+            for day in self._days():
+                if day >= cutoff or self._is_compacted(day):
+                    continue
+                self._compact_day(day, bucket_seconds)
+
+    def _compact_day(self, day, bucket_seconds):
+        columns = {name: np.array(column) for name, column in self._read_day(day).items()}
+        order = np.lexsort((columns['time'], columns['market']))
+        columns = {name: column[order] for name, column in columns.items()}
+
+        # keep the last row of every (market, time bucket) group
+        buckets = columns['time'] // bucket_seconds
+        last_in_group = np.ones(len(order), dtype=bool)
+        if len(order):
+            last_in_group[:-1] = (columns['market'][1:] != columns['market'][:-1]) | (buckets[1:] != buckets[:-1])
+        columns = {name: column[last_in_group] for name, column in columns.items()}
+
+        markets, starts = np.unique(columns['market'], return_index=True)
+        starts = np.append(starts, len(columns['market']))
+
+        day_path = os.path.join(self.directory, day)
+        temp_path = day_path + '.compacting'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        for name, dtype in COLUMNS:
+            columns[name].astype(dtype).tofile(os.path.join(temp_path, f'{name}.{FILE_SUFFIXES[dtype]}'))
+        np.savez(os.path.join(temp_path, 'offsets.npz'), markets=markets, starts=starts)
+
+        old_path = day_path + '.old'
+        os.replace(day_path, old_path)
+        os.replace(temp_path, day_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logging.info(f'Compacted price history for {day}: {len(order)} -> {int(last_in_group.sum())} rows')
+
+_store = None
+_store_lock = threading.Lock()
+
+# process-wide store under PRICE_HISTORY_DIR
+def get_price_history():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceHistoryStore(PRICE_HISTORY_DIR)
+        return _store
+
+# append a refresh's markets and compact anything that aged out of the raw window
+def record_prices(markets):
+    try:
+        store = get_price_history()
+        store.append(markets)
+        store.compact()
+    except Exception as e:
+        logging.error(f'Error recording price history: {e}', exc_info=True)
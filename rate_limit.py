@@ -0,0 +1,126 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+import urllib3
+
+from config import RATE_LIMITS, MAX_RETRY_BACKOFF
+from metrics import timed, count
+
+# per-venue request budget shared by every thread that calls a venue's API.
+#
+# Each venue has a token bucket refilled at its RATE_LIMITS rate. A call takes a token before every
+# attempt; when the bucket is empty the caller reserves the next token and sleeps until it is due,
+# so concurrent callers are served in order and the venue never sees more than the burst at once.
+# Failed attempts that are worth repeating (429, 5xx, connection errors) are retried with
+# exponential backoff and full jitter, and never sooner than a Retry-After header asks.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    # take one token, waiting for it if needed. Returns the seconds waited.
+    def acquire(self):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+class VenueLimiter:
+    def __init__(self, venue, rate, burst):
+        self.venue = venue
+        self.bucket = TokenBucket(rate, burst)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'throttled_seconds': 0.0, 'waiting': 0}
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def acquire(self):
+        self._count('waiting')
+        try:
+            waited = self.bucket.acquire()
+        finally:
+            self._count('waiting', -1)
+        self._count('requests')
+        self._count('throttled_seconds', waited)
+        count('venue_throttled_seconds', waited, venue=self.venue)
+
+    # call fn(*args, **kwargs) within the venue's budget, retrying retryable failures
+    def call(self, fn, *args, retries=0, backoff=0.5, **kwargs):
+        for attempt in range(retries + 1):
+            self.acquire()
+            try:
+                with timed('venue_request', venue=self.venue):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    self._count('failures')
+                    count('venue_failures', venue=self.venue)
+                    raise
+                delay = max(random.uniform(0, min(MAX_RETRY_BACKOFF, backoff * 2 ** attempt)), retry_after(e))
+                logging.warning(f'{self.venue} request failed ({e}), retrying in {delay:.2f}s')
+                self._count('retries')
+                count('venue_retries', venue=self.venue)
+                time.sleep(delay)
+
+def _status(error):
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        return response.status_code
+    return getattr(error, 'status', None)
+
+def is_retryable(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, urllib3.exceptions.HTTPError)):
+        return True
+    return _status(error) in RETRY_STATUSES
+
+# seconds a Retry-After header on the failed response asks for, 0 if none
+def retry_after(error):
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+    try:
+        return min(float(headers.get('Retry-After', 0)), MAX_RETRY_BACKOFF)
+    except (TypeError, ValueError):
+        return 0.0
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(venue):
+    with _limiters_lock:
+        if venue not in _limiters:
+            rate, burst = RATE_LIMITS[venue]
+            _limiters[venue] = VenueLimiter(venue, rate, burst)
+        return _limiters[venue]
+
+# replace a venue's budget, e.g. for benchmarks against a local stub
+def configure_limiter(venue, rate, burst):
+    with _limiters_lock:
+        _limiters[venue] = VenueLimiter(venue, rate, burst)
+        return _limiters[venue]
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    stats = {}
+    for limiter in limiters:
+        with limiter.lock:
+            stats[limiter.venue] = dict(limiter.stats)
+    return stats
@@ -0,0 +1,173 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL, REFRESH_HOT_VOLUME_24H, REFRESH_HOT_INTERVAL
+from config import REFRESHES_BEFORE_CLOSE, REFRESH_SIGNIFICANT_SHARE, REFRESH_BUDGET_SHARE, RATE_LIMITS
+from config import REFRESH_BUDGET_INTERVAL, REFRESH_BUDGET_BURST
+from rate_limit import limiter_stats
+from utils import parse_close_time
+
+# per-venue market refresh schedule, replacing the fixed hourly refresh.
+#
+# Every venue is a job in a queue ordered by due time. After a venue refreshes, its next refresh is
+# planned from the markets it returned, taken as a whole: a venue with REFRESH_SIGNIFICANT_SHARE of
+# its markets trading at least REFRESH_HOT_VOLUME_24H comes back within REFRESH_HOT_INTERVAL, one
+# where that share of its markets closes soon comes back REFRESHES_BEFORE_CLOSE times before they
+# close, and a venue with neither waits REFRESH_MAX_INTERVAL. A single hot or closing market among
+# thousands doesn't move the schedule. The interval never goes below REFRESH_MIN_INTERVAL, nor below
+# what keeps the venue's request rate (requests the refresh took / interval) under
+# REFRESH_BUDGET_SHARE of its rate limit. A failed refresh is retried with exponential backoff from
+# REFRESH_MIN_INTERVAL.
+#
+# On top of that every venue has a refresh budget: a token bucket refilled with one refresh per
+# REFRESH_BUDGET_INTERVAL (the old hourly refresh) holding up to REFRESH_BUDGET_BURST. Every refresh,
+# failed or not, spends one, and a refresh waits until one is available, so over any long window a
+# venue costs no more requests than the hourly refresh did; busy periods spend what quiet ones saved.
+#
+# The venue APIs are paged listings with no cheap way to fetch a chosen subset of markets, so the
+# unit of refresh is a venue, scheduled by its hottest markets.
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+# seconds until a venue that returned these markets should be refreshed again
+def refresh_interval(markets, requests_used=0, rate=None, now=None):
+    now = now or datetime.now(timezone.utc)
+    interval = REFRESH_MAX_INTERVAL
+    significant = max(1, math.ceil(REFRESH_SIGNIFICANT_SHARE * len(markets)))
+    hot = 0
+    closes_in = []
+    for market in markets:
+        if _float(market.get('volume_24h')) >= REFRESH_HOT_VOLUME_24H:
+            hot += 1
+        close_time = parse_close_time(market.get('close_time'))
+        if close_time is not None and close_time > now:
+            closes_in.append((close_time - now).total_seconds())
+    if markets and hot >= significant:
+        interval = min(interval, REFRESH_HOT_INTERVAL)
+    if len(closes_in) >= significant:
+        # the time until a significant share of the venue's markets has closed
+        interval = min(interval, heapq.nsmallest(significant, closes_in)[-1] / REFRESHES_BEFORE_CLOSE)
+    budget_floor = requests_used / (rate * REFRESH_BUDGET_SHARE) if rate else 0
+    return max(interval, REFRESH_MIN_INTERVAL, budget_floor)
+
+class RefreshScheduler:
+    # refresh_fn(sources) refreshes those sources and returns ({source: markets}, {source: status})
+    def __init__(self, refresh_fn, sources, initial_delay=REFRESH_MIN_INTERVAL, clock=time.time):
+        self.refresh_fn = refresh_fn
+        self.clock = clock
+        now = clock()
+        self.queue = [(now + initial_delay, source) for source in sources]
+        heapq.heapify(self.queue)
+        self.state = {source: {
+            'interval': None,
+            'due_at': now + initial_delay,
+            'last_refresh_at': None,
+            'last_latency': None,  # seconds the last refresh took
+            'last_lag': None,  # seconds the last refresh started after it was due
+            'refreshes': 0,
+            'failures': 0,
+            'budget': REFRESH_BUDGET_BURST,  # refreshes available, see _spend_budget
+            'budget_at': now
+        } for source in sources}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    # jobs that are due but not started
+    def queue_depth(self, now=None):
+        now = self.clock() if now is None else now
+        with self.lock:
+            return sum(1 for due_at, _ in self.queue if due_at <= now)
+
+    def next_due(self):
+        with self.lock:
+            return self.queue[0][0] if self.queue else None
+
+    # spend one refresh of a venue's budget at now; returns the earliest time the next one is available
+    def _spend_budget(self, state, now):
+        refilled = state['budget'] + (now - state['budget_at']) / REFRESH_BUDGET_INTERVAL
+        state['budget'] = min(REFRESH_BUDGET_BURST, refilled) - 1
+        state['budget_at'] = now
+        return now + max(0.0, 1 - state['budget']) * REFRESH_BUDGET_INTERVAL
+
+    # refresh every due venue (together, in one refresh_fn call) and reschedule them.
+    # Returns the venues refreshed.
+    def run_pending(self):
+        now = self.clock()
+        due = []
+        with self.lock:
+            while self.queue and self.queue[0][0] <= now:
+                due.append(heapq.heappop(self.queue))
+        if not due:
+            return []
+
+        sources = [source for _, source in due]
+        requests_before = limiter_stats()
+        start = self.clock()
+        try:
+            markets_by_source, statuses = self.refresh_fn(sources)
+        except Exception as e:
+            logging.error(f'Error refreshing {sources}: {e}', exc_info=True)
+            markets_by_source, statuses = {}, {}
+        finished = self.clock()
+        requests_after = limiter_stats()
+
+        with self.lock:
+            for due_at, source in due:
+                state = self.state[source]
+                state['last_lag'] = start - due_at
+                state['last_latency'] = finished - start
+                if statuses.get(source, {}).get('status') == 'ok':
+                    requests_used = (requests_after.get(source, {}).get('requests', 0)
+                                     - requests_before.get(source, {}).get('requests', 0))
+                    state['interval'] = refresh_interval(
+                        markets_by_source.get(source, []), requests_used, RATE_LIMITS.get(source, (None,))[0])
+                    state['last_refresh_at'] = finished
+                    state['refreshes'] += 1
+                    state['failures'] = 0
+                else:
+                    state['failures'] += 1
+                    state['interval'] = min(REFRESH_MAX_INTERVAL, REFRESH_MIN_INTERVAL * 2 ** (state['failures'] - 1))
+                state['due_at'] = max(finished + state['interval'], self._spend_budget(state, start))
+                heapq.heappush(self.queue, (state['due_at'], source))
+
+        logging.info(f"Refreshed {sources} in {finished - start:.1f}s, next in "
+                     f"{ {source: round(self.state[source]['due_at'] - finished) for source in sources} }s")
+        return sources
+
+    def _run(self):
+        while not self.stopped:
+            next_due = self.next_due()
+            wait = None if next_due is None else next_due - self.clock()
+            if wait is None or wait > 0:
+                self.wakeup.wait(wait)
+                self.wakeup.clear()
+                continue
+            self.run_pending()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def metrics(self):
+        now = self.clock()
+        with self.lock:
+            sources = {source: {
+                **state,
+                'due_in': state['due_at'] - now,
+                'staleness': None if state['last_refresh_at'] is None else now - state['last_refresh_at']
+            } for source, state in self.state.items()}
+        return {'queue_depth': self.queue_depth(now), 'sources': sources, 'rate_limits': limiter_stats()}
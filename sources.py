@@ -0,0 +1,52 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from config import SOURCE_FETCH_WORKERS, SOURCE_TIMEOUTS, DEFAULT_SOURCE_TIMEOUT
+from metrics import observe
+
+# runs each market source's fetch function on a shared thread pool so a refresh takes about as long
+# as the slowest source rather than the sum of all of them. A source that misses its timeout is
+# reported as such and left running; whatever it does when it finishes (e.g. its upsert) still happens.
+
+_executor = ThreadPoolExecutor(max_workers=SOURCE_FETCH_WORKERS, thread_name_prefix='source-fetch')
+
+def _timed(source, fetch):
+    start = time.perf_counter()
+    markets = fetch()
+    seconds = time.perf_counter() - start
+    observe('source_refresh', seconds, source=source)
+    return markets, seconds
+
+def _log_late_result(source, future):
+    try:
+        markets, seconds = future.result()
+        logging.info(f'{source} finished after its timeout: {len(markets)} markets in {seconds:.1f}s')
+    except Exception as e:
+        logging.error(f'{source} failed after its timeout: {e}', exc_info=True)
+
+# fetchers maps source name -> zero-argument callable returning a list of markets.
+# Returns ({source: markets} for sources that finished in time, {source: status dict} for every source).
+def fetch_sources(fetchers, timeouts=SOURCE_TIMEOUTS, default_timeout=DEFAULT_SOURCE_TIMEOUT):
+    start = time.perf_counter()
+    futures = {source: _executor.submit(_timed, source, fetch) for source, fetch in fetchers.items()}
+
+    markets_by_source = {}
+    statuses = {}
+    for source, future in futures.items():
+        timeout = timeouts.get(source, default_timeout)
+        remaining = start + timeout - time.perf_counter()
+        try:
+            markets, seconds = future.result(timeout=max(remaining, 0))
+            markets_by_source[source] = markets
+            statuses[source] = {'status': 'ok', 'markets': len(markets), 'seconds': round(seconds, 3)}
+        except FutureTimeoutError:
+            logging.error(f'Timed out fetching {source} after {timeout}s, returning partial results')
+            statuses[source] = {'status': 'timeout', 'seconds': timeout}
+            future.add_done_callback(lambda future, source=source: _log_late_result(source, future))
+        except Exception as e:
+            logging.error(f'Error fetching {source}: {e}', exc_info=True)
+            statuses[source] = {'status': 'error', 'error': str(e)}
+
+    logging.info(f'Fetched sources in {time.perf_counter() - start:.1f}s: {statuses}')
+    return markets_by_source, statuses
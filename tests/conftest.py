@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+# the supabase client (database.py) is created on first use. Real credentials from .env win;
+# otherwise offline tests get placeholders and swap the client for benchmarks.fakes.FakeSupabase.
+load_dotenv()
+os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.offline-tests')
+
+# the test process is the leader of its own lock, even while a local server holds the default one
+_leader_dir = tempfile.mkdtemp(prefix='leader-')
+os.environ.setdefault('LEADER_LOCK_PATH', os.path.join(_leader_dir, 'leader.lock'))
+os.environ.setdefault('SHARED_SNAPSHOT_PATH', os.path.join(_leader_dir, 'market_snapshot.bin'))
@@ -0,0 +1,59 @@
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def clustered_vectors(rng, num_vectors, dim=32, num_topics=40):
+    topics = rng.standard_normal((num_topics, dim))
+    return topics[rng.integers(num_topics, size=num_vectors)] + 0.3 * rng.standard_normal((num_vectors, dim))
+
+
+def test_ivf_recall_against_exact_search():
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, 3000)
+    ids = [f'm{i}' for i in range(len(vectors))]
+    index = IVFIndex(min_train_size=500)
+    index.add(ids, vectors)
+    assert index.centroids is not None
+
+    queries = vectors[:200] + 0.05 * rng.standard_normal((200, vectors.shape[1]))
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = np.argmax(queries @ normalized.T, axis=1)
+    found = [hits[0][0] for hits in index.search(queries, k=1)]
+    recall = np.mean([found_id == ids[i] for found_id, i in zip(found, exact)])
+    assert recall >= 0.9
+
+
+def test_incremental_add_remove_and_persistence(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = clustered_vectors(rng, 1200)
+    index = IVFIndex(min_train_size=1000)
+    index.add([str(i) for i in range(1000)], vectors[:1000], [f'k{i}' for i in range(1000)])
+    index.add([str(i) for i in range(1000, 1200)], vectors[1000:])
+    index.remove(['5', '1100'])
+
+    assert len(index) == 1198 and '5' not in index
+    assert index.search(vectors[1150:1151], k=1)[0][0][0] == '1150'
+    assert all(hit[0] != '5' for hit in index.search(vectors[5:6], k=10, nprobe=1000)[0])
+
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == 1198 and loaded.text_key('7') == 'k7'
+    assert loaded.search(vectors[1150:1151], k=1)[0][0][0] == '1150'
+
+
+def test_saved_ids_and_keys_load_without_pickle(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((3, 8))
+    index = IVFIndex()
+    index.add(['K-1', '2'], vectors[:2], ['hash-1', 'hash-2'])
+    index.add(['3'], vectors[2:])
+
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    with np.load(path) as saved:
+        assert saved['ids'].dtype.kind == 'U' and saved['text_keys'].dtype.kind == 'U'
+    loaded = IVFIndex.load(path)
+    assert sorted(loaded.ids()) == ['2', '3', 'K-1']
+    assert loaded.text_key('K-1') == 'hash-1' and loaded.text_key('3') is None
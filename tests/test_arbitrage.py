@@ -0,0 +1,61 @@
+import pytest
+
+from arbitrage import SpreadEngine
+from market import Market
+
+
+def pair(ticker, polymarket_id, kalshi_yes, kalshi_no, polymarket_yes, polymarket_no, volume=1000):
+    return {
+        'title': ticker, 'kalshi_ticker': ticker, 'polymarket_id': polymarket_id,
+        'polymarket_title': f'poly {ticker}',
+        'kalshi_yes_price': kalshi_yes, 'kalshi_no_price': kalshi_no,
+        'polymarket_yes_price': polymarket_yes, 'polymarket_no_price': polymarket_no,
+        'kalshi_volume': volume, 'polymarket_volume': volume
+    }
+
+
+def test_edges_directions_and_ranking():
+    engine = SpreadEngine()
+    engine.load_pairs([
+        pair('FAIR', 1, 0.50, 0.50, 0.50, 0.50),
+        pair('CHEAP_K_YES', 2, 0.40, 0.60, 0.55, 0.45),
+        pair('CHEAP_P_YES', 3, 0.70, 0.25, 0.60, 0.40, volume=10 ** 6),
+        pair('MISSING', 4, None, None, 0.5, 0.5)
+    ])
+
+    best = engine.opportunities(min_edge=0.01)
+    assert [row['kalshi_ticker'] for row in best] == ['CHEAP_P_YES', 'CHEAP_K_YES']
+    assert best[0]['direction'] == 'polymarket_yes_kalshi_no'
+    assert best[0]['edge'] == pytest.approx(0.15)
+    assert best[1]['direction'] == 'kalshi_yes_polymarket_no'
+    assert best[1]['edge'] == pytest.approx(0.15)
+    assert best[1]['yes_spread'] == pytest.approx(-0.15)
+    assert 'MISSING' not in [row['kalshi_ticker'] for row in engine.opportunities(min_edge=-1)]
+    assert engine.opportunities(min_edge=float('-inf'))[-1]['edge'] is None
+
+
+def test_refresh_updates_only_matching_pairs():
+    engine = SpreadEngine()
+    engine.load_pairs([pair('A', 1, 0.5, 0.5, 0.5, 0.5), pair('B', 2, 0.5, 0.5, 0.5, 0.5)])
+
+    engine.update_prices([
+        Market('kalshi', 'A', ticker='A', yes_price=0.30, no_price=0.70, volume=5),
+        Market('polymarket', 'poly B', id='2', yes_price=0.45, no_price=0.55, volume=5),
+        Market('kalshi', 'UNPAIRED', ticker='UNPAIRED', yes_price=0.1, no_price=0.9, volume=5)
+    ])
+
+    edges = {row['kalshi_ticker']: row['edge'] for row in engine.opportunities()}
+    assert edges['A'] == pytest.approx(0.2)
+    assert edges['B'] == pytest.approx(0.05)
+
+
+def test_markets_sharing_a_title_update_only_their_own_pair():
+    engine = SpreadEngine()
+    engine.load_pairs([pair('A', 1, 0.5, 0.5, 0.5, 0.5), pair('B', 2, 0.5, 0.5, 0.5, 0.5)])
+
+    engine.update_prices([Market('polymarket', 'Fed cuts rates in March?', id='1', yes_price=0.40, no_price=0.60, volume=5),
+                          Market('polymarket', 'Fed cuts rates in March?', id='7', yes_price=0.10, no_price=0.90, volume=5)])
+
+    edges = {row['kalshi_ticker']: row['edge'] for row in engine.opportunities(min_edge=-1)}
+    assert edges['A'] == pytest.approx(0.1)
+    assert edges['B'] == pytest.approx(0.0)
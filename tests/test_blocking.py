@@ -0,0 +1,64 @@
+import numpy as np
+
+from blocking import title_tokens, candidate_pairs, candidate_recall
+from market import Market
+
+
+def market(source, title, close_time):
+    return Market(source, title, close_time=close_time)
+
+
+def test_title_tokens_keep_names_and_numbers():
+    assert title_tokens('Will Bitcoin be above $100,000 by the end of 2025?') == {'bitcoin', '100000', '2025'}
+
+
+def test_only_pairs_sharing_a_token_and_close_date_are_candidates():
+    kalshi = [
+        market('kalshi', 'Fed cuts rates in March', '2030-03-20T18:00:00Z'),
+        market('kalshi', 'Fed cuts rates in June', '2030-06-18T18:00:00Z'),
+        market('kalshi', 'Snow in Denver', None),
+    ]
+    polymarket = [
+        market('polymarket', 'Will the Fed cut rates in March?', '2030-03-21T00:00:00Z'),
+        market('polymarket', 'Denver snowfall: snow this week?', '2030-01-05T00:00:00Z'),
+        market('polymarket', 'Oil above 90', '2030-03-20T00:00:00Z'),
+        market('polymarket', 'Fed rates decision June', None),
+    ]
+
+    kalshi_positions, polymarket_positions = candidate_pairs(kalshi, polymarket, undated_max_size=0)
+
+    # the June kalshi market closes months after the March polymarket one, and oil shares no token
+    assert list(zip(kalshi_positions.tolist(), polymarket_positions.tolist())) == [(0, 0), (0, 3), (1, 3), (2, 1)]
+
+
+def test_rare_tokens_match_whatever_the_close_dates():
+    kalshi = [
+        market('kalshi', 'Powell out as Fed chair', '2030-03-01T00:00:00Z'),
+        market('kalshi', 'Fed cuts rates', '2030-03-01T00:00:00Z'),
+        market('kalshi', 'Fed hikes rates', '2030-05-01T00:00:00Z'),
+    ]
+    polymarket = [
+        market('polymarket', 'Will Powell leave the Fed?', '2030-03-25T00:00:00Z'),
+        market('polymarket', 'Fed pause?', '2030-03-25T00:00:00Z'),
+        market('polymarket', 'Fed decision', '2030-05-01T00:00:00Z'),
+    ]
+
+    kalshi_positions, polymarket_positions = candidate_pairs(kalshi, polymarket, undated_max_size=1)
+
+    # 'powell' is rare, so the Powell markets pair up three weeks apart; 'fed' is on every market,
+    # so it only pairs markets closing within the window
+    assert list(zip(kalshi_positions.tolist(), polymarket_positions.tolist())) == [(0, 0), (2, 2)]
+
+
+def test_oversized_blocks_are_skipped():
+    kalshi = [market('kalshi', f'common item{index}', '2030-01-01T00:00:00Z') for index in range(5)]
+    polymarket = [market('polymarket', 'common', '2030-01-01T00:00:00Z'), market('polymarket', 'item3', '2030-01-01T00:00:00Z')]
+
+    kalshi_positions, polymarket_positions = candidate_pairs(kalshi, polymarket, max_block_size=4)
+
+    assert list(zip(kalshi_positions.tolist(), polymarket_positions.tolist())) == [(3, 1)]
+
+
+def test_candidate_recall():
+    assert candidate_recall(np.array([0, 1]), np.array([0, 2]), [(0, 0, 0.9), (1, 1, 0.85)]) == 0.5
+    assert candidate_recall(np.array([]), np.array([]), []) == 1.0
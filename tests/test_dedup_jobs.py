@@ -0,0 +1,126 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import app as market_app
+import dedup_jobs
+import utils
+from dedup_jobs import DedupJobs
+from benchmarks.fakes import FakeSupabase
+
+
+@pytest.fixture
+def blocked_jobs(monkeypatch, tmp_path):
+    release = threading.Event()
+    runs = []
+
+    def run_dedup_job(job_id, full, job_dir):
+        runs.append('full' if full else 'incremental')
+        release.wait(5)
+        return {'unpaired_markets': 0}
+
+    monkeypatch.setattr(dedup_jobs, 'run_dedup_job', run_dedup_job)
+    finished = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        jobs = DedupJobs(str(tmp_path), finished.append, executor, poll_seconds=0.05)
+        jobs.start()
+        yield jobs, release, runs, finished
+        release.set()
+        jobs.shutdown()
+
+
+def test_triggers_coalesce_onto_the_job_in_flight(blocked_jobs):
+    jobs, release, runs, finished = blocked_jobs
+
+    running = jobs.submit()
+    assert jobs.submit()['id'] == running['id']
+    queued = jobs.submit(full=True)
+    assert queued['id'] != running['id'] and queued['status'] == 'queued'
+    assert jobs.submit(full=True)['id'] == queued['id']
+    assert jobs.submit()['id'] == running['id']
+
+    release.set()
+    assert jobs.wait(queued['id'], timeout=5)['status'] == 'done'
+    assert jobs.status(running['id'])['triggers'] == 3
+    assert jobs.status(queued['id'])['triggers'] == 2
+    assert runs == ['incremental', 'full']
+    assert [job['id'] for job in finished] == [running['id'], queued['id']]
+
+
+def test_any_worker_submits_and_reports_on_the_leaders_jobs(blocked_jobs, tmp_path):
+    leader, release, runs, finished = blocked_jobs
+    follower = DedupJobs(str(tmp_path), poll_seconds=0.05)
+
+    running = follower.submit()
+    # the leader picks the follower's job up from the queue on disk
+    assert leader.wait(running['id'], timeout=0.5)['status'] == 'running'
+    assert leader.submit()['id'] == running['id']
+    queued = leader.submit(full=True)
+    assert follower.submit(full=True)['id'] == queued['id']
+
+    release.set()
+    assert follower.wait(queued['id'], timeout=5)['status'] == 'done'
+    assert follower.status(running['id'])['triggers'] == 2
+    assert runs == ['incremental', 'full']
+    assert [job['id'] for job in finished] == [running['id'], queued['id']]
+
+
+def test_job_left_running_by_an_exited_leader_is_failed(monkeypatch, tmp_path):
+    exited = DedupJobs(str(tmp_path))
+    job = exited.submit()
+    with exited._queue() as queue:
+        queue.update(running=job['id'], queued=None)  # its leader died after starting it
+    exited._save_job(dict(job, status='running'))
+
+    monkeypatch.setattr(dedup_jobs, 'run_dedup_job', lambda job_id, full, job_dir: {'unpaired_markets': 0})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = DedupJobs(str(tmp_path), executor=executor, poll_seconds=0.05)
+        leader.start()
+        try:
+            assert leader.status(job['id'])['status'] == 'failed'
+            assert leader.wait(leader.submit()['id'], timeout=5)['status'] == 'done'
+        finally:
+            leader.shutdown()
+
+
+def test_job_reports_progress_and_writes_unpaired_markets(monkeypatch, tmp_path):
+    client = FakeSupabase({
+        'kalshi_markets': [{'ticker': 'K-1', 'title': 'Rain in Paris', 'description': '', 'close_time': '2030-01-01T00:00:00Z'}],
+        'polymarket_markets': [{'id': 1, 'title': 'Rain in Paris', 'description': '', 'close_time': '2030-01-01T00:00:00Z'},
+                               {'id': 2, 'title': 'Snow in Oslo', 'description': '', 'close_time': '2030-01-01T00:00:00Z'}],
+        'duplicate_markets': []
+    })
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, 'encode_markets', lambda markets: np.array(
+        [[1.0, 0.0] if market.title.startswith('Rain') else [0.0, 1.0] for market in markets], dtype=np.float32))
+
+    assert dedup_jobs.run_dedup_job('job', True, str(tmp_path)) == {'unpaired_markets': 1}
+
+    assert client.tables['duplicate_markets'] == [{'kalshi_market_id': 'K-1', 'polymarket_market_id': '1'}]
+    with open(dedup_jobs.results_path(str(tmp_path), 'job')) as f:
+        assert [json.loads(line)['id'] for line in f] == ['2']
+    with open(dedup_jobs.progress_path(str(tmp_path), 'job')) as f:
+        assert json.load(f)['stage'] == 'writing results'
+
+
+def test_endpoint_returns_job_id_at_once(monkeypatch, blocked_jobs):
+    jobs, release, _, _ = blocked_jobs
+    monkeypatch.setattr(market_app, 'dedup_jobs', jobs)
+    client = market_app.app.test_client()
+
+    response = client.post('/api/deduplicate_markets')
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert client.get(f'/api/dedup_jobs/{job_id}').get_json()['status'] == 'running'
+    assert client.get(f'/api/dedup_jobs/{job_id}', query_string={'results': 'true'}).status_code == 409
+    assert client.get('/api/dedup_jobs/unknown').status_code == 404
+
+    with open(jobs.results_path(job_id), 'w') as f:
+        f.write('{"id": "2"}\n')
+    release.set()
+    jobs.wait(job_id, timeout=5)
+    results = client.get(f'/api/dedup_jobs/{job_id}', query_string={'results': 'true'})
+    assert results.mimetype == 'application/x-ndjson' and results.data == b'{"id": "2"}\n'
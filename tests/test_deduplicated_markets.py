@@ -0,0 +1,86 @@
+import utils
+from market import Market
+from benchmarks.fakes import FakeSupabase
+
+
+def market(source, key):
+    return {
+        'ticker' if source == 'kalshi' else 'id': key,
+        'title': f'{source} {key}', 'description': '',
+        'yes_price': 0.4, 'no_price': 0.6, 'volume': 10, 'volume_24h': 1,
+        'close_time': '2030-01-01T00:00:00Z'
+    }
+
+
+def test_pairs_are_joined_with_bulk_queries(monkeypatch):
+    num_pairs = 450
+    client = FakeSupabase({
+        'kalshi_markets': [market('kalshi', f'K-{i}') for i in range(num_pairs)],
+        'polymarket_markets': [market('polymarket', i) for i in range(num_pairs)],
+        'duplicate_markets': [{'kalshi_market_id': f'K-{i}', 'polymarket_market_id': str(i)} for i in range(num_pairs)]
+        + [{'kalshi_market_id': 'K-missing', 'polymarket_market_id': '0'}]
+    })
+    monkeypatch.setattr(utils, 'supabase', client)
+
+    rows = utils.get_deduplicated_market_rows()
+
+    assert len(rows) == num_pairs
+    by_ticker = {row['kalshi_ticker']: row for row in rows}
+    assert by_ticker['K-7']['polymarket_id'] == 7
+    # 1 pair query + ceil(451 / 200) kalshi + ceil(450 / 200) polymarket lookups
+    assert client.query_count == 1 + 3 + 3
+
+
+def test_deduplicated_endpoint_pages_through_pairs(monkeypatch):
+    import app as market_app
+
+    client = FakeSupabase({
+        'kalshi_markets': [market('kalshi', f'K-{i}') for i in range(30)],
+        'polymarket_markets': [market('polymarket', i) for i in range(30)],
+        'duplicate_markets': [{'kalshi_market_id': f'K-{i}', 'polymarket_market_id': str(i)} for i in range(30)]
+    })
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, 'DEDUP_PAGE_SIZE', 4)
+    test_client = market_app.app.test_client()
+
+    tickers, cursor = [], None
+    while True:
+        body = test_client.get('/api/deduplicated_markets', query_string={
+            'limit': 9, **({'cursor': cursor} if cursor else {})}).get_json()
+        tickers.extend(row['kalshi_ticker'] for row in body['markets'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert sorted(tickers) == sorted(f'K-{i}' for i in range(30)) and len(tickers) == 30
+
+
+def test_pairs_are_stored_with_chunked_upserts(monkeypatch):
+    client = FakeSupabase({'duplicate_markets': [{'kalshi_market_id': 'K-0', 'polymarket_market_id': '0'}]})
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, 'UPSERT_CHUNK_SIZE', 500)
+
+    utils.record_duplicate_pairs([
+        (Market('kalshi', 'k', ticker=f'K-{i}'), Market('polymarket', 'p', id=str(i)), 0.9) for i in range(1200)
+    ])
+
+    # no per-pair lookups: ceil(1200 / 500) upserts, and the already stored pair is not duplicated
+    assert client.query_count == 3
+    assert len(client.tables['duplicate_markets']) == 1200
+
+
+def test_deduplicated_source_filter_matches_either_side(monkeypatch):
+    import app as market_app
+
+    client = FakeSupabase({
+        'kalshi_markets': [market('kalshi', f'K-{i}') for i in range(5)],
+        'polymarket_markets': [market('polymarket', i) for i in range(5)],
+        'duplicate_markets': [{'kalshi_market_id': f'K-{i}', 'polymarket_market_id': str(i)} for i in range(5)]
+    })
+    monkeypatch.setattr(utils, 'supabase', client)
+    test_client = market_app.app.test_client()
+
+    for source in ('kalshi', 'polymarket', 'kalshi,polymarket'):
+        body = test_client.get('/api/deduplicated_markets', query_string={'source': source}).get_json()
+        assert len(body['markets']) == 5
+    assert test_client.get('/api/deduplicated_markets', query_string={'source': 'manifold'}).get_json()['markets'] == []
@@ -0,0 +1,44 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def fake_encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), ord(text[0]), 1.0] for text in texts], dtype=np.float32)
+    return encode
+
+
+def test_only_misses_are_encoded_and_cache_persists(tmp_path):
+    calls = []
+    cache = EmbeddingCache(str(tmp_path), 'test-model')
+    first = cache.encode(['alpha', 'beta', 'alpha'], fake_encoder(calls))
+    assert calls == [['alpha', 'beta']]
+    assert np.array_equal(first[0], first[2])
+
+    reopened = EmbeddingCache(str(tmp_path), 'test-model')
+    second = reopened.encode(['beta', 'gamma'], fake_encoder(calls))
+    assert calls[-1] == ['gamma']
+    assert np.array_equal(second[0], first[1])
+
+
+def test_cache_grows_and_recycles_pruned_rows(tmp_path):
+    calls = []
+    cache = EmbeddingCache(str(tmp_path), 'test-model')
+    texts = [f'market {i}' for i in range(3000)]
+    vectors = cache.encode(texts, fake_encoder(calls))
+    assert cache.capacity >= 3000
+    assert np.array_equal(vectors[2999], [len('market 2999'), ord('m'), 1.0])
+
+    assert cache.prune(-1) == 3000
+    capacity = cache.capacity
+    cache.encode(['fresh'], fake_encoder(calls))
+    assert cache.capacity == capacity and len(cache) == 1
+
+
+def test_model_change_starts_fresh(tmp_path):
+    calls = []
+    EmbeddingCache(str(tmp_path), 'old-model').encode(['alpha'], fake_encoder(calls))
+    EmbeddingCache(str(tmp_path), 'new-model').encode(['alpha'], fake_encoder(calls))
+    assert calls == [['alpha'], ['alpha']]
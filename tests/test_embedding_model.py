@@ -0,0 +1,34 @@
+import threading
+import time
+
+import numpy as np
+
+import embedding_model
+
+
+class FakeModel:
+    def encode(self, texts, batch_size=32):
+        return np.ones((len(texts), 3), dtype=np.float32)
+
+
+def test_model_loads_once_across_threads(monkeypatch):
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        time.sleep(0.05)
+        return FakeModel()
+
+    monkeypatch.setattr(embedding_model, '_model', None)
+    monkeypatch.setattr(embedding_model, '_load_model', slow_load)
+
+    threads = [threading.Thread(target=embedding_model.encode, args=(['a', 'b'],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == [1]
+    stats = embedding_model.get_model_stats()
+    assert stats['load_seconds'] >= 0.05
+    assert stats['sentences_encoded'] >= 16
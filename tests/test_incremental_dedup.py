@@ -0,0 +1,60 @@
+import numpy as np
+
+import ann_index
+import utils
+from benchmarks.fakes import FakeSupabase
+
+
+# each topic gets its own axis, so markets on the same topic are exact duplicates
+TOPICS = ['rates', 'election', 'oil', 'snow', 'btc']
+
+
+def fake_encode(markets):
+    vectors = np.zeros((len(markets), len(TOPICS)), dtype=np.float32)
+    for row, market in enumerate(markets):
+        vectors[row, TOPICS.index(market['title'].split()[0])] = 1
+    return vectors
+
+
+def market(source, key, topic, updated, close_time='2030-01-01T00:00:00Z'):
+    return {
+        'ticker' if source == 'kalshi' else 'id': key,
+        'title': f'{topic} market', 'description': '',
+        'close_time': close_time, 'last_updated': updated
+    }
+
+
+def test_only_updated_markets_are_rematched(monkeypatch, tmp_path):
+    client = FakeSupabase({
+        'kalshi_markets': [market('kalshi', 'K-rates', 'rates', '2026-01-01'),
+                           market('kalshi', 'K-oil', 'oil', '2026-01-01')],
+        'polymarket_markets': [market('polymarket', '1', 'rates', '2026-01-01'),
+                               market('polymarket', '2', 'election', '2026-01-01')],
+        'duplicate_markets': []
+    })
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, 'encode_markets', fake_encode)
+    monkeypatch.setattr(utils, 'DEDUP_STATE_PATH', str(tmp_path / 'state.json'))
+    monkeypatch.setattr(ann_index, 'ANN_INDEX_DIR', str(tmp_path / 'ann'))
+    monkeypatch.setattr(ann_index, '_indexes', {})
+
+    def pairs():
+        return sorted((row['kalshi_market_id'], row['polymarket_market_id']) for row in client.tables['duplicate_markets'])
+
+    utils.run_incremental_deduplication()
+    assert pairs() == [('K-rates', '1')]
+
+    # a second run with nothing new stores nothing again
+    encoded = []
+    monkeypatch.setattr(utils, 'encode_markets', lambda markets: encoded.extend(markets) or fake_encode(markets))
+    utils.run_incremental_deduplication()
+    assert pairs() == [('K-rates', '1')]
+    assert encoded == []
+
+    # a new oil market pairs with the indexed kalshi one; the rates kalshi market closes
+    client.tables['polymarket_markets'].append(market('polymarket', '3', 'oil', '2026-01-02'))
+    client.tables['kalshi_markets'][0].update(close_time='2020-01-01T00:00:00Z', last_updated='2026-01-02')
+    client.indexes = {}
+    utils.run_incremental_deduplication()
+    assert pairs() == [('K-oil', '3')]
+    assert [item.get('id') for item in encoded] == ['3']
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import ingest
+import utils
+from market import Market
+from benchmarks.fakes import FakeSupabase
+
+
+def page(start, size=3):
+    return [Market('polymarket', f'Market {index}', id=str(index), yes_price=0.5) for index in range(start, start + size)]
+
+
+def test_pages_are_written_as_they_arrive(monkeypatch):
+    client = FakeSupabase({'polymarket_markets': []})
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, '_written_fingerprints', {})
+
+    markets, stats = ingest.ingest_pages(iter([page(0), page(3), page(6, size=1)]), 'polymarket_markets', 'polymarket')
+
+    assert [market.id for market in markets] == [str(index) for index in range(7)]
+    assert sorted(row['id'] for row in client.tables['polymarket_markets']) == sorted(str(index) for index in range(7))
+    assert (stats['pages'], stats['markets'], stats['written'], stats['failed']) == (3, 7, 7, 0)
+
+
+def test_a_slow_writer_holds_back_fetching(monkeypatch):
+    release = threading.Event()
+    written = []
+
+    def slow_upsert(markets, table_name):
+        release.wait(5)
+        written.append(len(markets))
+        return {'written': len(markets)}
+
+    produced = []
+
+    def pages():
+        for index in range(20):
+            produced.append(index)
+            yield page(index * 3)
+
+    monkeypatch.setattr(ingest, 'upsert_markets', slow_upsert)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(stats=ingest.ingest_pages(pages(), 'kalshi_markets', 'kalshi', max_pages=2)[1]))
+    thread.start()
+    try:
+        thread.join(0.3)
+        # the pages in the writer, two queued and one waiting to be queued, and no more
+        in_flight = len(produced)
+        assert in_flight <= 6
+        thread.join(0.2)
+        assert thread.is_alive() and len(produced) == in_flight
+    finally:
+        release.set()
+        thread.join(5)
+    assert len(produced) == 20 and sum(written) == 60 and result['stats']['written'] == 60
+
+
+def test_pages_before_a_fetch_error_are_still_written(monkeypatch):
+    written = []
+    monkeypatch.setattr(ingest, 'upsert_markets', lambda markets, table_name: written.extend(markets) or {})
+
+    def pages():
+        yield page(0)
+        raise ConnectionError('venue down')
+
+    with pytest.raises(ConnectionError):
+        ingest.ingest_pages(pages(), 'kalshi_markets', 'kalshi')
+    assert len(written) == 3
+
+
+def test_a_dead_writer_fails_the_refresh_instead_of_hanging(monkeypatch):
+    def broken_observe(name, seconds, **labels):
+        if name == 'ingest_write':
+            raise ValueError('metrics backend gone')
+
+    monkeypatch.setattr(ingest, 'upsert_markets', lambda markets, table_name: {'written': len(markets)})
+    monkeypatch.setattr(ingest, 'observe', broken_observe)
+    monkeypatch.setattr(ingest, 'INGEST_WRITER_CHECK_SECONDS', 0.05)
+
+    result = {}
+
+    def run():
+        try:
+            ingest.ingest_pages((page(index * 3) for index in range(20)), 'kalshi_markets', 'kalshi', max_pages=1)
+        except RuntimeError as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert isinstance(result['error'].__cause__, ValueError)
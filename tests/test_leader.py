@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+import app as market_app
+from leader import LeaderLock
+from market import Market
+from market_cache import Snapshot, SharedSnapshot, MappedSnapshot
+
+
+def make_snapshot(rows):
+    body = json.dumps(rows).encode()
+    return Snapshot(markets=rows, body=body, etag=hashlib.sha1(body).hexdigest(), created_at=time.time(),
+                    source_status={'kalshi': {'status': 'ok'}})
+
+
+def test_only_one_lock_holder_until_release(tmp_path):
+    path = str(tmp_path / 'leader.lock')
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire() and first.is_leader
+    assert not second.try_acquire() and not second.is_leader
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_follower_takes_over_when_the_leader_releases(tmp_path):
+    path = str(tmp_path / 'leader.lock')
+    leader, follower = LeaderLock(path), LeaderLock(path)
+    assert leader.watch(lambda: None) is None
+
+    elected, follower_ticks = [], []
+    thread = follower.watch(lambda: elected.append(1), on_follower=lambda: follower_ticks.append(1), interval=0.01)
+    time.sleep(0.05)
+    assert not elected and follower_ticks
+
+    leader.release()
+    thread.join(timeout=5)
+    assert elected == [1] and follower.is_leader
+    follower.release()
+
+
+def test_shared_snapshot_round_trip_and_republish(tmp_path):
+    shared = SharedSnapshot(str(tmp_path / 'snapshot.bin'))
+    assert shared.get() is None
+
+    published = make_snapshot([{'title': 'Will it rain?', 'source': 'kalshi'}])
+    shared.publish(published, pairs_loaded_at=12.5)
+    mapped = shared.get()
+    assert isinstance(mapped, MappedSnapshot)
+    assert bytes(mapped.body) == published.body and mapped.etag == published.etag
+    assert mapped.markets == [{'title': 'Will it rain?', 'source': 'kalshi'}]
+    assert mapped.header['pairs_loaded_at'] == 12.5
+    assert shared.get() is mapped
+
+    with mapped.open_body() as body:
+        assert body.read() == published.body
+
+    republished = make_snapshot([{'title': 'Will it snow?', 'source': 'polymarket'}])
+    shared.publish(republished)
+    assert shared.get().etag == republished.etag
+    # the old mapping stays readable for requests still serving it
+    assert bytes(mapped.body) == published.body
+    with mapped.open_body() as body:
+        assert body.read() == published.body
+
+
+def test_follower_serves_the_leaders_snapshot(tmp_path, monkeypatch):
+    lock_path = str(tmp_path / 'leader.lock')
+    leader = LeaderLock(lock_path)
+    assert leader.try_acquire()
+    shared = SharedSnapshot(str(tmp_path / 'snapshot.bin'), load_markets=lambda rows: [Market.from_row(row) for row in rows])
+    monkeypatch.setattr(market_app, 'leader_lock', LeaderLock(lock_path))
+    monkeypatch.setattr(market_app, 'shared_snapshot', shared)
+    monkeypatch.setattr(market_app, 'followed_snapshot', None)
+
+    rows = [{'source': 'kalshi', 'ticker': 'RAIN', 'title': 'Will it rain?', 'yes_price': 0.4}]
+    published = make_snapshot(rows)
+    shared.publish(published)
+
+    client = market_app.app.test_client()
+    response = client.get('/api/markets')
+    assert response.status_code == 200
+    assert response.data == published.body
+    assert response.headers['ETag'] == f'"{published.etag}"'
+    assert client.get('/api/markets', headers={'If-None-Match': published.etag}).status_code == 304
+    assert market_app.followed_snapshot.markets[0].ticker == 'RAIN'
+    leader.release()
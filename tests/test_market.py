@@ -0,0 +1,49 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from market import Market, MarketBatch
+
+
+def test_venue_payloads_normalize_to_the_same_record():
+    kalshi = Market.from_kalshi(SimpleNamespace(
+        ticker='RAIN-30', title='Rain?', yes_ask=40, no_ask=62, volume=10, volume_24h=1,
+        close_time='2030-01-01T00:00:00Z'))
+    election = Market.from_kalshi_election(
+        {'underlying': 'Who ', 'description_context': 'wins'},
+        {'id': 'e1', 'ticker_name': 'PRES', 'title': 'President?', 'yes_ask': 0.55, 'volume': 5,
+         'close_date': '2030-01-01T00:00:00Z'})
+    polymarket = Market.from_polymarket({
+        'id': 123, 'question': 'Rain?', 'description': 'd', 'outcomePrices': json.dumps(['0.4', '0.6']),
+        'volume': '100', 'events': [{'endDate': '2030-01-01T00:00:00Z'}]})
+
+    assert (kalshi.key, kalshi.yes_price, kalshi.no_price) == ('RAIN-30', 0.4, 0.62)
+    assert (election.key, election.description) == ('PRES', 'Who wins') and election.no_price == pytest.approx(0.45)
+    assert (polymarket.key, polymarket.yes_price, polymarket.volume_24h) == ('123', 0.4, 0)
+    assert not hasattr(polymarket, '__dict__')
+
+
+def test_rows_round_trip_and_dict_access():
+    market = Market('polymarket', 'Rain?', id='7', yes_price=0.4, close_time='2030-01-01T00:00:00Z')
+    row = market.to_row()
+    assert row['id'] == '7' and 'ticker' not in row
+
+    restored = Market.from_row({**row, 'last_updated': '2026-01-01'}, 'polymarket')
+    assert restored.to_row() == row
+    assert restored['title'] == 'Rain?' and restored.get('ticker') is None and restored.get('volume', 0) == 0
+    with pytest.raises(KeyError):
+        restored['ticker']
+
+
+def test_batch_columns_are_the_batch_arrays():
+    markets = [Market('kalshi', f'm{i}', ticker=f'K-{i}', yes_price=i / 10, volume='12',
+                      close_time='1970-01-01T00:01:00Z' if i else None) for i in range(3)]
+    batch = MarketBatch.from_markets(markets)
+
+    columns = batch.columns()
+    assert columns['yes_price'] is batch.yes_price
+    np.testing.assert_allclose(batch.yes_price, [0, 0.1, 0.2])
+    assert np.isnan(batch.close_time[0]) and batch.close_time[1] == 60
+    assert batch.keys == ['K-0', 'K-1', 'K-2'] and batch.texts()[0] == 'm0 '
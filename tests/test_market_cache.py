@@ -0,0 +1,48 @@
+import json
+import threading
+import time
+
+from market_cache import SnapshotCache
+
+
+def counting_refresh(delay=0.1):
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        time.sleep(delay)
+        return [{'title': f'market {len(calls)}'}], {'kalshi': {'status': 'ok'}}
+    return refresh, calls
+
+
+def serialize(markets):
+    return json.dumps(markets).encode()
+
+
+def test_cold_start_is_single_flight():
+    refresh, calls = counting_refresh()
+    cache = SnapshotCache(refresh, serialize, ttl=60)
+    snapshots = []
+    threads = [threading.Thread(target=lambda: snapshots.append(cache.get())) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert {snapshot.etag for snapshot in snapshots} == {snapshots[0].etag}
+
+
+def test_stale_snapshot_is_served_while_one_refresh_runs():
+    refresh, calls = counting_refresh(delay=0.3)
+    cache = SnapshotCache(refresh, serialize, ttl=0)
+    first = cache.get()
+
+    start = time.perf_counter()
+    stale = [cache.get() for _ in range(50)]
+    assert time.perf_counter() - start < 0.1
+    assert all(snapshot.body == first.body for snapshot in stale)
+
+    time.sleep(0.5)
+    assert len(calls) == 2
+    assert json.loads(cache.get().body) == [{'title': 'market 2'}]
@@ -5,13 +5,13 @@ from database import supabase
 
 def run_deduplication():
     # Make a request to the endpoint
-    response = requests.post('http://localhost:3000/api/deduplicate_markets')
+    response = requests.post('http://localhost:3000/api/deduplicate_markets', params={'wait': 'true'})
     
     # Check the response
-    if response.status_code == 200:
+    if response.status_code == 200 and response.json()['status'] == 'done':
         data = response.json()
         print("Deduplication successful")
-        print(f"Deduplicated markets: {len(data['deduplicated_markets'])}")
+        print(f"Deduplicated markets: {data['unpaired_markets']}")
         
         # Log the number of markets before deduplication
         total_markets = sum(len(supabase.table(table).select('*').execute().data) for table in SOURCE_TABLES.values())
@@ -0,0 +1,92 @@
+import json
+import threading
+
+from market import Market
+from market_feed import MarketFeed
+
+
+def market(key, yes, volume=100):
+    return Market('kalshi', f'Market {key}', ticker=key, yes_price=yes, no_price=1 - yes, volume=volume)
+
+
+def parse(event):
+    lines = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+
+def test_snapshot_then_only_changed_markets():
+    feed = MarketFeed()
+    feed.publish([market('A', 0.5), market('B', 0.2)])
+    subscriber = feed.subscribe()
+
+    name, data = parse(feed.next_event(subscriber, timeout=0))
+    assert name == 'snapshot' and set(data['markets']) == {'kalshi:A', 'kalshi:B'}
+
+    assert feed.publish([market('A', 0.5), market('B', 0.25)]) == 1
+    name, data = parse(feed.next_event(subscriber, timeout=0))
+    assert name == 'delta' and data['markets'] == {'kalshi:B': [0.25, 0.75, 100.0]}
+    assert feed.next_event(subscriber, timeout=0) is None
+
+
+def test_waiting_subscriber_is_woken_by_publish():
+    feed = MarketFeed()
+    subscriber = feed.subscribe()
+    feed.next_event(subscriber, timeout=0)  # empty snapshot
+
+    threading.Timer(0.05, feed.publish, [[market('A', 0.5)]]).start()
+    name, _ = parse(feed.next_event(subscriber, timeout=5))
+    assert name == 'delta'
+
+
+def test_slow_subscriber_is_resynced_with_one_snapshot():
+    feed = MarketFeed(queue_size=3)
+    fast, slow = feed.subscribe(), feed.subscribe()
+    feed.next_event(fast, timeout=0)
+    feed.next_event(slow, timeout=0)
+
+    for price in range(10):
+        feed.publish([market('A', price / 10)])
+        feed.next_event(fast, timeout=0)
+
+    assert slow.resyncs > 0 and len(slow.queue) <= 3
+    name, data = parse(feed.next_event(slow, timeout=0))
+    assert name == 'snapshot' and data['markets']['kalshi:A'][0] == 0.9
+    assert fast.resyncs == 0
+
+
+def test_stream_unsubscribes_when_closed():
+    feed = MarketFeed()
+    subscriber = feed.subscribe()
+    stream = feed.stream(subscriber, heartbeat=0)
+    assert next(stream).startswith('id: 0\nevent: snapshot')
+    assert next(stream) == ': keepalive\n\n'
+    stream.close()
+    assert not feed.subscribers
+
+
+def test_markets_missing_from_their_source_are_dropped():
+    feed = MarketFeed()
+    feed.publish([market('A', 0.5), market('B', 0.2), Market('polymarket', 'P', id='7', yes_price=0.3)])
+    subscriber = feed.subscribe()
+    feed.next_event(subscriber, timeout=0)
+
+    # a kalshi-only refresh without B: B is dropped, the polymarket market is untouched
+    assert feed.publish([market('A', 0.5)]) == 1
+    name, data = parse(feed.next_event(subscriber, timeout=0))
+    assert name == 'delta' and data['markets'] == {'kalshi:B': None}
+    assert set(feed.prices) == {'kalshi:A', 'polymarket:7'}
+
+
+def test_concurrent_publishes_emit_each_change_once():
+    feed = MarketFeed()
+    feed.publish([market(str(index), 0.5) for index in range(2000)])
+    refreshed = [market(str(index), 0.6) for index in range(2000)]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(feed.publish(refreshed))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [0] * 7 + [2000]
+    assert feed.seq == 2
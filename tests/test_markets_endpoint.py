@@ -0,0 +1,77 @@
+import pytest
+
+import app as market_app
+from market import Market
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(market_app.market_snapshot, 'refresh_fn',
+                        lambda: ([{'title': 'Will it rain?', 'source': 'kalshi'}], {'kalshi': {'status': 'ok'}}))
+    monkeypatch.setattr(market_app.market_snapshot, '_snapshot', None)
+    return market_app.app.test_client()
+
+
+def test_markets_served_with_etag_and_304(client):
+    response = client.get('/api/markets')
+    assert response.status_code == 200
+    assert response.get_json() == [{'title': 'Will it rain?', 'source': 'kalshi'}]
+    assert 'kalshi' in response.headers['X-Source-Status']
+
+    etag = response.headers['ETag']
+    cached = client.get('/api/markets', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+
+@pytest.fixture
+def many_markets_client(monkeypatch):
+    markets = [Market.from_row({
+        'source': 'kalshi' if index % 2 else 'polymarket',
+        'ticker' if index % 2 else 'id': f'M{index:03d}',
+        'title': f'Election market {index}' if index % 3 == 0 else f'Weather market {index}',
+        'volume': index * 10,
+        'close_time': f'2030-01-{index % 28 + 1:02d}T00:00:00Z'
+    }) for index in range(100)]
+    monkeypatch.setattr(market_app.market_snapshot, 'refresh_fn', lambda: (markets, {}))
+    monkeypatch.setattr(market_app.market_snapshot, '_snapshot', None)
+    return market_app.app.test_client(), markets
+
+
+def test_cursor_pagination_walks_every_filtered_market(many_markets_client):
+    client, markets = many_markets_client
+    expected = {m.get('ticker') or m.get('id') for m in markets if m['source'] == 'kalshi' and m['volume'] >= 200}
+
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/markets', query_string={
+            'source': 'kalshi', 'min_volume': 200, 'limit': 7, **({'cursor': cursor} if cursor else {})})
+        body = response.get_json()
+        assert len(body['markets']) <= 7
+        seen.extend(market['ticker'] for market in body['markets'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) and set(seen) == expected
+
+
+def test_ndjson_stream_with_title_and_close_filters(many_markets_client):
+    client, markets = many_markets_client
+    response = client.get('/api/markets', query_string={
+        'format': 'ndjson', 'q': 'election', 'close_before': '2030-01-10T00:00:00Z'})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [line for line in response.data.decode().split('\n') if line]
+    expected = [m for m in markets if m['title'].startswith('Election') and m['close_time'] <= '2030-01-10T00:00:00Z']
+    assert len(lines) == len(expected)
+
+
+def test_bad_filter_is_a_400(many_markets_client):
+    client, _ = many_markets_client
+    assert client.get('/api/markets?min_volume=lots').status_code == 400
+
+
+def test_stream_starts_with_a_snapshot(client):
+    response = client.get('/api/markets/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert b'event: snapshot' in next(response.response)
+    response.close()
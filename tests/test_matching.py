@@ -0,0 +1,53 @@
+import numpy as np
+
+from matching import normalize_embeddings, top_k_matches, candidate_matches, select_one_to_one
+
+
+def brute_force_matches(kalshi, polymarket, threshold, top_k):
+    scores = kalshi @ polymarket.T
+    expected = set()
+    for kalshi_index, row in enumerate(scores):
+        for polymarket_index in np.argsort(-row)[:top_k]:
+            if row[polymarket_index] > threshold:
+                expected.add((kalshi_index, int(polymarket_index)))
+    return expected
+
+
+def test_blocked_matches_equal_brute_force():
+    rng = np.random.default_rng(1)
+    kalshi = normalize_embeddings(rng.standard_normal((150, 16)))
+    polymarket = kalshi[rng.permutation(150)[:90]] + 0.2 * rng.standard_normal((90, 16))
+    polymarket = normalize_embeddings(np.vstack([polymarket, rng.standard_normal((70, 16))]))
+
+    matches = top_k_matches(kalshi, polymarket, threshold=0.5, top_k=3, block_size=32, polymarket_block_size=25)
+
+    assert {(k, p) for k, p, _ in matches} == brute_force_matches(kalshi, polymarket, 0.5, 3)
+    scores = [score for _, _, score in matches]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_select_one_to_one_uses_each_market_once():
+    matches = [(0, 0, 0.99), (1, 0, 0.95), (0, 1, 0.9), (1, 1, 0.85)]
+    assert select_one_to_one(matches) == [(0, 0, 0.99), (1, 1, 0.85)]
+
+
+def test_empty_inputs():
+    assert top_k_matches(np.zeros((0, 4)), np.ones((3, 4))) == []
+    assert top_k_matches(np.ones((3, 4)), np.zeros((0, 4))) == []
+
+
+def test_candidate_matches_equal_blocked_matches_over_every_pair():
+    rng = np.random.default_rng(2)
+    kalshi = normalize_embeddings(rng.standard_normal((40, 8)))
+    polymarket = normalize_embeddings(np.vstack([kalshi[:20] + 0.3 * rng.standard_normal((20, 8)),
+                                                 rng.standard_normal((30, 8))]))
+    kalshi_positions, polymarket_positions = np.divmod(np.arange(40 * 50), 50)
+
+    matches = candidate_matches(kalshi, polymarket, kalshi_positions, polymarket_positions,
+                                threshold=0.5, top_k=2, chunk_size=64)
+
+    expected = top_k_matches(kalshi, polymarket, threshold=0.5, top_k=2)
+    assert {(k, p) for k, p, _ in matches} == {(k, p) for k, p, _ in expected}
+    scores = [score for _, _, score in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert candidate_matches(kalshi, polymarket, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)) == []
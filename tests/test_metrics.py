@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+import app as market_app
+import metrics
+from metrics import Registry, SamplingProfiler
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry(buckets=(0.01, 0.1, 1))
+    registry.observe('db_query', 0.005, (('table', 'kalshi_markets'), ))
+    registry.observe('db_query', 0.5, (('table', 'kalshi_markets'), ))
+    registry.count('venue_retries', 2, (('venue', 'kalshi'), ))
+    registry.gauge('refresh_queue_depth', lambda: 3)
+    registry.gauge('broken', lambda: 1 / 0)
+
+    text = registry.render()
+    assert 'db_query_seconds_bucket{table="kalshi_markets",le="0.01"} 1' in text
+    assert 'db_query_seconds_bucket{table="kalshi_markets",le="0.1"} 1' in text
+    assert 'db_query_seconds_bucket{table="kalshi_markets",le="+Inf"} 2' in text
+    assert 'db_query_seconds_count{table="kalshi_markets"} 2' in text
+    assert 'venue_retries_total{venue="kalshi"} 2' in text
+    assert 'refresh_queue_depth 3' in text
+    assert 'broken' not in text
+
+
+def test_disabled_metrics_are_a_no_op(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+
+    with metrics.timed('embedding_encode'):
+        pass
+    assert metrics.timed('similarity')(len) is len
+    metrics.count('venue_retries', venue='kalshi')
+    assert registry.histograms == {} and registry.counters == {}
+
+
+def test_metrics_endpoint_reports_request_latency(monkeypatch):
+    monkeypatch.setattr(market_app, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(market_app.market_snapshot, 'refresh_fn', lambda: ([], {}))
+    monkeypatch.setattr(market_app.market_snapshot, '_snapshot', None)
+    client = market_app.app.test_client()
+
+    assert client.get('/api/markets').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'http_request_seconds_count{endpoint="/api/markets",method="GET",status="200"}' in text
+    assert 'market_snapshot_age_seconds' in text
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_profiler_collapses_sampled_stacks():
+    profiler = SamplingProfiler(interval=0.001).start()
+    spin(0.05)
+    profiler.stop()
+
+    assert profiler.samples > 0
+    top_stack, samples = profiler.collapsed().splitlines()[0].rsplit(' ', 1)
+    assert 'spin (test_metrics.py' in top_stack.split(';')[-1]
+    assert int(samples) > 0
@@ -0,0 +1,67 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+from polymarketUtils import fetch_polymarket_markets
+
+
+@pytest.fixture
+def gamma_stub():
+    markets = [{
+        'id': str(index),
+        'question': f'Market {index}?',
+        'description': '',
+        'outcomePrices': json.dumps(['0.4', '0.6']),
+        'volume': '1000',
+        'events': [{'endDate': '2030-01-01T00:00:00Z'}]
+    } for index in range(250)]
+    failures = {'remaining': 1}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            offset, limit = int(query['offset'][0]), int(query['limit'][0])
+            if offset == 100 and failures['remaining']:
+                failures['remaining'] -= 1
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = json.dumps(markets[offset:offset + limit]).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/markets'
+    server.shutdown()
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_pages_are_ordered_retried_and_stop_at_short_page(gamma_stub, max_workers):
+    markets = fetch_polymarket_markets(
+        None, limit=100, total_markets=1000, volume_num_min=0, max_workers=max_workers, url=gamma_stub)
+    assert [market['title'] for market in markets] == [f'Market {index}?' for index in range(250)]
+
+
+def test_total_markets_caps_result(gamma_stub):
+    markets = fetch_polymarket_markets(
+        None, limit=100, total_markets=150, volume_num_min=0, max_workers=4, url=gamma_stub)
+    assert len(markets) == 150
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_page_failing_after_retries_fails_the_fetch(gamma_stub, max_workers, monkeypatch):
+    import polymarketUtils
+    monkeypatch.setattr(polymarketUtils, 'POLYMARKET_FETCH_RETRIES', 0)
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetch_polymarket_markets(None, limit=100, total_markets=1000, volume_num_min=0, max_workers=max_workers, url=gamma_stub)
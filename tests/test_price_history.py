@@ -0,0 +1,59 @@
+from market import Market
+from price_history import PriceHistoryStore
+
+DAY = 86400
+START = 1_800_000_000  # a fixed UTC time so day boundaries are deterministic
+
+
+def markets_at(step):
+    return [
+        Market('kalshi', 'Will it rain?', ticker='RAIN', yes_price=0.1 + step / 1000, no_price=0.9, volume=step),
+        Market('polymarket', 'Will it snow?', id='42', yes_price=0.5, no_price=0.5, volume='n/a')
+    ]
+
+
+def test_append_and_read_range(tmp_path):
+    store = PriceHistoryStore(str(tmp_path))
+    for step in range(10):
+        store.append(markets_at(step), timestamp=START + step * 600)
+
+    history = store.history('kalshi:RAIN', START + 1200, START + 3000)
+    assert history['time'] == [START + 1200, START + 1800, START + 2400, START + 3000]
+    assert history['volume'] == [2, 3, 4, 5]
+    assert store.history('polymarket:42', START, START + DAY)['volume'][0] is None
+    assert store.history('kalshi:UNKNOWN', START, START + DAY) is None
+
+    reopened = PriceHistoryStore(str(tmp_path))
+    assert len(reopened.history('kalshi:RAIN', START, START + DAY)['time']) == 10
+
+
+def test_followers_see_markets_the_leader_added(tmp_path):
+    leader = PriceHistoryStore(str(tmp_path))
+    leader.append(markets_at(0)[:1], timestamp=START)
+    follower = PriceHistoryStore(str(tmp_path))
+
+    leader.append(markets_at(1), timestamp=START + 600)
+    assert follower.history('polymarket:42', START, START + DAY)['time'] == [START + 600]
+
+    # a follower taking over numbers new markets after the ones the old leader added
+    follower.append(markets_at(2) + [Market('polymarket', 'Will it hail?', id='43')], timestamp=START + 1200)
+    assert sorted(follower.market_numbers.values()) == [0, 1, 2]
+    assert leader.history('polymarket:43', START, START + DAY)['time'] == [START + 1200]
+
+
+def test_old_days_are_downsampled_and_still_readable(tmp_path):
+    store = PriceHistoryStore(str(tmp_path))
+    # three days of 10 minute refreshes
+    for step in range(3 * 144):
+        store.append(markets_at(step), timestamp=START + step * 600)
+
+    store.compact(raw_days=1, bucket_seconds=3600, now=START + 3 * DAY)
+
+    history = store.history('kalshi:RAIN', START, START + 3 * DAY)
+    times = history['time']
+    assert times == sorted(times)
+    # the compacted days keep one row per hour, the most recent day keeps every refresh
+    assert len(times) < 3 * 144
+    assert history['volume'][-1] == 3 * 144 - 1
+    compacted_hour = [t for t in times if START <= t < START + 3600]
+    assert compacted_hour == [START + 3000]
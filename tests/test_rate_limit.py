@@ -0,0 +1,61 @@
+import pytest
+import requests
+
+import rate_limit
+from rate_limit import TokenBucket, VenueLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_allows_burst_then_paces_to_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        assert bucket.acquire() == 0
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+def test_retryable_failures_are_retried_with_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', sleeps.append)
+    attempts = iter([http_error(503), http_error(429, {'Retry-After': '2'}), 'ok'])
+
+    def flaky():
+        result = next(attempts)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    limiter = VenueLimiter('test', rate=1000, burst=1000)
+    assert limiter.call(flaky, retries=3, backoff=0.5) == 'ok'
+    assert 0 <= sleeps[0] <= 0.5 and sleeps[1] >= 2
+    assert limiter.stats['requests'] == 3 and limiter.stats['retries'] == 2
+
+
+def test_other_failures_are_not_retried():
+    limiter = VenueLimiter('test', rate=1000, burst=1000)
+
+    def not_found():
+        raise http_error(404)
+
+    with pytest.raises(requests.HTTPError):
+        limiter.call(not_found, retries=3)
+    assert limiter.stats['requests'] == 1 and limiter.stats['failures'] == 1
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import refresh_scheduler
+from refresh_scheduler import RefreshScheduler, refresh_interval
+
+
+NOW = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+def test_hot_and_closing_markets_shorten_the_interval():
+    cold = [{'volume_24h': 10, 'close_time': (NOW + timedelta(days=30)).isoformat()}]
+    hot = cold + [{'volume_24h': refresh_scheduler.REFRESH_HOT_VOLUME_24H}]
+    closing = cold + [{'close_time': (NOW + timedelta(minutes=40)).isoformat()}]
+
+    assert refresh_interval(cold, now=NOW) == refresh_scheduler.REFRESH_MAX_INTERVAL
+    assert refresh_interval(hot, now=NOW) == refresh_scheduler.REFRESH_HOT_INTERVAL
+    assert refresh_interval(closing, now=NOW) == 40 * 60 / refresh_scheduler.REFRESHES_BEFORE_CLOSE
+    # a refresh that used many requests is spaced out to stay within the venue's budget
+    assert refresh_interval(hot, requests_used=1000, rate=1, now=NOW) == 1000 / refresh_scheduler.REFRESH_BUDGET_SHARE
+
+
+def test_due_sources_are_refreshed_and_rescheduled():
+    clock = [1000.0]
+    calls = []
+
+    def refresh(sources):
+        calls.append(sources)
+        clock[0] += 5
+        hot = [{'volume_24h': refresh_scheduler.REFRESH_HOT_VOLUME_24H}]
+        return ({'kalshi': hot, 'polymarket': []},
+                {'kalshi': {'status': 'ok'}, 'polymarket': {'status': 'error'}})
+
+    scheduler = RefreshScheduler(refresh, ['kalshi', 'polymarket'], initial_delay=0, clock=lambda: clock[0])
+    assert scheduler.queue_depth() == 2
+    assert scheduler.run_pending() == ['kalshi', 'polymarket']
+    assert calls == [['kalshi', 'polymarket']]
+
+    metrics = scheduler.metrics()
+    assert metrics['queue_depth'] == 0
+    assert metrics['sources']['kalshi']['last_latency'] == 5
+    assert metrics['sources']['kalshi']['interval'] == refresh_scheduler.REFRESH_HOT_INTERVAL
+    # the failed source is retried soon
+    assert metrics['sources']['polymarket']['interval'] == refresh_scheduler.REFRESH_MIN_INTERVAL
+    assert scheduler.run_pending() == []
+
+
+def mixed_venue(num_markets=5000, hot=40, closing=30):
+    # a realistic listing: a few hot markets, a few closing within the hour, most closing in weeks
+    markets = [{'volume_24h': 500, 'close_time': (NOW + timedelta(days=7 + index % 60)).isoformat()}
+               for index in range(num_markets)]
+    for index in range(hot):
+        markets[index]['volume_24h'] = refresh_scheduler.REFRESH_HOT_VOLUME_24H * 3
+    for index in range(hot, hot + closing):
+        markets[index]['close_time'] = (NOW + timedelta(minutes=10 + index // 10)).isoformat()
+    return markets
+
+
+def test_a_few_hot_or_closing_markets_dont_set_the_venue_interval():
+    assert refresh_interval(mixed_venue(), now=NOW) == refresh_scheduler.REFRESH_MAX_INTERVAL
+
+    # a significant share of hot markets does
+    assert refresh_interval(mixed_venue(hot=500), now=NOW) == refresh_scheduler.REFRESH_HOT_INTERVAL
+    # as does a significant share closing soon: refreshed a few times before the 250th closes
+    closing = refresh_interval(mixed_venue(hot=0, closing=400), now=NOW)
+    assert closing == (10 + 249 // 10) * 60 / refresh_scheduler.REFRESHES_BEFORE_CLOSE
+
+
+def test_busy_venue_stays_within_the_hourly_budget():
+    clock = [0.0]
+
+    def refresh(sources):
+        clock[0] += 5
+        return {'kalshi': mixed_venue(hot=1000)}, {'kalshi': {'status': 'ok'}}
+
+    scheduler = RefreshScheduler(refresh, ['kalshi'], initial_delay=0, clock=lambda: clock[0])
+    day = 24 * 60 * 60
+    refreshes = 0
+    while clock[0] < day:
+        clock[0] = max(clock[0], scheduler.next_due())
+        refreshes += len(scheduler.run_pending())
+
+    # hot the whole day, yet no more refreshes than the hourly schedule plus the banked burst
+    assert refreshes <= day / refresh_scheduler.REFRESH_BUDGET_INTERVAL + refresh_scheduler.REFRESH_BUDGET_BURST + 1
+    assert scheduler.metrics()['sources']['kalshi']['interval'] == refresh_scheduler.REFRESH_HOT_INTERVAL
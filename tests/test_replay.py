@@ -0,0 +1,10 @@
+from benchmarks.replay import run_replay
+
+
+def test_small_universe_replays_offline():
+    results = run_replay(300, requests=2, refreshes=2)
+
+    assert results['universe']['markets'] == 300
+    assert results['dedup_full']['recall'] == 1.0
+    for stage in ('refresh_markets', 'get_markets', 'dedup_full', 'get_deduplicated_markets'):
+        assert results[stage]['p95_ms'] > 0 and results[stage]['peak_rss_mb'] > 0
@@ -0,0 +1,37 @@
+import threading
+import time
+
+from sources import fetch_sources
+
+
+def test_sources_run_concurrently_and_report_status():
+    release = threading.Event()
+    late_results = []
+
+    def slow():
+        release.wait(2)
+        late_results.append('slow')
+        return ['late']
+
+    def broken():
+        raise RuntimeError('venue down')
+
+    start = time.perf_counter()
+    markets, status = fetch_sources({
+        'fast': lambda: (time.sleep(0.2), ['a', 'b'])[1],
+        'also_fast': lambda: (time.sleep(0.2), ['c'])[1],
+        'slow': slow,
+        'broken': broken
+    }, timeouts={'slow': 0.4}, default_timeout=5)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1
+    assert markets == {'fast': ['a', 'b'], 'also_fast': ['c']}
+    assert status['fast']['status'] == 'ok' and status['fast']['markets'] == 2
+    assert status['slow']['status'] == 'timeout'
+    assert status['broken'] == {'status': 'error', 'error': 'venue down'}
+
+    # the timed-out source keeps running in the background
+    release.set()
+    time.sleep(0.1)
+    assert late_results == ['slow']
@@ -0,0 +1,79 @@
+import pytest
+
+import ingest
+import utils
+from market import Market
+from benchmarks.fakes import FakeSupabase
+
+
+def markets(count, yes_price=0.5, title='Market'):
+    return [Market('polymarket', f'{title} {index}', id=str(index), yes_price=yes_price) for index in range(count)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeSupabase({'polymarket_markets': []})
+    monkeypatch.setattr(utils, 'supabase', client)
+    monkeypatch.setattr(utils, '_written_fingerprints', {})
+    monkeypatch.setattr(utils, 'UPSERT_CHUNK_SIZE', 3)
+    return client
+
+
+def test_unchanged_rows_are_skipped_and_text_edits_rewritten(client):
+    assert utils.upsert_markets(markets(5), 'polymarket_markets')['written'] == 5
+    assert utils.upsert_markets(markets(5), 'polymarket_markets') == {'written': 0, 'skipped': 5, 'failed': 0, 'bytes': 0}
+
+    edited = markets(5)
+    edited[2].title = 'Market 2 (resolution criteria updated)'
+    edited[4].description = 'now settles on the official count'
+    stats = utils.upsert_markets(edited, 'polymarket_markets')
+    assert (stats['written'], stats['skipped']) == (2, 3)
+    stored = {row['id']: row for row in client.tables['polymarket_markets']}
+    assert stored['2']['title'] == 'Market 2 (resolution criteria updated)'
+
+
+def test_changed_rows_are_written_in_chunks(client):
+    utils.upsert_markets(markets(7), 'polymarket_markets')
+    # ceil(7 / 3) upserts
+    assert client.query_count == 3
+
+    client.query_count = 0
+    utils.upsert_markets(markets(3) + markets(7, yes_price=0.6)[3:], 'polymarket_markets')
+    # only the 4 changed rows, in ceil(4 / 3) upserts
+    assert client.query_count == 2
+
+
+def test_failed_chunk_is_retried_on_the_next_write(client, monkeypatch):
+    upsert_chunk = utils._upsert_chunk
+
+    def failing_chunk(table_name, chunk):
+        if any(market.id == '4' for market in chunk):
+            raise ConnectionError('upstream timeout')
+        return upsert_chunk(table_name, chunk)
+
+    monkeypatch.setattr(utils, '_upsert_chunk', failing_chunk)
+    stats = utils.upsert_markets(markets(7), 'polymarket_markets')
+    assert (stats['written'], stats['failed']) == (4, 3)
+
+    monkeypatch.setattr(utils, '_upsert_chunk', upsert_chunk)
+    stats = utils.upsert_markets(markets(7), 'polymarket_markets')
+    # the chunk holding markets 3-5 kept no fingerprints, so exactly it is written again
+    assert (stats['written'], stats['skipped']) == (3, 4)
+    assert len(client.tables['polymarket_markets']) == 7
+
+
+def test_complete_refresh_forgets_delisted_markets(client):
+    ingest.ingest_pages(iter([markets(4)]), 'polymarket_markets', 'polymarket')
+    assert set(utils._written_fingerprints['polymarket_markets']) == {'0', '1', '2', '3'}
+
+    ingest.ingest_pages(iter([markets(4)[:2]]), 'polymarket_markets', 'polymarket')
+    assert set(utils._written_fingerprints['polymarket_markets']) == {'0', '1'}
+
+    def failing_pages():
+        yield markets(1)
+        raise ConnectionError('page 2 failed')
+
+    with pytest.raises(ConnectionError):
+        ingest.ingest_pages(failing_pages(), 'polymarket_markets', 'polymarket')
+    # an incomplete refresh says nothing about the markets it didn't reach
+    assert set(utils._written_fingerprints['polymarket_markets']) == {'0', '1'}
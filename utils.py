@@ -1,18 +1,27 @@
 import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from database import supabase, create_client
+from database import supabase
 from config import SOURCES, SOURCE_TABLES
+from config import DUPLICATE_SIMILARITY_THRESHOLD, MATCH_TOP_K, MATCH_BLOCK_SIZE, MATCH_POLYMARKET_BLOCK_SIZE
+from config import DEDUP_BLOCKING
+from config import EMBEDDING_CACHE_MAX_IDLE_SECONDS, MARKET_KEYS
+from config import UPSERT_CHUNK_SIZE, UPSERT_WORKERS, IN_QUERY_CHUNK_SIZE, DEDUP_PAGE_SIZE, DEDUP_STATE_PATH
+from matching import normalize_embeddings, top_k_matches, candidate_matches, select_one_to_one
+from blocking import candidate_pairs
+from embedding_cache import get_embedding_cache, text_key
+from ann_index import get_market_index, save_market_index, market_index_lock
+import embedding_model
+from market import Market, parse_close_time
+from metrics import timed
 
 import logging
 
 # database util functions
 
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
-supabase = create_client(supabase_url, supabase_key)
-
 # get the schema of a table in supabase
 def get_table_schema(table_name):
     query = f"""
@@ -23,12 +32,35 @@ def get_table_schema(table_name):
     response = supabase.rpc('execute_sql', {'sql': query}).execute()
     return response.data
 
-# create a record in the duplicate market table with the kalshi and polymarket market ids
-def insert_duplicate_market(kalshi_market_id, polymarket_market_id):
-    supabase.table('duplicate_markets').insert({
-        'kalshi_market_id': str(kalshi_market_id),
-        'polymarket_market_id': str(polymarket_market_id)
-    }).execute()
+# run a supabase query builder, timed as a db_query on table_name
+def execute(query, table_name, operation):
+    with timed('db_query', table=table_name, operation=operation):
+        return query.execute()
+
+# store (kalshi market id, polymarket market id) pairs in the duplicate market table, UPSERT_CHUNK_SIZE
+# rows per request. Upserting on the id pair (unique in duplicate_markets) makes storing a known pair
+# again a no-op.
+def insert_duplicate_markets(pairs):
+    rows = list({
+        (str(kalshi_market_id), str(polymarket_market_id)): {
+            'kalshi_market_id': str(kalshi_market_id),
+            'polymarket_market_id': str(polymarket_market_id)
+        }
+        for kalshi_market_id, polymarket_market_id in pairs
+    }.values())
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        execute(supabase.table('duplicate_markets').upsert(
+            rows[start:start + UPSERT_CHUNK_SIZE], on_conflict='kalshi_market_id,polymarket_market_id'
+        ), 'duplicate_markets', 'upsert')
+
+# delete stored pairs involving any of the given markets (closed, or re-matched after a text change)
+def retire_duplicate_pairs(kalshi_market_ids=(), polymarket_market_ids=()):
+    for column, ids in (('kalshi_market_id', list(kalshi_market_ids)), ('polymarket_market_id', list(polymarket_market_ids))):
+        for start in range(0, len(ids), IN_QUERY_CHUNK_SIZE):
+            execute(supabase.table('duplicate_markets').delete().in_(column, ids[start:start + IN_QUERY_CHUNK_SIZE]),
+                    'duplicate_markets', 'delete')
+    if kalshi_market_ids or polymarket_market_ids:
+        logging.info(f'Retired duplicate pairs of {len(kalshi_market_ids)} kalshi and {len(polymarket_market_ids)} polymarket markets')
 
 # query the markets tables (only polymarket_markets for now) to verify that records have
 # recently been updated. If not, we fetch new records.
@@ -38,102 +70,388 @@ def query_recent(current_time):
         .execute()
     return [from_row(row) for row in response.data]
 
-# upsert (insert, and replace on conflict) market data to the specified table_name
+# fingerprint of the fields that change between refreshes, per table and market, as of the last
+# successful write from this process. Text edits count: dedup re-embeds markets whose stored text changed.
+FINGERPRINT_FIELDS = ('title', 'description', 'yes_price', 'no_price', 'volume', 'volume_24h', 'close_time')
+_written_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+def market_row_key(market):
+    return str(market.key)
+
+def market_fingerprint(market):
+    return hash(tuple(str(getattr(market, field)) for field in FINGERPRINT_FIELDS))
+
+def _upsert_chunk(table_name, chunk):
+    rows = [market.to_row() for market in chunk]
+    payload_bytes = len(json.dumps(rows, default=str))
+    execute(supabase.table(table_name).upsert(rows), table_name, 'upsert')
+    return payload_bytes
+
+# upsert (insert, and replace on conflict) Markets to the specified table_name.
+# Rows whose FINGERPRINT_FIELDS are unchanged since this process last wrote them are skipped,
+# and the rest are sent in UPSERT_CHUNK_SIZE chunks, UPSERT_WORKERS at a time.
+# Returns {'written', 'skipped', 'failed', 'bytes'} for the call.
 def upsert_markets(market_data_list, table_name):
-    try:
-        supabase.table(table_name).upsert(market_data_list).execute()
-    except Exception as e:
-        logging.error(f'Error upserting markets to {table_name}: {e}', exc_info=True)
+    with _fingerprints_lock:
+        written = _written_fingerprints.setdefault(table_name, {})
+        changed_rows = []
+        for market in market_data_list:
+            if written.get(market_row_key(market)) != market_fingerprint(market):
+                changed_rows.append(market)
+
+    stats = {'written': 0, 'skipped': len(market_data_list) - len(changed_rows), 'failed': 0, 'bytes': 0}
+    chunks = [changed_rows[start:start + UPSERT_CHUNK_SIZE] for start in range(0, len(changed_rows), UPSERT_CHUNK_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=UPSERT_WORKERS, thread_name_prefix='upsert') as executor:
+        futures = [(chunk, executor.submit(_upsert_chunk, table_name, chunk)) for chunk in chunks]
+        for chunk, future in futures:
+            try:
+                stats['bytes'] += future.result()
+                stats['written'] += len(chunk)
+                with _fingerprints_lock:
+                    for market in chunk:
+                        written[market_row_key(market)] = market_fingerprint(market)
+            except Exception as e:
+                stats['failed'] += len(chunk)
+                logging.error(f'Error upserting {len(chunk)} markets to {table_name}: {e}', exc_info=True)
+
+    logging.debug(
+        f"Upserted {stats['written']} markets to {table_name} in {len(chunks)} chunks ({stats['bytes']} bytes), "
+        f"skipped {stats['skipped']} unchanged, {stats['failed']} failed")
+    return stats
+
+# after a complete refresh of table_name, forget the fingerprints of markets it no longer returned
+# (closed or delisted), so the fingerprints only ever cover the venue's current markets
+def forget_missing_fingerprints(table_name, current_keys):
+    with _fingerprints_lock:
+        written = _written_fingerprints.get(table_name, {})
+        for key in set(written) - set(current_keys):
+            del written[key]
+
+# fetch the rows of table_name whose column value is one of keys, using bulk in_ queries of at most
+# IN_QUERY_CHUNK_SIZE keys each. Returns {str(column value): row}.
+def fetch_rows_by_keys(table_name, column, keys):
+    unique_keys = list(dict.fromkeys(str(key) for key in keys))
+    rows = {}
+    for start in range(0, len(unique_keys), IN_QUERY_CHUNK_SIZE):
+        response = execute(supabase.table(table_name).select('*')
+                           .in_(column, unique_keys[start:start + IN_QUERY_CHUNK_SIZE]), table_name, 'select')
+        for row in response.data:
+            rows[str(row[column])] = row
+    return rows
+
+# every stored duplicate pair joined with its kalshi and polymarket market rows
+def get_deduplicated_market_rows():
+    return [row for _, row in iter_deduplicated_market_rows()]
+
+# yield (offset of the next pair, joined row) for stored duplicate pairs starting at offset. Pairs
+# are read DEDUP_PAGE_SIZE at a time in a stable order and joined with their markets page by page,
+# so memory stays bounded by the page size.
+def iter_deduplicated_market_rows(offset=0, page_size=None):
+    page_size = page_size or DEDUP_PAGE_SIZE
+    while True:
+        pairs = execute(supabase.table('duplicate_markets').select('*')
+                        .order('kalshi_market_id').order('polymarket_market_id')
+                        .range(offset, offset + page_size - 1), 'duplicate_markets', 'select').data
+        if not pairs:
+            return
+
+        kalshi_by_ticker = fetch_rows_by_keys('kalshi_markets', 'ticker', [pair['kalshi_market_id'] for pair in pairs])
+        polymarket_by_id = fetch_rows_by_keys('polymarket_markets', 'id', [pair['polymarket_market_id'] for pair in pairs])
+
+        for position, pair in enumerate(pairs, start=offset + 1):
+            kalshi_market = kalshi_by_ticker.get(str(pair['kalshi_market_id']))
+            polymarket_market = polymarket_by_id.get(str(pair['polymarket_market_id']))
+            if kalshi_market is None or polymarket_market is None:
+                logging.info(f"Missing market data for duplicate pair {pair['kalshi_market_id']} / {pair['polymarket_market_id']}")
+                continue
+            yield position, combine_duplicate_markets(kalshi_market, polymarket_market)
+
+        if len(pairs) < page_size:
+            return
+        offset += len(pairs)
+
+# one side-by-side record for a kalshi market and its polymarket duplicate
+def combine_duplicate_markets(kalshi_market, polymarket_market):
+    return {
+        'title': kalshi_market['title'],
+        'description': kalshi_market['description'],
+        'kalshi_yes_price': kalshi_market['yes_price'],
+        'kalshi_no_price': kalshi_market['no_price'],
+        'polymarket_yes_price': polymarket_market['yes_price'],
+        'polymarket_no_price': polymarket_market['no_price'],
+        'kalshi_volume': kalshi_market['volume'],
+        'polymarket_volume': polymarket_market['volume'],
+        'kalshi_volume_24h': kalshi_market['volume_24h'],
+        'polymarket_volume_24h': polymarket_market['volume_24h'],
+        'close_time': kalshi_market['close_time'],
+        'kalshi_ticker': kalshi_market['ticker'],
+        'polymarket_id': polymarket_market['id'],
+        'polymarket_title': polymarket_market['title']
+    }
 
 # get all markets from all source market tables
 def get_all_markets():
     all_markets = []
     
     for source in SOURCES:
-        response = supabase.table(SOURCE_TABLES[source]).select('*').execute()
-        markets = [from_row(row) for row in response.data]
+        response = execute(supabase.table(SOURCE_TABLES[source]).select('*'), SOURCE_TABLES[source], 'select')
+        markets = [from_row(row, source) for row in response.data]
         all_markets.extend(markets)
     
     return all_markets
 
 # convert a row from the database into a market object
-# q: is this really necessary as a util function?
-def from_row(row):
-    return {
-        'title': row['title'],
-        'description': row['description'],
-        'yes_contract': {'price': row['yes_price']},
-        'no_contract': {'price': row['no_price']},
-        'volume': row['volume'],
-        'volume_24h': row['volume_24h'],
-        'close_time': row['close_time']
-    }
+def from_row(row, source=None):
+    return Market.from_row(row, source)
 
 ## Other util functions
 
-def find_duplicate_markets(markets):
-    # Load pre-trained model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+# a market is treated as open unless it has a close_time that has already passed
+def is_open(market, now=None):
+    close_time = parse_close_time(market.close_time)
+    return close_time is None or close_time > (now or datetime.now(timezone.utc))
 
-    # Encode market titles and descriptions
-    titles_and_descriptions = [
-        f"{market['title']} {market['description']}"
-        for market in markets
-    ]
-    embeddings = model.encode(titles_and_descriptions)
+# the exact text embedded for a market
+def market_text(market):
+    return f"{market.title} {market.description}"
+
+# normalized embeddings for the given markets, only running the model on texts not already cached
+def encode_markets(markets):
+    if not markets:
+        return []
+    embedding_cache = get_embedding_cache()
+    with timed('embedding_encode'):
+        embeddings = normalize_embeddings(
+            embedding_cache.encode([market_text(market) for market in markets], embedding_model.encode)
+        )
+    embedding_cache.prune(EMBEDDING_CACHE_MAX_IDLE_SECONDS)
     logging.info(f'Computed {len(embeddings)} embeddings')
+    return embeddings
 
-    # Compute similarity matrix
-    similarity_matrix = cosine_similarity(embeddings)
-
-    # Find duplicate pairs
-    duplicate_pairs = set()
-    for market_index in range(len(markets)):
-        for comparison_index in range(market_index + 1, len(markets)):
-            if similarity_matrix[market_index][comparison_index] > 0.8:
-                duplicate_pairs.add(tuple(sorted((market_index, comparison_index))))
-
-    logging.info(f'Found {len(duplicate_pairs)} duplicate pairs')
-
-    # Merge and deduplicate markets
-    merged_markets = []
-    used_indices = set()
-
-    for pair in duplicate_pairs:
-        market_index, comparison_index = pair
-        if market_index not in used_indices and comparison_index not in used_indices:
-            market1 = markets[market_index]
-            market2 = markets[comparison_index]
-
-            if market1['source'] == 'kalshi' and market2['source'] == 'polymarket':
-                kalshi_market, polymarket_market = market1, market2
-            elif market1['source'] == 'polymarket' and market2['source'] == 'kalshi':
-                kalshi_market, polymarket_market = market2, market1
-            else:
-                continue
+# find kalshi/polymarket duplicates, store them in duplicate_markets and return the markets that
+# were not paired. With incremental=True only markets that are new or changed since the last
+# incremental run are matched, against the persisted ANN indexes of everything seen before.
+def find_duplicate_markets(markets, incremental=False):
+    if incremental:
+        return find_new_duplicate_markets(markets)
 
-            try:
-                logging.info(f'Found duplicate markets: Kalshi: {get_kalshi_name_by_ticker(kalshi_market["ticker"])} || Polymarket: {get_polymarket_name_by_id(polymarket_market["id"])}')
-            except KeyError as e:
-                logging.error(f"KeyError when logging duplicate markets: {e}")
-                logging.error(f"Kalshi market data: {kalshi_market}")
-                logging.error(f"Polymarket market data: {polymarket_market}")
-
-            # Insert into duplicate_markets table
-            insert_duplicate_market(
-                kalshi_market['ticker'],
-                polymarket_market['id']
+    # Only open kalshi x polymarket pairs can be duplicates, so split the markets by source up front
+    now = datetime.now(timezone.utc)
+    kalshi_indices = [
+        index for index, market in enumerate(markets)
+        if market.source == 'kalshi' and is_open(market, now)
+    ]
+    polymarket_indices = [
+        index for index, market in enumerate(markets)
+        if market.source == 'polymarket' and is_open(market, now)
+    ]
+
+    # Encode market titles and descriptions
+    embeddings = encode_markets([markets[index] for index in kalshi_indices + polymarket_indices])
+
+    if DEDUP_BLOCKING:
+        # Only score pairs that share a title token and close around the same time
+        with timed('blocking'):
+            kalshi_positions, polymarket_positions = candidate_pairs(
+                [markets[index] for index in kalshi_indices],
+                [markets[index] for index in polymarket_indices]
             )
-            used_indices.update(pair)
+        logging.info(f'Blocking kept {len(kalshi_positions)} of {len(kalshi_indices) * len(polymarket_indices)} candidate pairs')
+        with timed('similarity', method='candidates'):
+            matches = candidate_matches(
+                embeddings[:len(kalshi_indices)],
+                embeddings[len(kalshi_indices):],
+                kalshi_positions,
+                polymarket_positions,
+                threshold=DUPLICATE_SIMILARITY_THRESHOLD,
+                top_k=MATCH_TOP_K
+            )
+    else:
+        # Score kalshi against polymarket in blocks, keeping the top candidates per kalshi market
+        with timed('similarity', method='blocked'):
+            matches = top_k_matches(
+                embeddings[:len(kalshi_indices)],
+                embeddings[len(kalshi_indices):],
+                threshold=DUPLICATE_SIMILARITY_THRESHOLD,
+                top_k=MATCH_TOP_K,
+                block_size=MATCH_BLOCK_SIZE,
+                polymarket_block_size=MATCH_POLYMARKET_BLOCK_SIZE
+            )
+    duplicate_pairs = select_one_to_one([
+        (kalshi_indices[kalshi_position], polymarket_indices[polymarket_position], score)
+        for kalshi_position, polymarket_position, score in matches
+    ])
 
-    for index, market in enumerate(markets):
-        if index not in used_indices:
-            merged_markets.append(market)
+    logging.info(f'Found {len(matches)} candidate matches, {len(duplicate_pairs)} duplicate pairs')
+
+    record_duplicate_pairs([
+        (markets[market_index], markets[comparison_index], score)
+        for market_index, comparison_index, score in duplicate_pairs
+    ])
+    used_indices = {index for pair in duplicate_pairs for index in pair[:2]}
+    merged_markets = [market for index, market in enumerate(markets) if index not in used_indices]
 
     logging.info(f'Found {len(duplicate_pairs)} duplicate markets out of {len(markets)} total')
 
     return merged_markets
 
+# match only markets that are new (or whose text changed) against the per-venue ANN indexes.
+# Closed markets, and markets whose text changed, are dropped from the indexes and their stored
+# pairs retired. With full_universe=True, markets is everything in the tables and indexed markets
+# missing from it are dropped too; otherwise markets is just what changed since the last run.
+def find_new_duplicate_markets(markets, full_universe=True):
+    now = datetime.now(timezone.utc)
+    retired = {source: set() for source in MARKET_KEYS}
+
+    with market_index_lock:
+        indexes = {source: get_market_index(source) for source in MARKET_KEYS}
+        markets_by_id = {source: {} for source in MARKET_KEYS}
+        new_markets = {source: [] for source in MARKET_KEYS}
+
+        for market in markets:
+            source = market.source
+            if source not in indexes:
+                continue
+            market_id = str(market.key)
+            if not is_open(market, now):
+                retired[source].add(market_id)
+                continue
+            markets_by_id[source][market_id] = market
+            indexed_key = indexes[source].text_key(market_id)
+            if indexed_key != text_key(market_text(market)):
+                if indexed_key is not None:
+                    retired[source].add(market_id)
+                new_markets[source].append(market)
+
+        # Drop markets that closed (now, or since they were indexed) or disappeared
+        for source, index in indexes.items():
+            retired[source].update(index.expire(now.timestamp()))
+            if full_universe:
+                retired[source].update(market_id for market_id in index.ids() if market_id not in markets_by_id[source])
+            index.remove(retired[source])
+
+        # Encode and index the new markets
+        new_embeddings = {}
+        for source, source_markets in new_markets.items():
+            new_embeddings[source] = encode_markets(source_markets)
+            close_times = [parse_close_time(market.close_time) for market in source_markets]
+            indexes[source].add(
+                [str(market.key) for market in source_markets],
+                new_embeddings[source],
+                [text_key(market_text(market)) for market in source_markets],
+                [close_time.timestamp() if close_time else None for close_time in close_times]
+            )
+
+        logging.info(
+            f"Matching {len(new_markets['kalshi'])} new kalshi and {len(new_markets['polymarket'])} new polymarket "
+            f"markets against {len(indexes['kalshi'])} kalshi and {len(indexes['polymarket'])} polymarket indexed markets")
+
+        # New kalshi markets against every polymarket market, and new polymarket markets against every kalshi market
+        matches = []
+        for query_source, target_source in (('kalshi', 'polymarket'), ('polymarket', 'kalshi')):
+            with timed('similarity', method='ann'):
+                results = indexes[target_source].search(new_embeddings[query_source], k=MATCH_TOP_K)
+            for market, neighbours in zip(new_markets[query_source], results):
+                market_id = str(market.key)
+                for neighbour_id, score in neighbours:
+                    if score <= DUPLICATE_SIMILARITY_THRESHOLD:
+                        continue
+                    if query_source == 'kalshi':
+                        matches.append((market_id, neighbour_id, score))
+                    else:
+                        matches.append((neighbour_id, market_id, score))
+
+        for source in indexes:
+            save_market_index(source)
+
+    matches.sort(key=lambda match: -match[2])
+    duplicate_pairs = select_one_to_one(matches)
+
+    logging.info(f'Found {len(matches)} candidate matches, {len(duplicate_pairs)} duplicate pairs')
+
+    # Markets matched from the index that weren't in this batch are loaded in bulk
+    for source, position in (('kalshi', 0), ('polymarket', 1)):
+        missing = [pair[position] for pair in duplicate_pairs if pair[position] not in markets_by_id[source]]
+        if missing:
+            rows = fetch_rows_by_keys(SOURCE_TABLES[source], MARKET_KEYS[source], missing)
+            markets_by_id[source].update((key, Market.from_row(row, source)) for key, row in rows.items())
+
+    retire_duplicate_pairs(retired['kalshi'], retired['polymarket'])
+    record_duplicate_pairs([
+        (markets_by_id['kalshi'][kalshi_id], markets_by_id['polymarket'][polymarket_id], score)
+        for kalshi_id, polymarket_id, score in duplicate_pairs
+        if kalshi_id in markets_by_id['kalshi'] and polymarket_id in markets_by_id['polymarket']
+    ])
+
+    paired = {('kalshi', kalshi_id) for kalshi_id, _, _ in duplicate_pairs}
+    paired.update(('polymarket', polymarket_id) for _, polymarket_id, _ in duplicate_pairs)
+    return [
+        market for market in markets
+        if market.source not in MARKET_KEYS
+        or (market.source, str(market.key)) not in paired
+    ]
+
+# store (kalshi market, polymarket market, score) pairs in duplicate_markets. Titles for the log come
+# from the market dicts, so the only database traffic is the bulk upsert.
+def record_duplicate_pairs(duplicate_pairs):
+    for kalshi_market, polymarket_market, score in duplicate_pairs:
+        logging.info(f'Found duplicate markets ({score:.3f}): Kalshi: {kalshi_market.title} || Polymarket: {polymarket_market.title}')
+
+    insert_duplicate_markets([
+        (kalshi_market.ticker, polymarket_market.id)
+        for kalshi_market, polymarket_market, _ in duplicate_pairs
+    ])
+
+# markets updated since the last incremental dedup run, by each table's last_updated high-water mark
+# (everything on the first run). Returns (markets, new high-water marks).
+def load_changed_markets(high_water_marks):
+    markets = []
+    new_marks = dict(high_water_marks)
+    for source, table_name in SOURCE_TABLES.items():
+        offset = 0
+        while True:
+            query = supabase.table(table_name).select('*')
+            if high_water_marks.get(table_name):
+                # gte rather than gt: rows stamped with the mark itself after the last read are not
+                # lost, and re-reading the boundary rows is harmless
+                query = query.gte('last_updated', high_water_marks[table_name])
+            rows = execute(query.order('last_updated').range(offset, offset + DEDUP_PAGE_SIZE - 1), table_name, 'select').data
+            for row in rows:
+                markets.append(Market.from_row(row, source))
+                if row.get('last_updated') and (new_marks.get(table_name) or '') < row['last_updated']:
+                    new_marks[table_name] = row['last_updated']
+            if len(rows) < DEDUP_PAGE_SIZE:
+                break
+            offset += len(rows)
+    return markets, new_marks
+
+def _load_dedup_state():
+    if not os.path.exists(DEDUP_STATE_PATH):
+        return {}
+    with open(DEDUP_STATE_PATH) as f:
+        return json.load(f)
+
+def _save_dedup_state(state):
+    os.makedirs(os.path.dirname(DEDUP_STATE_PATH) or '.', exist_ok=True)
+    temp_path = DEDUP_STATE_PATH + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, DEDUP_STATE_PATH)
+
+# incremental dedup run: match only markets updated since the last run against the indexed universe.
+# The high-water marks only advance once the run has stored its pairs, so a failed run is retried.
+def run_incremental_deduplication():
+    state = _load_dedup_state()
+    high_water_marks = state.get('high_water_marks', {})
+    markets, new_marks = load_changed_markets(high_water_marks)
+    logging.info(f'Incremental dedup: {len(markets)} markets updated since {high_water_marks or "the beginning"}')
+
+    unpaired_markets = find_new_duplicate_markets(markets, full_universe=not high_water_marks)
+    _save_dedup_state({**state, 'high_water_marks': new_marks})
+    return unpaired_markets
+
 # given a polymarket market id, return that market's title on polymarket
 def get_polymarket_name_by_id(polymarket_market_id):
     try: